@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+诗歌向量矩阵上的近似最近邻 (ANN) 索引
+
+推荐时的内容推荐 / ItemCF 原本对整个 topic_matrix 做 cosine_similarity 再全量
+argsort，耗时随诗歌数线性增长。这里提供可替换的索引实现，接口一致:
+- ExactIndex: 归一化矩阵一次矩阵向量乘 + argpartition (小规模语料默认使用)
+- IVFIndex: 纯 NumPy 倒排索引 (球面 k-means 聚类，查询时只扫描最近的 N_PROBE 个簇)
+- HnswIndex: hnswlib 的 HNSW 图索引 (可选依赖，未安装时 auto 模式退回 IVF)
+
+索引与 topic_matrix.npy 一起构建并持久化到 saved_models/vector_cache/ann_index；
+新诗追加到矩阵末尾时索引增量插入，诗歌ID列表只在末尾增长时下次启动直接复用。
+
+所有索引按内积排序: 库向量已归一化，查询向量归一化后得分即余弦相似度；
+ItemCF 的查询是已归一化历史向量的加权平均，内积恰好等于逐首余弦相似度的加权平均。
+"""
+
+import os
+import json
+import time
+import threading
+
+import numpy as np
+
+
+class AnnConfig:
+    """ANN 索引配置"""
+
+    # auto / exact / ivf / hnsw
+    BACKEND = os.environ.get('POSTG_ANN_BACKEND', 'auto')
+
+    # auto 模式下诗歌数少于该值时直接精确计算 (单次矩阵向量乘已经足够快)
+    MIN_SIZE = 20000
+
+    # IVF: 簇数 = LISTS_FACTOR * sqrt(n)；查询扫描的簇数；k-means 参数
+    IVF_LISTS_FACTOR = 4
+    IVF_N_PROBE = 16
+    KMEANS_ITERS = 10
+    KMEANS_SAMPLE = 50000
+    # 增量插入的行超过已索引行数的该比例时重排倒排表
+    IVF_REINDEX_RATIO = 0.05
+
+    # HNSW 参数
+    HNSW_M = 16
+    HNSW_EF_CONSTRUCTION = 200
+    HNSW_EF_SEARCH = 64
+
+    # 分块计算，限制 (块大小 x 簇数) 临时矩阵的内存
+    CHUNK_SIZE = 8192
+
+    INDEX_DIR_NAME = 'ann_index'
+
+
+def normalize_rows(matrix):
+    """按行 L2 归一化为 float32 (零向量保持为零)
+
+    已经是归一化 float32 矩阵时原样返回 (不复制)，索引与 topic_matrix 因此共享同一块内存。
+    只读映射的向量缓存写入时已归一化，直接返回，不为检查范数读取每一行。
+    """
+    if isinstance(matrix, np.memmap) and matrix.dtype == np.float32:
+        return matrix
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        norm = np.linalg.norm(matrix)
+        return matrix / norm if norm > 0 and abs(norm - 1.0) > 1e-4 else matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    if np.all((np.abs(norms - 1.0) < 1e-4) | (norms == 0)):
+        return matrix
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(rows, scores, k, exclude=None):
+    """从候选 (行号, 得分) 中取得分最高的 k 个 (降序)，跳过 exclude 中的行"""
+    if k <= 0:
+        return rows[:0], scores[:0]
+    if exclude is not None and len(exclude):
+        keep = ~np.isin(rows, np.asarray(list(exclude), dtype=np.int64))
+        rows, scores = rows[keep], scores[keep]
+    if len(rows) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        rows, scores = rows[part], scores[part]
+    order = np.argsort(-scores, kind='stable')
+    return rows[order], scores[order]
+
+
+class AnnIndex:
+    """索引接口: 行号即 topic_matrix 中的行号"""
+
+    backend = None
+
+    def __init__(self):
+        self.size = 0
+        self.dim = None
+
+    def build(self, vectors):
+        raise NotImplementedError
+
+    def add(self, vectors, backing=None):
+        """把新行追加到索引末尾 (行号从 self.size 开始)
+
+        backing: 末尾已包含新行的完整矩阵 (诗歌向量存储的视图)，提供时直接引用而不复制。
+        """
+        raise NotImplementedError
+
+    def attach(self, backing):
+        """改为引用内容相同的另一块矩阵 (诗歌向量存储的缓冲区视图)；不保存矩阵的索引无需处理"""
+
+    def remove(self, rows):
+        """删除行 (墓碑)；默认什么都不做: 引用的矩阵中这些行已清零，内积得分为 0"""
+
+    def compact(self, keep, vectors):
+        """返回只含 keep 行、按新行号 (vectors) 重建的索引"""
+        return type(self)().build(vectors)
+
+    def search(self, query, k, exclude=None):
+        """返回 (行号数组, 得分数组)，按得分降序，最多 k 个"""
+        raise NotImplementedError
+
+    def save(self, index_dir):
+        pass
+
+    def load(self, index_dir, vectors):
+        raise NotImplementedError
+
+    def params(self):
+        return {}
+
+
+class ExactIndex(AnnIndex):
+    """精确检索 (基线): 一次 float32 矩阵向量乘写入复用的得分缓冲区，argpartition 取 Top-K"""
+
+    backend = 'exact'
+
+    def __init__(self):
+        super().__init__()
+        self.vectors = None
+        # 每个请求线程复用自己的得分缓冲区，避免每次查询分配 n 个浮点数
+        self._local = threading.local()
+
+    def _buffer(self, n):
+        buf = getattr(self._local, 'scores', None)
+        if buf is None or len(buf) < n:
+            buf = self._local.scores = np.empty(n, dtype=np.float32)
+        return buf[:n]
+
+    def build(self, vectors):
+        self.vectors = normalize_rows(vectors)
+        self.size, self.dim = self.vectors.shape
+        return self
+
+    def attach(self, backing):
+        self.vectors = backing
+
+    def add(self, vectors, backing=None):
+        if backing is not None:
+            self.vectors = backing
+        else:
+            self.vectors = np.vstack([self.vectors, normalize_rows(np.atleast_2d(vectors))])
+        self.size = len(self.vectors)
+
+    def search(self, query, k, exclude=None):
+        vectors = self.vectors
+        n = len(vectors)
+        if k <= 0 or n == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = np.matmul(vectors, np.asarray(query, dtype=np.float32), out=self._buffer(n))
+        if exclude is not None and len(exclude):
+            scores[np.asarray(exclude, dtype=np.intp)] = -np.inf
+        k = min(k, n)
+        top = np.argpartition(scores, n - k)[n - k:] if k < n else np.arange(n)
+        top = top[np.argsort(-scores[top], kind='stable')]
+        top_scores = scores[top]
+        keep = np.isfinite(top_scores)
+        return top[keep], top_scores[keep]
+
+    def load(self, index_dir, vectors):
+        return self.build(vectors)
+
+
+class IVFIndex(AnnIndex):
+    """纯 NumPy 倒排索引 (IVF-Flat)"""
+
+    backend = 'ivf'
+
+    def __init__(self, n_lists=None, n_probe=None, seed=42):
+        super().__init__()
+        self.n_lists = n_lists
+        self.n_probe = n_probe or AnnConfig.IVF_N_PROBE
+        self.seed = seed
+        self.vectors = None
+        self.centroids = None
+        self.assign = None     # 各行所属的簇；增量插入的行在重排倒排表时才补算
+        self.order = None      # 按簇排序后的行号
+        self.offsets = None    # 第 c 个簇的行: order[offsets[c]:offsets[c + 1]]
+        self.n_indexed = 0     # 已进入倒排表的行数；其后的行查询时直接扫描
+
+    def _assign(self, vectors, centroids):
+        out = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), AnnConfig.CHUNK_SIZE):
+            chunk = vectors[start:start + AnnConfig.CHUNK_SIZE]
+            out[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return out
+
+    def _kmeans(self, vectors):
+        rng = np.random.default_rng(self.seed)
+        n = len(vectors)
+        sample = vectors
+        if n > AnnConfig.KMEANS_SAMPLE:
+            sample = vectors[rng.choice(n, AnnConfig.KMEANS_SAMPLE, replace=False)]
+        centroids = sample[rng.choice(len(sample), self.n_lists, replace=False)].copy()
+        for _ in range(AnnConfig.KMEANS_ITERS):
+            labels = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=self.n_lists)
+            empty = counts == 0
+            if empty.any():
+                # 空簇重新取随机样本作为中心
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+            centroids = normalize_rows(sums)
+        return centroids
+
+    def _sync_assign(self):
+        if len(self.assign) < self.size:
+            tail = self._assign(self.vectors[len(self.assign):self.size], self.centroids)
+            self.assign = np.concatenate([self.assign, tail])
+
+    def _reindex(self):
+        self._sync_assign()
+        self.order = np.argsort(self.assign, kind='stable').astype(np.int64)
+        counts = np.bincount(self.assign, minlength=self.n_lists)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.n_indexed = len(self.assign)
+
+    def build(self, vectors):
+        self.vectors = normalize_rows(vectors)
+        self.size, self.dim = self.vectors.shape
+        if not self.n_lists:
+            self.n_lists = int(AnnConfig.IVF_LISTS_FACTOR * np.sqrt(self.size))
+        self.n_lists = max(1, min(self.n_lists, self.size))
+        self.centroids = self._kmeans(self.vectors)
+        self.assign = self._assign(self.vectors, self.centroids)
+        self._reindex()
+        return self
+
+    def attach(self, backing):
+        self.vectors = backing
+
+    def add(self, vectors, backing=None):
+        if backing is not None:
+            self.vectors = backing
+        else:
+            self.vectors = np.vstack([self.vectors, normalize_rows(np.atleast_2d(vectors))])
+        self.size = len(self.vectors)
+        if self.size - self.n_indexed > max(1024, AnnConfig.IVF_REINDEX_RATIO * self.n_indexed):
+            self._reindex()
+
+    def search(self, query, k, exclude=None, n_probe=None):
+        query = np.asarray(query, dtype=np.float32)
+        vectors, order, offsets, n_indexed = self.vectors, self.order, self.offsets, self.n_indexed
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        need = k + (len(exclude) if exclude is not None else 0)
+
+        centroid_scores = self.centroids @ query
+        probes = np.argsort(-centroid_scores)
+        rows = []
+        found = 0
+        for i, c in enumerate(probes):
+            # 至少扫描 n_probe 个簇，且候选数足够 (排除已读后仍有 k 个)
+            if i >= n_probe and found >= need:
+                break
+            members = order[offsets[c]:offsets[c + 1]]
+            rows.append(members)
+            found += len(members)
+        if len(vectors) > n_indexed:
+            rows.append(np.arange(n_indexed, len(vectors)))
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        return _top_k(rows, vectors[rows] @ query, k, exclude)
+
+    def compact(self, keep, vectors):
+        """簇中心不变，只按新行号重排倒排表 (不重新聚类)"""
+        self._sync_assign()
+        index = IVFIndex(self.n_lists, self.n_probe, self.seed)
+        index.centroids = self.centroids
+        index.vectors = vectors
+        index.size, index.dim = vectors.shape
+        index.assign = self.assign[np.asarray(keep, dtype=np.int64)]
+        index._reindex()
+        return index
+
+    def save(self, index_dir):
+        self._sync_assign()
+        np.savez(os.path.join(index_dir, 'ivf.npz'), centroids=self.centroids, assign=self.assign)
+
+    def load(self, index_dir, vectors):
+        data = np.load(os.path.join(index_dir, 'ivf.npz'))
+        self.centroids = data['centroids']
+        self.n_lists = len(self.centroids)
+        self.vectors = normalize_rows(vectors[:len(data['assign'])])
+        self.size, self.dim = self.vectors.shape
+        self.assign = data['assign']
+        self._reindex()
+        return self
+
+    def params(self):
+        return {'n_lists': self.n_lists, 'n_probe': self.n_probe}
+
+
+class HnswIndex(AnnIndex):
+    """hnswlib HNSW 索引 (内积空间)"""
+
+    backend = 'hnsw'
+
+    def __init__(self, m=None, ef_construction=None, ef_search=None):
+        super().__init__()
+        self.m = m or AnnConfig.HNSW_M
+        self.ef_construction = ef_construction or AnnConfig.HNSW_EF_CONSTRUCTION
+        self.ef_search = ef_search or AnnConfig.HNSW_EF_SEARCH
+        self.index = None
+
+    def _new_index(self, capacity):
+        import hnswlib
+        self.index = hnswlib.Index(space='ip', dim=self.dim)
+        self.index.init_index(max_elements=capacity, ef_construction=self.ef_construction, M=self.m)
+        self.index.set_ef(self.ef_search)
+
+    def build(self, vectors):
+        vectors = normalize_rows(vectors)
+        self.size, self.dim = vectors.shape
+        self._new_index(max(1, self.size))
+        self.index.add_items(vectors, np.arange(self.size))
+        return self
+
+    def add(self, vectors, backing=None):
+        vectors = normalize_rows(np.atleast_2d(vectors))
+        needed = self.size + len(vectors)
+        if needed > self.index.get_max_elements():
+            # 容量按倍数扩展，避免每首新诗都重新分配
+            self.index.resize_index(max(needed, self.index.get_max_elements() * 2))
+        self.index.add_items(vectors, np.arange(self.size, needed))
+        self.size = needed
+
+    def remove(self, rows):
+        for row in rows:
+            self.index.mark_deleted(int(row))
+
+    def search(self, query, k, exclude=None, ef=None):
+        query = np.asarray(query, dtype=np.float32)
+        fetch = min(self.size, k + (len(exclude) if exclude is not None else 0))
+        if fetch <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        self.index.set_ef(max(ef or self.ef_search, fetch))
+        labels, distances = self.index.knn_query(query.reshape(1, -1), k=fetch)
+        # ip 空间的距离为 1 - 内积
+        return _top_k(labels[0].astype(np.int64), 1.0 - distances[0], k, exclude)
+
+    def save(self, index_dir):
+        self.index.save_index(os.path.join(index_dir, 'hnsw.bin'))
+
+    def load(self, index_dir, vectors):
+        import hnswlib
+        self.dim = vectors.shape[1]
+        self.index = hnswlib.Index(space='ip', dim=self.dim)
+        self.index.load_index(os.path.join(index_dir, 'hnsw.bin'))
+        self.index.set_ef(self.ef_search)
+        self.size = self.index.get_current_count()
+        return self
+
+    def params(self):
+        return {'m': self.m, 'ef_construction': self.ef_construction, 'ef_search': self.ef_search}
+
+
+_BACKENDS = {'exact': ExactIndex, 'ivf': IVFIndex, 'hnsw': HnswIndex}
+
+
+def hnswlib_available():
+    try:
+        import hnswlib  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def resolve_backend(size, backend=None):
+    """auto: 小规模语料精确检索，否则优先 HNSW (已安装 hnswlib)，再退回 IVF"""
+    backend = backend or AnnConfig.BACKEND
+    if backend == 'hnsw' and not hnswlib_available():
+        print("[AnnIndex] hnswlib not installed, falling back to IVF.")
+        backend = 'ivf'
+    if backend not in _BACKENDS:
+        if size < AnnConfig.MIN_SIZE:
+            backend = 'exact'
+        else:
+            backend = 'hnsw' if hnswlib_available() else 'ivf'
+    return backend
+
+
+def build_ann_index(vectors, backend=None):
+    """为向量矩阵构建索引"""
+    backend = resolve_backend(len(vectors), backend)
+    start = time.time()
+    index = _BACKENDS[backend]().build(vectors)
+    print(f"[AnnIndex] Built {backend} index over {index.size} vectors ({time.time() - start:.2f}s)")
+    return index
+
+
+def save_ann_index(cache_dir, index, poem_ids, embedding_name=None):
+    """持久化索引 (精确索引只记录元数据)"""
+    index_dir = os.path.join(cache_dir, AnnConfig.INDEX_DIR_NAME)
+    os.makedirs(index_dir, exist_ok=True)
+    index.save(index_dir)
+    np.save(os.path.join(index_dir, 'ids.npy'), np.asarray(poem_ids[:index.size], dtype=np.int64))
+    with open(os.path.join(index_dir, 'meta.json'), 'w') as f:
+        json.dump({
+            'backend': index.backend,
+            'size': index.size,
+            'dim': index.dim,
+            'embedding_model': embedding_name,
+            'params': index.params(),
+            'saved_at': time.time()
+        }, f)
+
+
+def load_or_build_ann_index(cache_dir, poem_ids, matrix, embedding_name=None, backend=None):
+    """加载持久化索引；已保存的诗歌ID是当前ID列表的前缀时只增量插入新增部分，否则重建"""
+    backend = resolve_backend(len(poem_ids), backend)
+    index_dir = os.path.join(cache_dir, AnnConfig.INDEX_DIR_NAME)
+    meta_path = os.path.join(index_dir, 'meta.json')
+    ids_path = os.path.join(index_dir, 'ids.npy')
+
+    if backend != 'exact' and os.path.exists(meta_path) and os.path.exists(ids_path):
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            saved_ids = np.load(ids_path)
+            n = len(saved_ids)
+            if meta.get('backend') == backend and meta.get('dim') == matrix.shape[1] \
+                    and meta.get('embedding_model') == embedding_name \
+                    and 0 < n <= len(poem_ids) \
+                    and np.array_equal(saved_ids, np.asarray(poem_ids[:n], dtype=np.int64)):
+                index = _BACKENDS[backend]().load(index_dir, matrix)
+                if index.size == n:
+                    if n < len(poem_ids):
+                        index.add(matrix[n:])
+                        save_ann_index(cache_dir, index, poem_ids, embedding_name)
+                    print(f"[AnnIndex] Loaded {backend} index ({n} cached, "
+                          f"{len(poem_ids) - n} added)")
+                    return index
+        except Exception as e:
+            print(f"[AnnIndex] Failed to load cached index: {e}")
+
+    index = build_ann_index(matrix, backend)
+    if backend != 'exact':
+        try:
+            save_ann_index(cache_dir, index, poem_ids, embedding_name)
+        except Exception as e:
+            print(f"[AnnIndex] Failed to save index: {e}")
+    return index
@@ -8,11 +8,15 @@ import pandas as pd
 from sqlalchemy import text, inspect
 import os
 # from lda_analysis import train_lda_on_poems, load_stopwords, preprocess_text, save_lda_model, load_lda_model, predict_topic
-from bertopic_analysis import load_bertopic_model, predict_topic, get_all_topics, get_poem_imagery, generate_real_topic, get_individual_keywords
+from bertopic_analysis import predict_topic, get_all_topics, get_poem_imagery, generate_real_topic, get_individual_keywords
+from model_registry import get_bertopic_model, model_registry, add_model_routes
+from inference_executor import add_inference_routes
 import json
 from collections import Counter
 from sqlalchemy import func
 from recommendation_update import add_recommendation_routes, init_recommendation_system
+from topic_tagging import add_tagging_routes, init_topic_tagging, enqueue_review
+from readiness import readiness, add_health_routes, start_background_warmup, is_degraded, warmup_started
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -23,6 +27,10 @@ db.init_app(app)
 
 # 初始化推荐更新系统
 add_recommendation_routes(app)
+add_tagging_routes(app)
+add_health_routes(app)
+add_model_routes(app)
+add_inference_routes(app)
 
 # --- 全局变量 ---
 # lda_model = None
@@ -59,7 +67,8 @@ def sync_global_cache():
     """同步数据库数据到全局变量 (已简化，主要用于初始化模型)"""
     global topic_keywords, bertopic_model
     if not bertopic_model:
-        bertopic_model = load_bertopic_model()
+        # 后台预热进行中时不在请求线程里阻塞加载模型
+        bertopic_model = get_bertopic_model(load=not warmup_started())
         if bertopic_model:
             topic_keywords = get_all_topics(bertopic_model)
 
@@ -68,7 +77,7 @@ def refresh_system_data():
     global bertopic_model, topic_keywords
     with app.app_context():
         if bertopic_model is None:
-            bertopic_model = load_bertopic_model()
+            bertopic_model = get_bertopic_model()
             if bertopic_model:
                 topic_keywords = get_all_topics(bertopic_model)
         
@@ -105,6 +114,27 @@ def refresh_system_data():
         db.session.commit()
         _cache_clear()
 
+def _on_model_swapped(new, old):
+    """模型热切换 (切换锁内): 全局模型与主题关键词一起替换为新版本"""
+    global bertopic_model, topic_keywords
+    bertopic_model = new.model
+    topic_keywords = new.topic_keywords
+    _cache_clear()
+
+model_registry.add_swap_hooks(commit=_on_model_swapped)
+
+def _on_reviews_tagged(user_ids):
+    """后台打标完成后清理依赖评论主题的缓存"""
+    usernames = [u for (u,) in db.session.query(User.username).filter(User.id.in_(user_ids)).all()]
+    prefixes = ["visual:stats", "global:theme_distribution", "wordcloud:global"]
+    for username in usernames:
+        prefixes.extend([
+            f"wordcloud:user:{username}",
+            f"user:preferences:{username}",
+            f"user:sankey:{username}"
+        ])
+    _cache_clear(prefixes)
+
 def ensure_review_columns():
     try:
         inspector = inspect(db.engine)
@@ -122,17 +152,30 @@ def ensure_review_columns():
         db.session.rollback()
 
 def init_db_and_model():
-    """初始化数据库并进行首次同步"""
+    """初始化数据库，模型与向量矩阵在后台预热 (服务可立即以降级模式响应)"""
     with app.app_context():
         try:
             db.create_all()
             print("数据库表结构已同步。")
             ensure_review_columns()
+            readiness.mark('database', readiness.READY)
             init_recommendation_system(app)
+            init_topic_tagging(app, on_tagged=_on_reviews_tagged)
         except Exception as e:
+            readiness.mark('database', readiness.FAILED, error=str(e))
             print(f"数据库初始化失败: {e}")
             return
-        refresh_system_data()
+    # 模型就绪后再补全主题与计数，不阻塞启动
+    start_background_warmup(app, after_ready=refresh_system_data)
+    # 重新训练后 current.json 指向新版本时自动热切换
+    model_registry.start_watcher()
+
+def _recommend_for_user(user_id, limit=6):
+    """返回 (诗歌列表, 是否降级)；模型或向量矩阵未就绪时退回热门推荐"""
+    from recommendation_update import recommendation_service
+    if recommendation_service and recommendation_service.recommender and not is_degraded():
+        return recommendation_service.recommender.get_new_poems_for_user(user_id, limit=limit), False
+    return Poem.query.order_by(Poem.views.desc()).limit(limit).all(), True
 
 # 启动时初始化逻辑已移动到文件末尾的 __main__ 块中
 
@@ -443,13 +486,7 @@ def add_review():
     )
     db.session.add(new_review)
     
-    # 即时更新统计和主题
-    # lda_model, dictionary, topic_keywords = load_lda_model()
-    model = load_bertopic_model()
-    if model:
-        tid, tname = predict_topic(comment, model)
-        new_review.topic_names = tname
-    
+    # 即时更新统计
     user.total_reviews += 1
     poem = Poem.query.get(poem_id)
     if poem:
@@ -457,13 +494,20 @@ def add_review():
         
     db.session.commit()
     
-    # 异步或随后更新用户偏好
+    # 主题打标与用户偏好更新交给后台队列批量处理
     from recommendation_update import IncrementalRecommender, recommendation_service
-    recommender = IncrementalRecommender()
-    user.preference_topics = recommender.update_user_preference(user.id)
-    db.session.commit()
+    if not enqueue_review(new_review.id):
+        # 队列未启动 (例如脚本直接导入 app) 时退回同步打标 (只提取关键词，不需要模型推理)
+        new_review.topic_names = get_individual_keywords(comment)
+        recommender = IncrementalRecommender()
+        user.preference_topics = recommender.update_user_preference(user.id)
+        db.session.commit()
     if recommendation_service and recommendation_service.recommender:
-        recommendation_service.recommender.user_vector_cache.pop(user.id, None)
+        # 用户画像累加和 O(dim) 增量更新，不再整体失效后重算
+        try:
+            recommendation_service.recommender.on_review_added(new_review)
+        except Exception as e:
+            print(f"[Review] Profile update failed: {e}")
 
     _cache_clear([
         "visual:stats",
@@ -540,14 +584,11 @@ def recommend_personal(username):
     if not user:
         return jsonify([])
     
-    from recommendation_update import recommendation_service
-    if recommendation_service and recommendation_service.recommender:
-        poems = recommendation_service.recommender.get_new_poems_for_user(user.id)
-    else:
-        # Fallback
-        poems = Poem.query.order_by(Poem.views.desc()).limit(6).all()
-        
-    return jsonify([p.to_dict() for p in poems])
+    poems, degraded = _recommend_for_user(user.id)
+    response = jsonify([p.to_dict() for p in poems])
+    # 列表响应无法附加字段，降级状态通过响应头告知
+    response.headers['X-Recommendation-Degraded'] = 'true' if degraded else 'false'
+    return response
 
 @app.route('/api/recommend/<int:topic_id>')
 def recommend_by_topic(topic_id):
@@ -560,20 +601,28 @@ def recommend_by_topic(topic_id):
 
 @app.route('/api/recommend_one/<username>')
 def recommend_one(username):
-    """智能换诗 (简化版)"""
+    """智能换诗: 登录用户从预取队列按排名取下一首未展示过的诗歌"""
     import random
     user = User.query.filter_by(username=username).first()
     
     from recommendation_update import recommendation_service
-    if recommendation_service and recommendation_service.recommender:
-        candidates = recommendation_service.recommender.get_new_poems_for_user(user.id if user else None, limit=20)
+    degraded = is_degraded()
+    if recommendation_service and recommendation_service.recommender and not degraded:
+        recommender = recommendation_service.recommender
+        if user:
+            poem = recommender.next_poem_for_user(user.id)
+            candidates = [poem] if poem else []
+        else:
+            candidates = recommender.get_new_poems_for_user(None, limit=20)
     else:
+        degraded = True
         candidates = Poem.query.order_by(db.func.random()).limit(20).all()
         
     if candidates:
         poem = random.choice(candidates)
         res = poem.to_dict()
         res['recommend_reason'] = "为您精心挑选"
+        res['degraded'] = degraded
         return jsonify(res)
     
     return jsonify({"error": "No poems found"}), 404
@@ -735,15 +784,10 @@ def get_user_recommendations_alias(username):
     # 此处调用原逻辑，但包装在 poems 下
     user = User.query.filter_by(username=username).first()
     if not user:
-        return jsonify({"poems": []})
+        return jsonify({"poems": [], "degraded": is_degraded()})
     
-    from recommendation_update import recommendation_service
-    if recommendation_service and recommendation_service.recommender:
-        poems = recommendation_service.recommender.get_new_poems_for_user(user.id)
-    else:
-        poems = Poem.query.order_by(Poem.views.desc()).limit(6).all()
-        
-    return jsonify({"poems": [p.to_dict() for p in poems]})
+    poems, degraded = _recommend_for_user(user.id)
+    return jsonify({"poems": [p.to_dict() for p in poems], "degraded": degraded})
 
 @app.route('/api/user/<username>/wordcloud')
 def get_user_wordcloud_alias(username):
@@ -917,5 +961,6 @@ if __name__ == '__main__':
             db.create_all()
             ensure_review_columns()
             init_recommendation_system(app)
+            init_topic_tagging(app, on_tagged=_on_reviews_tagged)
     
     app.run(debug=True, port=5000)
@@ -12,24 +12,20 @@
 - 总计: 634 首 -> 达到约 1000 首
 """
 
-import json
 import os
+from itertools import islice
 from datetime import datetime
 from app import app
 from models import db, Poem
 from lda_analysis import load_lda_model, predict_topic
-
-# 使用绝对路径
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, 'data', 'chinese-poetry')
+from poetry_corpus import POETRY_DATA_DIR as DATA_DIR, iter_file_poems
 
 # 加载 LDA 模型用于导入时打标签
 LDA_MODEL, LDA_DICT, TOPIC_KW = load_lda_model()
 
 def load_json_file(filepath):
-    """加载 JSON 文件"""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """流式读取 JSON 文件中的诗歌 (content 为按行合并的 paragraphs)"""
+    return iter_file_poems(filepath, sep='\n')
 
 def tag_poem(poem_content):
     """为诗歌打上 LDA 标签"""
@@ -51,8 +47,7 @@ def import_song_ci():
         if existing:
             continue
         
-        # 合并段落
-        content = '\n'.join(item.get('paragraphs', []))
+        content = item['content']
         
         poem = Poem(
             title=item.get('rhythmic', '无题'),
@@ -88,8 +83,7 @@ def import_caocao():
         if existing:
             continue
         
-        # 合并段落
-        content = '\n'.join(item.get('paragraphs', []))
+        content = item['content']
         
         poem = Poem(
             title=item.get('title', '无题'),
@@ -118,7 +112,7 @@ def import_yuanqu(limit=328):
     data = load_json_file(filepath)
     imported = 0
     
-    for item in data[:limit]:
+    for item in islice(data, limit):
         # 提取曲牌名作为标题
         title = item.get('title', '无题')
         if '・' in title:
@@ -130,8 +124,7 @@ def import_yuanqu(limit=328):
         if existing:
             continue
         
-        # 合并段落
-        content = '\n'.join(item.get('paragraphs', []))
+        content = item['content']
         
         poem = Poem(
             title=title,
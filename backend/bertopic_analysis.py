@@ -1,5 +1,9 @@
 import os
+import json
+import time
+import shutil
 import jieba
+import numpy as np
 import pandas as pd
 BERTopic = None
 CountVectorizer = None
@@ -33,6 +37,13 @@ STOPWORDS_FILE = os.path.join(BASE_DIR, '..', 'data', 'scu_stopwords.txt')
 POETRY_STOPWORDS_FILE = os.path.join(BASE_DIR, '..', 'data', 'poetry_stopwords.txt')
 EMOTION_LEXICON_FILE = os.path.join(BASE_DIR, '..', 'data', 'emotion_lexicon.csv')
 DICT_CSV_FILE = os.path.join(BASE_DIR, '..', 'data', 'dict.csv')
+# 保留的模型版本数 (saved_models/bertopic_model/versions/*)
+MODEL_KEEP_VERSIONS = 5
+# 增量更新至少需要的新文档数 (太少无法聚类)
+INCREMENTAL_MIN_DOCS = 20
+EMBEDDING_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+# 句向量推理后端: torch (默认, fp32) / onnx (fp32) / onnx-int8 (动态量化)
+EMBEDDING_BACKEND = os.environ.get('POSTG_EMBEDDING_BACKEND', 'torch').lower()
 
 # 核心停用词库 (避免显示 "是-不-在-的")
 DEFAULT_STOPWORDS = {
@@ -224,8 +235,11 @@ class SemanticColorAnalyzer:
         try:
             _lazy_load_sentence_transformers()
             # 复用 BERT 模型 (paraphrase-multilingual-MiniLM-L12-v2)
-            # 这是一个非常轻量且效果好的多语言模型
-            self.model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
+            # 优先借用模型注册表中 BERTopic 已加载的实例，避免重复占用内存
+            from model_registry import get_embedding_model
+            self.model = get_embedding_model()
+            if self.model is None:
+                self.model = load_embedding_model()
         except Exception as e:
             print(f"[ColorAnalyzer] Error loading model: {e}")
             self.model = None
@@ -404,6 +418,122 @@ def get_poem_colors(text, sentiment=0.5):
     # 截取前N个
     return final_colors[:10]
 
+def _load_emotion_lexicon():
+    """加载外部情感词典 emotion_lexicon.csv (带缓存)"""
+    global _cached_emotion_lexicon
+    if _cached_emotion_lexicon is not None:
+        return _cached_emotion_lexicon
+    lex = {}
+    if os.path.exists(EMOTION_LEXICON_FILE):
+        try:
+            with open(EMOTION_LEXICON_FILE, 'r', encoding='utf-8') as f:
+                reader = csv.reader(f)
+                for row in reader:
+                    if not row or len(row) < 2:
+                        continue
+                    word = row[0].strip()
+                    cat = row[1].strip().lower()
+                    weight = 1.0
+                    if len(row) >= 3:
+                        try:
+                            weight = float(row[2])
+                        except Exception:
+                            weight = 1.0
+                    emo_map = {
+                        'joy': 'joy',
+                        'anger': 'anger',
+                        'sadness': 'sorrow',
+                        'fear': 'fear',
+                        'love': 'love',
+                        'trust': 'zen',
+                        'calm': 'zen',
+                        'serenity': 'zen',
+                        'anticipation': 'joy',
+                        'surprise': 'fear',
+                        'disgust': 'anger'
+                    }
+                    mapped = emo_map.get(cat)
+                    if mapped:
+                        lex[word] = (mapped, weight)
+        except Exception:
+            lex = {}
+    _cached_emotion_lexicon = lex
+    return lex
+
+def _load_dict_csv_lexicon():
+    """加载大连理工情感词汇本体 dict.csv (带缓存)"""
+    global _cached_dict_csv_lexicon
+    if _cached_dict_csv_lexicon is not None:
+        return _cached_dict_csv_lexicon
+    lex = {}
+    if os.path.exists(DICT_CSV_FILE):
+        try:
+            with codecs.open(DICT_CSV_FILE, 'r', encoding='utf-8') as f:
+                reader = csv.reader(f)
+                header = next(reader, None)
+                word_idx = 0
+                emo_idx = 4
+                strength_idx = 5
+                aux_emo_idx = 8
+                aux_strength_idx = 9
+                if header:
+                    def find_idx(name, default):
+                        try:
+                            return header.index(name)
+                        except ValueError:
+                            return default
+                    word_idx = find_idx('词语', word_idx)
+                    emo_idx = find_idx('情感分类', emo_idx)
+                    strength_idx = find_idx('强度', strength_idx)
+                    aux_emo_idx = find_idx('辅助情感分类', aux_emo_idx)
+                    aux_strength_idx = find_idx('强度', aux_strength_idx)
+                def map_code(code):
+                    m = {
+                        'PA':'joy','PH':'joy','PK':'joy','PC':'joy',
+                        'PB':'love','PF':'love','PD':'love',
+                        'PE':'zen','PG':'zen',
+                        'NB':'sorrow','NJ':'sorrow','NH':'sorrow',
+                        'NC':'fear','NI':'fear',
+                        'NA':'anger','ND':'anger','NE':'anger','NN':'anger','NK':'anger'
+                    }
+                    return m.get(code.strip().upper())
+                for row in reader:
+                    if not row or len(row) <= max(word_idx, emo_idx):
+                        continue
+                    w = row[word_idx].strip()
+                    code = row[emo_idx].strip() if len(row) > emo_idx else ''
+                    cat = map_code(code)
+                    try:
+                        weight = float(row[strength_idx]) if len(row) > strength_idx else 1.0
+                    except Exception:
+                        weight = 1.0
+                    if w and cat:
+                        lex[w] = (cat, max(0.5, weight))
+                    if len(row) > aux_emo_idx:
+                        aux_code = row[aux_emo_idx].strip()
+                        aux_cat = map_code(aux_code)
+                        if aux_cat and len(row) > aux_strength_idx:
+                            try:
+                                aux_weight = float(row[aux_strength_idx])
+                            except Exception:
+                                aux_weight = 1.0
+                            if w not in lex:
+                                lex[w] = (aux_cat, max(0.5, aux_weight))
+                _cached_dict_csv_lexicon = lex
+        except Exception:
+            _cached_dict_csv_lexicon = {}
+    else:
+        _cached_dict_csv_lexicon = {}
+    return _cached_dict_csv_lexicon
+
+def warm_up_lexicons():
+    """预加载停用词、情感词典与 jieba 词库 (供启动后台预热调用)"""
+    jieba.initialize()
+    load_stopwords()
+    _load_emotion_lexicon()
+    _load_dict_csv_lexicon()
+    return True
+
 def get_poem_emotions(text):
     """
     根据关键词分析诗歌情感分布 (返回雷达图数据)
@@ -412,115 +542,8 @@ def get_poem_emotions(text):
     if not text:
         return {"joy": 0, "anger": 0, "sorrow": 0, "fear": 0, "love": 0, "zen": 0}
 
-    def load_emotion_lexicon():
-        global _cached_emotion_lexicon
-        if _cached_emotion_lexicon is not None:
-            return _cached_emotion_lexicon
-        lex = {}
-        if os.path.exists(EMOTION_LEXICON_FILE):
-            try:
-                with open(EMOTION_LEXICON_FILE, 'r', encoding='utf-8') as f:
-                    reader = csv.reader(f)
-                    for row in reader:
-                        if not row or len(row) < 2:
-                            continue
-                        word = row[0].strip()
-                        cat = row[1].strip().lower()
-                        weight = 1.0
-                        if len(row) >= 3:
-                            try:
-                                weight = float(row[2])
-                            except Exception:
-                                weight = 1.0
-                        emo_map = {
-                            'joy': 'joy',
-                            'anger': 'anger',
-                            'sadness': 'sorrow',
-                            'fear': 'fear',
-                            'love': 'love',
-                            'trust': 'zen',
-                            'calm': 'zen',
-                            'serenity': 'zen',
-                            'anticipation': 'joy',
-                            'surprise': 'fear',
-                            'disgust': 'anger'
-                        }
-                        mapped = emo_map.get(cat)
-                        if mapped:
-                            lex[word] = (mapped, weight)
-            except Exception:
-                lex = {}
-        _cached_emotion_lexicon = lex
-        return lex
-
-    external_lexicon = load_emotion_lexicon()
-    
-    def load_dict_csv_lexicon():
-        global _cached_dict_csv_lexicon
-        if _cached_dict_csv_lexicon is not None:
-            return _cached_dict_csv_lexicon
-        lex = {}
-        if os.path.exists(DICT_CSV_FILE):
-            try:
-                with codecs.open(DICT_CSV_FILE, 'r', encoding='utf-8') as f:
-                    reader = csv.reader(f)
-                    header = next(reader, None)
-                    word_idx = 0
-                    emo_idx = 4
-                    strength_idx = 5
-                    aux_emo_idx = 8
-                    aux_strength_idx = 9
-                    if header:
-                        def find_idx(name, default):
-                            try:
-                                return header.index(name)
-                            except ValueError:
-                                return default
-                        word_idx = find_idx('词语', word_idx)
-                        emo_idx = find_idx('情感分类', emo_idx)
-                        strength_idx = find_idx('强度', strength_idx)
-                        aux_emo_idx = find_idx('辅助情感分类', aux_emo_idx)
-                        aux_strength_idx = find_idx('强度', aux_strength_idx)
-                    def map_code(code):
-                        m = {
-                            'PA':'joy','PH':'joy','PK':'joy','PC':'joy',
-                            'PB':'love','PF':'love','PD':'love',
-                            'PE':'zen','PG':'zen',
-                            'NB':'sorrow','NJ':'sorrow','NH':'sorrow',
-                            'NC':'fear','NI':'fear',
-                            'NA':'anger','ND':'anger','NE':'anger','NN':'anger','NK':'anger'
-                        }
-                        return m.get(code.strip().upper())
-                    for row in reader:
-                        if not row or len(row) <= max(word_idx, emo_idx):
-                            continue
-                        w = row[word_idx].strip()
-                        code = row[emo_idx].strip() if len(row) > emo_idx else ''
-                        cat = map_code(code)
-                        try:
-                            weight = float(row[strength_idx]) if len(row) > strength_idx else 1.0
-                        except Exception:
-                            weight = 1.0
-                        if w and cat:
-                            lex[w] = (cat, max(0.5, weight))
-                        if len(row) > aux_emo_idx:
-                            aux_code = row[aux_emo_idx].strip()
-                            aux_cat = map_code(aux_code)
-                            if aux_cat and len(row) > aux_strength_idx:
-                                try:
-                                    aux_weight = float(row[aux_strength_idx])
-                                except Exception:
-                                    aux_weight = 1.0
-                                if w not in lex:
-                                    lex[w] = (aux_cat, max(0.5, aux_weight))
-                    _cached_dict_csv_lexicon = lex
-            except Exception:
-                _cached_dict_csv_lexicon = {}
-        else:
-            _cached_dict_csv_lexicon = {}
-        return _cached_dict_csv_lexicon
-    
-    dict_csv_lexicon = load_dict_csv_lexicon()
+    external_lexicon = _load_emotion_lexicon()
+    dict_csv_lexicon = _load_dict_csv_lexicon()
 
     EMOTION_KEYWORDS = {
         'joy': {'喜', '笑', '欢', '乐', '欣', '悦', '畅', '春', '酒', '歌', '舞', '晴', '明', '好', '美', '香', '花', '月', '金', '玉', '庆', '幸', '傲', '瑞', '福', '安', '康', '醉', '乐', '丰', '和'},
@@ -581,7 +604,34 @@ def get_poem_emotions(text):
         
     return scores
 
-def train_bertopic_model(docs):
+def load_embedding_model(device="cpu", backend=None, num_threads=None):
+    """按配置加载句向量模型 (ONNX 模型未导出时退回 torch)
+
+    num_threads: 限制推理线程数 (多进程分片编码时每个进程只占用部分核心)
+    """
+    backend = backend or EMBEDDING_BACKEND
+    if backend in ("onnx", "onnx-int8"):
+        from onnx_embedding import OnnxEmbeddingBackend, is_exported
+        quantized = backend == "onnx-int8"
+        if is_exported(quantized=quantized):
+            print(f"[BERTopic] Using ONNX embedding backend ({backend})")
+            return OnnxEmbeddingBackend(quantized=quantized, intra_op_threads=num_threads)
+        print(f"[BERTopic] ONNX model ({backend}) not exported, falling back to torch.")
+    _lazy_load_sentence_transformers()
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+    return SentenceTransformer(EMBEDDING_MODEL_NAME, device=device)
+
+def embedding_cache_name(backend=None):
+    """向量缓存使用的模型标识 (不同推理后端的向量分开存放)"""
+    backend = backend or EMBEDDING_BACKEND
+    if backend in ("onnx", "onnx-int8"):
+        from onnx_embedding import is_exported
+        if is_exported(quantized=backend == "onnx-int8"):
+            return f"{EMBEDDING_MODEL_NAME}@{backend}"
+    return EMBEDDING_MODEL_NAME
+
+def train_bertopic_model(docs, embed_workers=None):
     """训练 BERTopic 模型 (支持 GPU 加速)"""
     _lazy_load_sentence_transformers()
     _lazy_load_bertopic()
@@ -595,7 +645,7 @@ def train_bertopic_model(docs):
         print("[BERTopic] Hardware acceleration (DirectML) not found, using CPU.")
 
     print("[BERTopic] Loading embedding model (multilingual-MiniLM)...")
-    embedding_model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2", device=device)
+    embedding_model = load_embedding_model(device=device)
     
     print("[BERTopic] Configuring vectorizer...")
     # BERTopic using the robust tokenizer
@@ -611,18 +661,111 @@ def train_bertopic_model(docs):
         nr_topics="auto"
     )
     
-    topics, probs = topic_model.fit_transform(docs)
+    # 句向量经由磁盘缓存获取，语料不变时重训练无需重新编码；
+    # embed_workers > 1 时未命中的文档分片到多个进程编码
+    if embed_workers and embed_workers > 1:
+        from parallel_embedding import parallel_embed_texts
+        embeddings = parallel_embed_texts(docs, workers=embed_workers)
+    else:
+        embeddings = embed_texts(docs, embedding_model)
+    topics, probs = topic_model.fit_transform(docs, embeddings=embeddings)
     return topic_model, topics, probs
 
-def save_bertopic_model(model):
-    """保存模型"""
-    if not os.path.exists(os.path.dirname(MODEL_DIR)):
-        os.makedirs(os.path.dirname(MODEL_DIR))
-    model.save(MODEL_DIR, serialization="safetensors", save_ctfidf=True)
-    print(f"[BERTopic] Model saved to {MODEL_DIR}")
+def _model_versions_dir():
+    return os.path.join(MODEL_DIR, 'versions')
+
+def _current_pointer_path():
+    return os.path.join(MODEL_DIR, 'current.json')
 
-def load_bertopic_model():
-    """加载模型 (支持 GPU 加速)"""
+def get_current_model_version():
+    """当前生效的模型版本号；旧版平铺目录返回 'legacy'，没有模型返回 None"""
+    try:
+        with open(_current_pointer_path(), 'r', encoding='utf-8') as f:
+            version = json.load(f).get('version')
+        if version and os.path.isdir(os.path.join(_model_versions_dir(), version)):
+            return version
+    except (OSError, ValueError):
+        pass
+    if os.path.exists(os.path.join(MODEL_DIR, 'topics.json')):
+        return 'legacy'
+    return None
+
+def list_model_versions():
+    """versions/ 下已保存的模型版本号 (升序)"""
+    versions_dir = _model_versions_dir()
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(v for v in os.listdir(versions_dir) if os.path.isdir(os.path.join(versions_dir, v)))
+
+def set_current_model_version(version):
+    """把 current.json 指向已保存的版本 (训练保存新版本或手动回滚时调用)"""
+    # 先写临时文件再 os.replace，读取方不会看到写了一半的指针
+    tmp_path = _current_pointer_path() + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': version}, f)
+    os.replace(tmp_path, _current_pointer_path())
+
+def get_model_dir(version=None):
+    """模型版本对应的目录 (默认为当前版本)"""
+    version = version or get_current_model_version()
+    if version is None:
+        return None
+    if version == 'legacy':
+        return MODEL_DIR
+    return os.path.join(_model_versions_dir(), version)
+
+def get_model_metadata(version=None):
+    """读取模型版本的元数据 (训练方式、上游版本、覆盖的最大诗歌ID等)"""
+    model_dir = get_model_dir(version)
+    path = os.path.join(model_dir, 'version.json') if model_dir else None
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_bertopic_model(model, metadata=None):
+    """保存模型为新版本，并原子地切换 current.json 指针，返回版本号"""
+    versions_dir = _model_versions_dir()
+    os.makedirs(versions_dir, exist_ok=True)
+
+    version = time.strftime('%Y%m%d-%H%M%S')
+    suffix = 1
+    while os.path.exists(os.path.join(versions_dir, version)):
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+        suffix += 1
+    version_dir = os.path.join(versions_dir, version)
+
+    model.save(version_dir, serialization="safetensors", save_ctfidf=True)
+    info = dict(metadata or {})
+    info.update({
+        'version': version,
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'num_topics': len([t for t in model.get_topics() if t != -1]),
+        # 向量矩阵与该标识绑定：热切换时标识不同才需要重建向量矩阵
+        'embedding_model': embedding_cache_name()
+    })
+    with open(os.path.join(version_dir, 'version.json'), 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+
+    set_current_model_version(version)
+    print(f"[BERTopic] Model saved to {version_dir} (version {version})")
+
+    _prune_model_versions(keep=MODEL_KEEP_VERSIONS)
+    return version
+
+def _prune_model_versions(keep):
+    """只保留最近 keep 个版本 (当前版本始终保留)"""
+    versions_dir = _model_versions_dir()
+    if keep <= 0 or not os.path.isdir(versions_dir):
+        return
+    current = get_current_model_version()
+    versions = sorted(os.listdir(versions_dir))
+    for version in versions[:-keep]:
+        if version != current:
+            shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+
+def load_bertopic_model(version=None):
+    """加载模型 (支持 GPU 加速)；默认加载 current.json 指向的版本"""
     _lazy_load_bertopic()
     # 硬件加速检测
     device = "cpu"
@@ -632,13 +775,13 @@ def load_bertopic_model():
     except ImportError:
         pass
 
-    if os.path.exists(MODEL_DIR):
+    model_dir = get_model_dir(version)
+    if model_dir and os.path.exists(model_dir):
         try:
             print(f"[BERTopic] Loading embedding model on {device}...")
-            _lazy_load_sentence_transformers()
-            embedding_model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2", device=device)
-            print("[BERTopic] Loading BERTopic model...")
-            model = BERTopic.load(MODEL_DIR, embedding_model=embedding_model)
+            embedding_model = load_embedding_model(device=device)
+            print(f"[BERTopic] Loading BERTopic model ({os.path.relpath(model_dir, BASE_DIR)})...")
+            model = BERTopic.load(model_dir, embedding_model=embedding_model)
             print("[BERTopic] Model loaded successfully.")
             return model
         except Exception as e:
@@ -648,15 +791,75 @@ def load_bertopic_model():
             return None
     return None
 
+def incremental_update_model(new_docs, base_model=None, min_similarity=0.7):
+    """只在新文档上拟合小模型并合并进已有模型
+
+    BERTopic.merge_models 以第一个模型为基准：已有主题ID保持不变，与已有
+    主题相似度低于 min_similarity 的新主题追加在末尾。返回 (merged_model, stats)；
+    新文档太少无法聚类时返回 (base_model, stats)。
+    """
+    _lazy_load_bertopic()
+    base_model = base_model or load_bertopic_model()
+    if base_model is None:
+        raise RuntimeError("没有可供增量更新的已有模型，请先全量训练")
+
+    stats = {'new_docs': len(new_docs), 'base_topics': len(base_model.get_topics()) - base_model._outliers}
+    if len(new_docs) < INCREMENTAL_MIN_DOCS:
+        print(f"[BERTopic] Only {len(new_docs)} new documents, skipping incremental update.")
+        stats.update({'merged': False, 'new_topics': 0})
+        return base_model, stats
+
+    from umap import UMAP
+    from hdbscan import HDBSCAN
+
+    embedding_model = load_embedding_model()
+    embeddings = embed_texts(new_docs, embedding_model)
+
+    # 小语料上的聚类参数需要随文档数收缩
+    n_neighbors = max(2, min(15, len(new_docs) - 1))
+    min_cluster_size = max(3, min(10, len(new_docs) // 20))
+    new_model = BERTopic(
+        embedding_model=embedding_model,
+        vectorizer_model=CountVectorizer(tokenizer=tokenize_zh),
+        umap_model=UMAP(n_neighbors=n_neighbors, n_components=5, min_dist=0.0,
+                        metric='cosine', random_state=42),
+        hdbscan_model=HDBSCAN(min_cluster_size=min_cluster_size, metric='euclidean',
+                              cluster_selection_method='eom', prediction_data=True),
+        language="multilingual",
+        calculate_probabilities=False
+    )
+    print(f"[BERTopic] Fitting incremental model on {len(new_docs)} documents...")
+    new_model.fit(new_docs, embeddings=embeddings)
+
+    merged = BERTopic.merge_models([base_model, new_model], min_similarity=min_similarity,
+                                   embedding_model=embedding_model)
+    stats.update({
+        'merged': True,
+        'new_topics': (len(merged.get_topics()) - merged._outliers) - stats['base_topics']
+    })
+    print(f"[BERTopic] Merged model: {stats['base_topics']} -> "
+          f"{stats['base_topics'] + stats['new_topics']} topics")
+    return merged, stats
+
+def _encode_texts(texts, model):
+    """直接调用模型编码 (不经过缓存)；model 可以是 BERTopic 或句向量模型"""
+    encoder = model.embedding_model if hasattr(model, 'get_topic_info') else model
+    if hasattr(encoder, 'embed'):
+        return encoder.embed(texts)
+    return encoder.encode(texts)
+
+def embed_texts(texts, model):
+    """经由持久化向量缓存批量获取文档向量，返回 (n, dim) float32 矩阵"""
+    from embedding_cache import get_embedding_store
+    store = get_embedding_store(embedding_cache_name())
+    return store.get_or_compute(list(texts), lambda missing: _encode_texts(missing, model))
+
 def get_document_vector(text, model):
     """获取文档的向量表示"""
     if not model or not text:
         return None
     try:
-        if hasattr(model.embedding_model, 'embed'):
-            embeddings = model.embedding_model.embed([text])
-            return embeddings[0]
-        return model.embedding_model.encode(text)
+        return embed_texts([text], model)[0]
     except Exception:
         return None
 
@@ -665,9 +868,7 @@ def batch_get_vectors(texts, model):
     if not model or not texts:
         return []
     try:
-        if hasattr(model.embedding_model, 'embed'):
-            return model.embedding_model.embed(texts)
-        return model.embedding_model.encode(texts)
+        return embed_texts(texts, model)
     except Exception:
         return []
 
@@ -687,7 +888,7 @@ def predict_topic(text, model):
     
     # 1. 全局预测 (用于推荐引擎的 Topic ID)
     try:
-        topics, _ = model.transform([text])
+        topics, _ = model.transform([text], embeddings=embed_texts([text], model))
         topic_id = topics[0]
     except Exception:
         return -1, get_individual_keywords(text)
@@ -698,6 +899,97 @@ def predict_topic(text, model):
     
     return topic_id, topic_name
 
+def predict_topic_ids(texts, model):
+    """一次 transform 预测整批文本的主题ID (不提取关键词)，失败时全部为 -1"""
+    texts = list(texts)
+    if not texts or not model:
+        return [-1] * len(texts)
+    try:
+        topics, _ = model.transform(texts, embeddings=embed_texts(texts, model))
+    except Exception:
+        return [-1] * len(texts)
+    return [int(tid) for tid in topics]
+
+def predict_topics(texts, model):
+    """批量预测主题: 一次 transform 处理整批文本，返回 [(topic_id, topic_name), ...]"""
+    if not texts:
+        return []
+    texts = list(texts)
+    names = [get_individual_keywords(t) for t in texts]
+    return list(zip(predict_topic_ids(texts, model), names))
+
+# 主题中心向量缓存: (model, topic_ids, 归一化中心矩阵)，模型切换后自动重建
+_topic_centroid_cache = None
+
+def _get_topic_centroids(model):
+    """取出模型的主题中心向量 (topic_embeddings_)，去掉离群主题 -1 并按行归一化"""
+    global _topic_centroid_cache
+    cached = _topic_centroid_cache
+    if cached is not None and cached[0] is model:
+        return cached[1], cached[2]
+
+    embeddings = getattr(model, 'topic_embeddings_', None)
+    if embeddings is None:
+        return None, None
+    centroids = np.asarray(embeddings, dtype=np.float32)
+    # topic_embeddings_ 的第 i 行对应主题 i - _outliers (存在离群主题时第 0 行为 -1)
+    topic_ids = np.arange(len(centroids)) - int(getattr(model, '_outliers', 0))
+    keep = topic_ids != -1
+    topic_ids, centroids = topic_ids[keep], centroids[keep]
+    if not len(topic_ids):
+        return None, None
+    centroids /= np.clip(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12, None)
+
+    _topic_centroid_cache = (model, topic_ids, centroids)
+    return topic_ids, centroids
+
+def assign_topics_from_embeddings(embeddings, model):
+    """用已计算好的文档向量分配主题 (最近主题中心，余弦相似度)
+
+    不重新编码文本，也不经过 UMAP/HDBSCAN，适用于向量已在
+    topic_matrix 或向量缓存中的诗歌。模型没有主题中心向量时返回 None。
+    """
+    topic_ids, centroids = _get_topic_centroids(model) if model else (None, None)
+    if topic_ids is None:
+        return None
+    vectors = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    if vectors.shape[1] != centroids.shape[1]:
+        return None
+    scores = vectors @ centroids.T
+    return topic_ids[np.argmax(scores, axis=1)]
+
+def predict_topic_from_vector(vector, model, text=None):
+    """基于已有向量预测主题，返回 (topic_id, topic_name)；无法直接分配时退回 predict_topic"""
+    if vector is None:
+        return predict_topic(text, model) if text else (-1, "未知")
+    try:
+        topics = assign_topics_from_embeddings(vector, model)
+    except Exception:
+        topics = None
+    if topics is None:
+        return predict_topic(text, model) if text else (-1, "未知")
+    topic_id = int(topics[0])
+    topic_name = get_individual_keywords(text) if text else get_topic_info(model, topic_id)
+    return topic_id, topic_name
+
+def predict_topics_from_vectors(vectors, model, texts=None):
+    """批量版 predict_topic_from_vector，返回 [(topic_id, topic_name), ...]"""
+    if vectors is None or not len(vectors):
+        return []
+    try:
+        topics = assign_topics_from_embeddings(vectors, model)
+    except Exception:
+        topics = None
+    if topics is None:
+        if texts:
+            return predict_topics(texts, model)
+        return [(-1, "未知")] * len(vectors)
+    if texts:
+        names = [get_individual_keywords(t) for t in texts]
+    else:
+        names = [get_topic_info(model, int(tid)) for tid in topics]
+    return [(int(tid), name) for tid, name in zip(topics, names)]
+
 def get_all_topics(model):
     """获取所有全局主题描述"""
     if not model:
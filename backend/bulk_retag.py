@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+诗歌批量重新打标
+
+训练完新模型后需要为全部诗歌重新生成 Bertopic / Real_topic 标签。这里按主键
+分块流式读取 (id, content, author)，不再一次性 Poem.query.all()：
+1. 关键词与 Real_topic 在多进程中并行提取 (jieba 是纯 Python，受 GIL 限制)；
+   两个字段都只取决于诗歌文本，不需要模型 transform
+2. bulk_update_mappings 批量写回，每块提交后记录断点，中断后可 --resume 续跑；
+   断点按任务类型与起始ID分文件保存，不同任务 (或并发任务) 互不覆盖
+
+用法 (由 train_bertopic.py / quick_train_bertopic.py 调用):
+    python train_bertopic.py --mode retag --resume
+"""
+
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from models import db, Poem
+import bertopic_analysis
+
+
+class RetagConfig:
+    """批量重新打标配置"""
+
+    # 每块诗歌数 (一次提交)
+    CHUNK_SIZE = 256
+
+    # 关键词提取进程数
+    WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+    # 断点文件目录 (每个任务一个 retag_checkpoint-<任务>[-after<起始ID>].json)
+    CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saved_models')
+
+
+def default_real_topic(content, author=None):
+    """train_bertopic 使用的 Real_topic 生成规则"""
+    return bertopic_analysis.generate_real_topic(content, author=author)
+
+
+# 子进程内的 Real_topic 生成函数 (由 _init_worker 设置)
+_real_topic_fn = default_real_topic
+
+
+def _init_worker(real_topic_fn):
+    global _real_topic_fn
+    _real_topic_fn = real_topic_fn
+    import jieba
+    jieba.initialize()
+    bertopic_analysis.load_stopwords()
+
+
+def _extract_tags(item):
+    """提取单首诗的 (Bertopic 关键词, Real_topic)"""
+    content, author = item
+    return bertopic_analysis.get_individual_keywords(content), _real_topic_fn(content, author)
+
+
+def checkpoint_path(job, start_after=0):
+    """任务 (类型 + 起始ID) 对应的断点文件"""
+    name = f"retag_checkpoint-{job}" + (f"-after{start_after}" if start_after else '')
+    return os.path.join(RetagConfig.CHECKPOINT_DIR, name + '.json')
+
+
+def load_checkpoint(job, start_after=0, real_topic=None):
+    """读取断点，返回 (最后一个已提交块的末尾诗歌ID, 已处理数)；Real_topic 规则不同时不续跑"""
+    path = checkpoint_path(job, start_after)
+    if not os.path.exists(path):
+        return 0, 0
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception:
+        return 0, 0
+    if data.get('job') != job or data.get('real_topic') != real_topic:
+        return 0, 0
+    return int(data.get('last_id', 0)), int(data.get('processed', 0))
+
+
+def save_checkpoint(job, start_after, last_id, processed, real_topic=None):
+    path = checkpoint_path(job, start_after)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'job': job, 'start_after': start_after, 'real_topic': real_topic,
+                   'last_id': last_id, 'processed': processed, 'updated_at': time.time()}, f)
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint(job, start_after=0):
+    """只删除当前任务的断点"""
+    path = checkpoint_path(job, start_after)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def iter_poem_chunks(chunk_size, start_after=0):
+    """按主键分块流式读取 (id, content, author)，每块一次查询"""
+    last_id = start_after
+    while True:
+        rows = db.session.query(Poem.id, Poem.content, Poem.author) \
+            .filter(Poem.id > last_id) \
+            .order_by(Poem.id.asc()) \
+            .limit(chunk_size).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def bulk_retag_poems(job='train', real_topic_fn=default_real_topic,
+                     chunk_size=None, workers=None, resume=False, start_after=0):
+    """为诗歌重新生成 Bertopic / Real_topic 标签 (需在应用上下文中调用)
+
+    start_after: 只处理ID大于该值的诗歌 (增量更新时只重标新诗)
+    """
+    chunk_size = chunk_size or RetagConfig.CHUNK_SIZE
+    workers = RetagConfig.WORKERS if workers is None else max(1, int(workers))
+
+    # 断点以调用参数为键，续跑时推进的起始ID不影响断点文件
+    task = (job, start_after)
+    real_topic = f"{real_topic_fn.__module__}.{real_topic_fn.__qualname__}"
+    processed = 0
+    if resume:
+        checkpoint_id, processed = load_checkpoint(*task, real_topic=real_topic)
+        start_after = max(start_after, checkpoint_id)
+    else:
+        clear_checkpoint(*task)
+    total = Poem.query.filter(Poem.id > start_after).count() + processed
+    if start_after:
+        print(f"[Retag] Starting after poem id {start_after} ({processed}/{total} done)")
+
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(real_topic_fn,))
+    else:
+        _init_worker(real_topic_fn)
+
+    done_this_run = 0
+    start = time.time()
+    try:
+        for rows in iter_poem_chunks(chunk_size, start_after):
+            items = [(r.content or '', r.author) for r in rows]
+
+            if pool:
+                tags = pool.map(_extract_tags, items, chunksize=max(1, len(items) // (workers * 4)))
+            else:
+                tags = map(_extract_tags, items)
+
+            mappings = [
+                {'id': r.id, 'Bertopic': bertopic_name, 'Real_topic': real_topic}
+                for r, (bertopic_name, real_topic) in zip(rows, tags)
+            ]
+            db.session.bulk_update_mappings(Poem, mappings)
+            db.session.commit()
+
+            processed += len(rows)
+            done_this_run += len(rows)
+            save_checkpoint(*task, rows[-1].id, processed, real_topic=real_topic)
+
+            elapsed = time.time() - start
+            rate = done_this_run / elapsed if elapsed > 0 else 0.0
+            print(f"  - Progress: {processed}/{total} ({rate:.1f} docs/s)")
+    finally:
+        if pool:
+            pool.shutdown()
+
+    clear_checkpoint(*task)
+    elapsed = time.time() - start
+    rate = done_this_run / elapsed if elapsed > 0 else 0.0
+    print(f"[Retag] {done_this_run} poems in {elapsed:.1f}s ({rate:.1f} docs/s, "
+          f"chunk={chunk_size}, workers={workers})")
+    return done_this_run
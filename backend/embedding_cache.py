@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化句向量缓存
+
+以 "模型名 + 规范化文本" 的哈希为键，把向量追加写入 float32 平铺文件，
+并用偏移索引 (哈希 -> 行号) 定位；读取时通过内存映射访问，前面再加一层
+LRU 内存缓存。语料不变时重跑矩阵构建、训练或打标几乎不再调用模型。
+
+目录结构: saved_models/embedding_cache/<模型名>/
+    vectors.f32   连续存放的 float32 向量 (行数 x 维度)
+    index.tsv     每行 "哈希<TAB>行号"
+    meta.json     {"model_name": ..., "dim": ...}
+"""
+
+import os
+import json
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只做进程内加锁
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_ROOT = os.path.join(BASE_DIR, 'saved_models', 'embedding_cache')
+
+# LRU 前置缓存容量 (向量条数)
+FRONT_CACHE_SIZE = 4096
+
+
+def normalize_text(text):
+    """规范化文本: Unicode NFC + 折叠空白"""
+    text = unicodedata.normalize('NFC', text or '')
+    return ' '.join(text.split())
+
+
+def text_key(text, model_name):
+    """缓存键: 模型名与规范化文本的哈希"""
+    raw = f"{model_name}\x00{normalize_text(text)}".encode('utf-8')
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+class EmbeddingStore:
+    """单个模型的磁盘向量缓存"""
+
+    def __init__(self, model_name, cache_root=CACHE_ROOT, front_cache_size=FRONT_CACHE_SIZE):
+        self.model_name = model_name
+        slug = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in model_name)
+        self.cache_dir = os.path.join(cache_root, slug)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.vectors_path = os.path.join(self.cache_dir, 'vectors.f32')
+        self.index_path = os.path.join(self.cache_dir, 'index.tsv')
+        self.meta_path = os.path.join(self.cache_dir, 'meta.json')
+        self.lock_path = os.path.join(self.cache_dir, '.lock')
+
+        self._lock = threading.RLock()
+        self._index = {}
+        self._index_offset = 0  # index.tsv 已读取的字节数
+        self._rows = 0
+        self._mmap = None
+        self._mmap_rows = 0
+        self.dim = None
+
+        self.front_cache_size = front_cache_size
+        self._front = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+        self._load_meta()
+        self._refresh_index()
+
+    # ---------- 元数据与索引 ----------
+
+    def _load_meta(self):
+        if os.path.exists(self.meta_path):
+            try:
+                with open(self.meta_path, 'r', encoding='utf-8') as f:
+                    self.dim = json.load(f).get('dim')
+            except Exception:
+                self.dim = None
+
+    def _write_meta(self):
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'model_name': self.model_name, 'dim': self.dim}, f)
+        os.replace(tmp, self.meta_path)
+
+    def _refresh_index(self):
+        """增量读取 index.tsv (其他进程可能追加了新条目)"""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # 另一个进程尚未写完的行
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) == 2:
+                    self._index[parts[0]] = int(parts[1])
+                self._index_offset += len(line.encode('utf-8'))
+        if self.dim and os.path.exists(self.vectors_path):
+            self._rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+
+    def _vectors(self):
+        """返回覆盖全部已写入行的只读内存映射"""
+        if self._mmap is None or self._mmap_rows != self._rows:
+            if self._rows == 0:
+                return None
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode='r',
+                                   shape=(self._rows, self.dim))
+            self._mmap_rows = self._rows
+        return self._mmap
+
+    # ---------- LRU 前置缓存 ----------
+
+    def _front_get(self, key):
+        vec = self._front.get(key)
+        if vec is not None:
+            self._front.move_to_end(key)
+        return vec
+
+    def _front_put(self, key, vec):
+        self._front[key] = vec
+        self._front.move_to_end(key)
+        while len(self._front) > self.front_cache_size:
+            self._front.popitem(last=False)
+
+    # ---------- 读写 ----------
+
+    def lookup(self, keys):
+        """批量查找，返回与 keys 对齐的向量列表 (未命中为 None)"""
+        with self._lock:
+            results = [None] * len(keys)
+            pending = []
+            for i, key in enumerate(keys):
+                vec = self._front_get(key)
+                if vec is not None:
+                    results[i] = vec
+                else:
+                    pending.append(i)
+
+            if pending and any(keys[i] not in self._index for i in pending):
+                self._refresh_index()
+
+            vectors = self._vectors() if pending else None
+            for i in pending:
+                row = self._index.get(keys[i])
+                if row is None or vectors is None or row >= vectors.shape[0]:
+                    continue
+                vec = np.array(vectors[row])
+                self._front_put(keys[i], vec)
+                results[i] = vec
+            return results
+
+    def append(self, keys, vectors):
+        """把新向量追加写入磁盘并登记索引"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(keys) != vectors.shape[0]:
+            raise ValueError("keys 与向量行数不一致")
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._write_meta()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度不匹配: {vectors.shape[1]} != {self.dim}")
+
+            with open(self.lock_path, 'a') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh_index()
+                    fresh = [(k, v) for k, v in zip(keys, vectors) if k not in self._index]
+                    if fresh:
+                        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+                        start_row = size // (4 * self.dim)
+                        if size != start_row * 4 * self.dim:
+                            # 之前的追加写到一半中断，截掉不完整的行，否则之后的行号全部错位
+                            os.truncate(self.vectors_path, start_row * 4 * self.dim)
+                        block = np.stack([v for _, v in fresh]).astype(np.float32, copy=False)
+                        with open(self.vectors_path, 'ab') as f:
+                            f.write(block.tobytes())
+                            f.flush()
+                            os.fsync(f.fileno())
+                        lines = ''.join(f"{k}\t{start_row + i}\n" for i, (k, _) in enumerate(fresh))
+                        with open(self.index_path, 'a', encoding='utf-8') as f:
+                            f.write(lines)
+                        self._refresh_index()
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+            for key, vec in zip(keys, vectors):
+                self._front_put(key, np.array(vec))
+
+    def get_or_compute(self, texts, encode_fn):
+        """
+        返回 texts 对应的 (n, dim) float32 向量矩阵。
+        只有缓存未命中的文本 (去重后) 才会交给 encode_fn 批量编码。
+        """
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+
+        keys = [text_key(t, self.model_name) for t in texts]
+        cached = self.lookup(keys)
+
+        missing = OrderedDict()
+        for i, vec in enumerate(cached):
+            if vec is None:
+                missing.setdefault(keys[i], texts[i])
+
+        with self._lock:
+            self.hits += len(texts) - sum(1 for v in cached if v is None)
+            self.misses += len(missing)
+
+        if missing:
+            miss_keys = list(missing.keys())
+            encoded = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            if encoded.ndim == 1:
+                encoded = encoded.reshape(1, -1)
+            self.append(miss_keys, encoded)
+            fresh = dict(zip(miss_keys, encoded))
+            cached = [vec if vec is not None else fresh[keys[i]] for i, vec in enumerate(cached)]
+
+        return np.stack(cached).astype(np.float32, copy=False)
+
+    def get_stats(self):
+        return {
+            'model_name': self.model_name,
+            'rows': self._rows,
+            'dim': self.dim,
+            'front_cache': len(self._front),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store(model_name):
+    """按模型名获取 (并缓存) 向量存储实例"""
+    with _stores_lock:
+        store = _stores.get(model_name)
+        if store is None:
+            store = EmbeddingStore(model_name)
+            _stores[model_name] = store
+        return store
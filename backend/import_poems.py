@@ -1,8 +1,8 @@
-import json
 import os
 from datetime import datetime
 from models import db, Poem
 from app import app
+from poetry_corpus import POETRY_DATA_DIR, iter_json_array
 
 # 配置日志
 import logging
@@ -65,17 +65,14 @@ def get_rhythm_type_from_tags(tags):
 
 def import_poems():
     """导入唐诗三百首数据"""
-    # 读取JSON文件
-    json_file_path = r'c:\PostG\data\chinese-poetry\全唐诗\唐诗三百首.json'
-    
-    try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            poems_data = json.load(f)
-        logger.info(f"成功读取JSON文件，共包含 {len(poems_data)} 首诗歌")
-    except Exception as e:
-        logger.error(f"读取JSON文件失败: {str(e)}")
+    # 流式读取JSON文件，不一次性载入整个数组
+    json_file_path = os.path.join(POETRY_DATA_DIR, '全唐诗', '唐诗三百首.json')
+    if not os.path.exists(json_file_path):
+        logger.error(f"读取JSON文件失败: {json_file_path} 不存在")
         return False
+    poems_data = iter_json_array(json_file_path)
     
+    total_count = 0
     success_count = 0
     failure_count = 0
     failure_reasons = []
@@ -83,6 +80,7 @@ def import_poems():
     # 使用Flask应用上下文
     with app.app_context():
         for i, poem_item in enumerate(poems_data, 1):
+            total_count = i
             try:
                 # 数据清洗和映射
                 title = clean_text(poem_item.get('title', ''))
@@ -145,7 +143,7 @@ def import_poems():
     logger.info("=" * 50)
     logger.info("导入报告")
     logger.info("=" * 50)
-    logger.info(f"总条目数: {len(poems_data)}")
+    logger.info(f"总条目数: {total_count}")
     logger.info(f"成功导入: {success_count}")
     logger.info(f"导入失败: {failure_count}")
     
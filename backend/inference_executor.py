@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求路径上的模型推理执行器
+
+add_review 的同步打标、新诗入库时的向量计算等模型调用原本直接在 Flask 请求线程里
+执行。几个请求同时推理时，每个 torch 调用又各自开满 intra-op 线程，CPU 被过度订阅，
+尾延迟急剧上升，连 /api/poem/<id> 这类轻量接口也被拖慢。
+
+这里把模型调用统一交给一个并发数受限的线程池:
+- 同时推理的调用数 = CONCURRENCY，torch intra-op 线程数 = 核心数 / CONCURRENCY，
+  interop 线程数固定为 1，总线程数不超过核心数
+- 每次调用带截止时间，排队超时的调用直接取消 (不再占用推理资源)，调用方走降级逻辑
+- 排队长度超过 MAX_QUEUE 时立即拒绝，避免请求线程无限堆积
+- 按调用类别统计排队等待与实际计算耗时，/api/admin/inference/stats 查看
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import jsonify
+
+
+def _env_int(name, default):
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except (TypeError, ValueError):
+        return default
+
+
+class InferenceExecutorConfig:
+    """推理执行器配置"""
+
+    # 同时执行的模型调用数
+    CONCURRENCY = _env_int('POSTG_INFERENCE_CONCURRENCY', 2)
+
+    # 每个调用可用的 torch intra-op 线程数 (默认把核心平均分给并发调用)
+    INTRA_OP_THREADS = _env_int('POSTG_INFERENCE_THREADS', max(1, (os.cpu_count() or 1) // CONCURRENCY))
+
+    # torch interop 线程数 (请求路径上的小批量推理不需要算子间并行)
+    INTEROP_THREADS = 1
+
+    # 默认截止时间（秒）；None 表示不限 (后台批处理)
+    DEFAULT_TIMEOUT = 5.0
+
+    # 排队中的调用数上限，超过时直接拒绝
+    MAX_QUEUE = 64
+
+    # 每类调用保留的耗时样本数 (用于计算分位数)
+    SAMPLE_SIZE = 512
+
+
+class InferenceRejected(Exception):
+    """推理调用未执行 (排队已满 / 超过截止时间)"""
+
+
+class InferenceTimeout(InferenceRejected):
+    """调用在截止时间内未完成"""
+
+
+class _CallStats:
+    """单类调用的排队等待与计算耗时统计"""
+
+    def __init__(self, sample_size):
+        self.calls = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.errors = 0
+        self.wait_samples = deque(maxlen=sample_size)
+        self.compute_samples = deque(maxlen=sample_size)
+
+    @staticmethod
+    def _summary(samples):
+        if not samples:
+            return {'p50_ms': None, 'p95_ms': None, 'max_ms': None}
+        ordered = sorted(samples)
+        n = len(ordered)
+        return {
+            'p50_ms': round(ordered[n // 2] * 1000, 2),
+            'p95_ms': round(ordered[min(n - 1, int(n * 0.95))] * 1000, 2),
+            'max_ms': round(ordered[-1] * 1000, 2)
+        }
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'timeouts': self.timeouts,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'queue_wait': self._summary(self.wait_samples),
+            'compute': self._summary(self.compute_samples)
+        }
+
+
+class InferenceExecutor:
+    """并发数受限、带截止时间的推理执行器 (进程内单例)"""
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self._initialized = True
+        self.concurrency = InferenceExecutorConfig.CONCURRENCY
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='inference')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._stats = {}
+        self._torch_threads = None
+
+    def _configure_torch(self):
+        """设置 torch 线程数 (进程级设置，只在 torch 已被模型加载导入后执行一次)
+
+        sidecar 模式下 worker 不加载 torch，这里也不主动导入。
+        """
+        if self._torch_threads is not None or 'torch' not in sys.modules:
+            return
+        torch = sys.modules['torch']
+        intra = InferenceExecutorConfig.INTRA_OP_THREADS
+        interop = InferenceExecutorConfig.INTEROP_THREADS
+        try:
+            torch.set_num_threads(intra)
+            try:
+                torch.set_num_interop_threads(interop)
+            except RuntimeError:
+                # interop 线程池在首次并行计算后不可再修改 (例如启动预热已经推理过)
+                interop = torch.get_num_interop_threads()
+        except Exception as e:
+            print(f"[InferenceExecutor] Failed to set torch threads: {e}")
+            self._torch_threads = {}
+            return
+        self._torch_threads = {'intra_op': intra, 'interop': interop}
+        print(f"[InferenceExecutor] torch threads: intra-op={intra}, interop={interop}, "
+              f"concurrency={self.concurrency}")
+
+    def _call_stats(self, label):
+        stats = self._stats.get(label)
+        if stats is None:
+            stats = self._stats.setdefault(label, _CallStats(InferenceExecutorConfig.SAMPLE_SIZE))
+        return stats
+
+    def _execute(self, label, fn, args, kwargs, submitted, deadline):
+        started = time.perf_counter()
+        with self._lock:
+            self._pending -= 1
+            self._call_stats(label).wait_samples.append(started - submitted)
+            if deadline is not None and started > deadline:
+                # 在队列里已经等过了截止时间，调用方早已放弃，不再计算
+                raise InferenceTimeout(f"{label} 排队超过截止时间")
+            self._running += 1
+        try:
+            self._configure_torch()
+            self._local.active = True
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._local.active = False
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._call_stats(label).compute_samples.append(time.perf_counter() - started)
+
+    def run(self, label, fn, *args, timeout=InferenceExecutorConfig.DEFAULT_TIMEOUT, **kwargs):
+        """在推理线程池中执行 fn(*args, **kwargs) 并等待结果
+
+        timeout: 截止时间（秒，含排队），None 表示一直等待。
+        超时抛出 InferenceTimeout，排队已满抛出 InferenceRejected，fn 自身的异常原样抛出。
+        """
+        # 已经在推理线程中 (嵌套调用) 时直接执行，避免占满线程池后自己等自己
+        if getattr(self._local, 'active', False):
+            return fn(*args, **kwargs)
+
+        with self._lock:
+            stats = self._call_stats(label)
+            stats.calls += 1
+            if self._pending >= InferenceExecutorConfig.MAX_QUEUE:
+                stats.rejected += 1
+                raise InferenceRejected(f"推理队列已满 ({self._pending})")
+            self._pending += 1
+
+        submitted = time.perf_counter()
+        deadline = submitted + timeout if timeout is not None else None
+        future = self._pool.submit(self._execute, label, fn, args, kwargs, submitted, deadline)
+        try:
+            return future.result(timeout=timeout)
+        except (FutureTimeoutError, InferenceTimeout):
+            with self._lock:
+                stats.timeouts += 1
+            if future.cancel():
+                # 还没开始执行: 直接从队列中移除
+                with self._lock:
+                    self._pending -= 1
+            raise InferenceTimeout(f"{label} 超过截止时间 {timeout}s")
+        except Exception:
+            with self._lock:
+                stats.errors += 1
+            raise
+
+    def get_stats(self):
+        with self._lock:
+            calls = {label: stats.to_dict() for label, stats in self._stats.items()}
+            pending, running = self._pending, self._running
+        return {
+            'concurrency': self.concurrency,
+            'max_queue': InferenceExecutorConfig.MAX_QUEUE,
+            'default_timeout': InferenceExecutorConfig.DEFAULT_TIMEOUT,
+            'torch_threads': self._torch_threads,
+            'pending': pending,
+            'running': running,
+            'calls': calls
+        }
+
+
+inference_executor = InferenceExecutor()
+
+
+def run_inference(label, fn, *args, timeout=InferenceExecutorConfig.DEFAULT_TIMEOUT, **kwargs):
+    """在推理执行器中执行模型调用"""
+    return inference_executor.run(label, fn, *args, timeout=timeout, **kwargs)
+
+
+def add_inference_routes(app):
+    """添加推理执行器统计接口"""
+
+    @app.route('/api/admin/inference/stats')
+    def get_inference_stats():
+        """各类模型调用的排队等待 / 计算耗时分位数"""
+        return jsonify(inference_executor.get_stats())
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本机推理 sidecar (可选)
+
+多个 gunicorn worker 各自加载 MiniLM 与 BERTopic 会成倍增加内存与启动时间。
+sidecar 进程独占模型，通过 Unix domain socket 接收请求，并把同时到达的请求
+合并成动态批次 (凑满 MAX_BATCH 条或等待 MAX_WAIT_MS 即执行) 一次推理。
+
+Web worker 的模型注册表在 sidecar 可用时持有 RemoteBERTopic 代理而不加载模型，
+get_document_vector / batch_get_vectors / predict_topic 等照常把它当作模型使用，
+实际推理经由 InferenceClient 完成；sidecar 不可用时代理退回进程内模型。
+
+启动: python inference_service.py --socket /tmp/postg-inference.sock
+启用: worker 设置环境变量 POSTG_INFERENCE_SOCKET=/tmp/postg-inference.sock
+
+协议: 每帧 = 4 字节大端头长度 + JSON 头 (+ 头中 nbytes 指定长度的二进制负载)；
+向量以 float32 原始字节传输，形状见头中的 shape。
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import traceback
+import socketserver
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class InferenceConfig:
+    """推理 sidecar 配置"""
+
+    # Unix socket 路径 (未设置时不使用 sidecar)
+    SOCKET_PATH = os.environ.get('POSTG_INFERENCE_SOCKET')
+
+    # 动态批次: 最多合并的文本数 / 第一条请求到达后最多等待的毫秒数
+    MAX_BATCH = 64
+    MAX_WAIT_MS = 5
+
+    # 客户端单次调用超时（秒）
+    CLIENT_TIMEOUT = 10
+
+    # 调用失败后暂停使用 sidecar 的时间（秒），期间直接进程内推理
+    RETRY_INTERVAL = 30
+
+
+class InferenceUnavailable(Exception):
+    """sidecar 不可用 (未启动 / 超时 / 返回错误)"""
+
+
+def _send_frame(sock, header, payload=b''):
+    header = dict(header, nbytes=len(payload))
+    data = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    sock.sendall(struct.pack('>I', len(data)) + data + payload)
+
+
+def _recv_exact(sock, n):
+    chunks = []
+    while n > 0:
+        chunk = sock.recv(min(n, 1 << 20))
+        if not chunk:
+            raise ConnectionError('连接已关闭')
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b''.join(chunks)
+
+
+def _recv_frame(sock):
+    (length,) = struct.unpack('>I', _recv_exact(sock, 4))
+    header = json.loads(_recv_exact(sock, length).decode('utf-8'))
+    nbytes = header.get('nbytes', 0)
+    payload = _recv_exact(sock, nbytes) if nbytes else b''
+    return header, payload
+
+
+# ==================== 服务端 ====================
+
+class DynamicBatcher:
+    """把并发到达的小请求合并成一次批量推理"""
+
+    def __init__(self, name, fn, max_batch=None, max_wait_ms=None):
+        self.name = name
+        self.fn = fn  # fn(texts) -> 与 texts 等长的序列 / 矩阵
+        self.max_batch = max_batch or InferenceConfig.MAX_BATCH
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else InferenceConfig.MAX_WAIT_MS) / 1000.0
+        self.queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self.total_seconds = 0.0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, texts):
+        future = Future()
+        self.queue.put((list(texts), future))
+        return future
+
+    def _collect(self):
+        items = [self.queue.get()]
+        count = len(items[0][0])
+        deadline = time.time() + self.max_wait
+        while count < self.max_batch:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            items.append(item)
+            count += len(item[0])
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            texts = [t for batch, _ in items for t in batch]
+            start = time.time()
+            try:
+                results = self.fn(texts)
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for batch, future in items:
+                future.set_result(results[offset:offset + len(batch)])
+                offset += len(batch)
+            with self._lock:
+                self.requests += len(items)
+                self.batches += 1
+                self.texts += len(texts)
+                self.total_seconds += time.time() - start
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'batches': self.batches,
+                'texts': self.texts,
+                'avg_batch_texts': round(self.texts / self.batches, 2) if self.batches else 0,
+                'avg_requests_per_batch': round(self.requests / self.batches, 2) if self.batches else 0,
+                'avg_batch_ms': round(self.total_seconds * 1000 / self.batches, 2) if self.batches else 0,
+                'queue_depth': self.queue.qsize()
+            }
+
+
+class _InferenceHandler(socketserver.StreamRequestHandler):
+    """一个连接上按顺序处理多次请求 (客户端复用连接)"""
+
+    def handle(self):
+        server = self.server.inference
+        while True:
+            try:
+                header, _ = _recv_frame(self.connection)
+            except (ConnectionError, struct.error, OSError):
+                return
+            try:
+                response, payload = server.dispatch(header)
+            except Exception as e:
+                traceback.print_exc()
+                response, payload = {'ok': False, 'error': str(e)}, b''
+            try:
+                _send_frame(self.connection, response, payload)
+            except OSError:
+                return
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class InferenceServer:
+    """独占模型的推理进程"""
+
+    def __init__(self, socket_path):
+        from model_registry import model_registry
+        from bertopic_analysis import embed_texts, predict_topic_ids
+
+        self.socket_path = socket_path
+        self.registry = model_registry
+        self.started_at = time.time()
+        self.embed_batcher = DynamicBatcher(
+            'embed', lambda texts: embed_texts(texts, self.registry.get_bertopic_model())
+        )
+        self.topic_batcher = DynamicBatcher(
+            'topic_ids', lambda texts: predict_topic_ids(texts, self.registry.get_bertopic_model())
+        )
+
+    def dispatch(self, header):
+        op = header.get('op')
+        if op == 'ping':
+            return {'ok': True, 'pid': os.getpid(), 'version': self.registry.version}, b''
+        if op == 'embed':
+            vectors = np.asarray(self.embed_batcher.submit(header['texts']).result(), dtype=np.float32)
+            return {'ok': True, 'shape': list(vectors.shape)}, vectors.tobytes()
+        if op == 'topic_ids':
+            topic_ids = self.topic_batcher.submit(header['texts']).result()
+            return {'ok': True, 'topic_ids': [int(t) for t in topic_ids]}, b''
+        if op == 'topic_keywords':
+            snapshot = self.registry.get_snapshot()
+            keywords = snapshot.topic_keywords if snapshot else {}
+            return {'ok': True, 'version': self.registry.version,
+                    'topic_keywords': {str(k): v for k, v in keywords.items()}}, b''
+        if op == 'stats':
+            return {'ok': True, 'stats': self.get_stats()}, b''
+        return {'ok': False, 'error': f'未知操作: {op}'}, b''
+
+    def get_stats(self):
+        return {
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'model': self.registry.get_status(),
+            'embed': self.embed_batcher.get_stats(),
+            'topic_ids': self.topic_batcher.get_stats()
+        }
+
+    def serve_forever(self):
+        if self.registry.load() is None:
+            print("[Inference] BERTopic model unavailable, exiting.")
+            return
+        self.registry.start_watcher()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = _ThreadingUnixServer(self.socket_path, _InferenceHandler)
+        server.inference = self
+        print(f"[Inference] Listening on {self.socket_path} (pid {os.getpid()}, "
+              f"max_batch={InferenceConfig.MAX_BATCH}, max_wait={InferenceConfig.MAX_WAIT_MS}ms)")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+# ==================== 客户端 ====================
+
+# sidecar 进程自身不能再经由客户端调用自己
+_server_mode = False
+_client = None
+_down_until = 0.0
+
+
+class InferenceClient:
+    """sidecar 客户端 (每个线程复用一条连接)"""
+
+    def __init__(self, socket_path, timeout=None):
+        self.socket_path = socket_path
+        self.timeout = timeout or InferenceConfig.CLIENT_TIMEOUT
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            # 阻塞方式连接: 非阻塞的 AF_UNIX connect 在 backlog 满时直接返回 EAGAIN
+            sock.connect(self.socket_path)
+            sock.settimeout(self.timeout)
+            self._local.sock = sock
+        return sock
+
+    def _reset(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def call(self, header):
+        try:
+            sock = self._connection()
+            _send_frame(sock, header)
+            response, payload = _recv_frame(sock)
+        except (OSError, ConnectionError, struct.error, ValueError) as e:
+            self._reset()
+            raise InferenceUnavailable(str(e))
+        if not response.get('ok'):
+            raise InferenceUnavailable(response.get('error', 'sidecar 返回错误'))
+        return response, payload
+
+    def ping(self):
+        return self.call({'op': 'ping'})[0]
+
+    def embed(self, texts):
+        response, payload = self.call({'op': 'embed', 'texts': list(texts)})
+        return np.frombuffer(payload, dtype=np.float32).reshape(response['shape'])
+
+    def topic_ids(self, texts):
+        return self.call({'op': 'topic_ids', 'texts': list(texts)})[0]['topic_ids']
+
+    def topic_keywords(self):
+        keywords = self.call({'op': 'topic_keywords'})[0]['topic_keywords']
+        return {int(k): v for k, v in keywords.items()}
+
+    def stats(self):
+        return self.call({'op': 'stats'})[0]['stats']
+
+
+def get_inference_client():
+    """已配置且未处于失败退避期时返回客户端，否则返回 None (调用方进程内推理)"""
+    global _client
+    if _server_mode or not InferenceConfig.SOCKET_PATH or not hasattr(socket, 'AF_UNIX'):
+        return None
+    if time.time() < _down_until:
+        return None
+    if _client is None:
+        _client = InferenceClient(InferenceConfig.SOCKET_PATH)
+    return _client
+
+
+def mark_unavailable(error=None):
+    """调用失败后在 RETRY_INTERVAL 内不再尝试 sidecar"""
+    global _down_until
+    _down_until = time.time() + InferenceConfig.RETRY_INTERVAL
+    print(f"[Inference] Sidecar unavailable ({error}), using in-process inference "
+          f"for {InferenceConfig.RETRY_INTERVAL}s")
+
+
+def call_remote(method, *args):
+    """经由 sidecar 调用 client.<method>(*args)；未配置或失败时返回 None"""
+    client = get_inference_client()
+    if client is None:
+        return None
+    try:
+        return getattr(client, method)(*args)
+    except InferenceUnavailable as e:
+        mark_unavailable(e)
+        return None
+
+
+def inference_available():
+    """sidecar 已配置且可连通"""
+    return call_remote('ping') is not None
+
+
+# ==================== 模型代理 ====================
+
+class RemoteEmbedder:
+    """sidecar 句向量代理，接口与 SentenceTransformer.encode / BaseEmbedder.embed 一致"""
+
+    def __init__(self, owner):
+        self.owner = owner
+
+    def embed(self, documents, verbose=False):
+        return self.owner._call('embed', list(documents))
+
+    def encode(self, sentences, batch_size=None, **kwargs):
+        if isinstance(sentences, str):
+            return self.embed([sentences])[0]
+        return self.embed(sentences)
+
+
+class RemoteBERTopic:
+    """sidecar 中 BERTopic 的代理，由模型注册表代替进程内模型交给各使用方
+
+    只实现项目中用到的接口 (transform / get_topics / get_topic / embedding_model)。
+    sidecar 不可用时加载进程内模型兜底，RETRY_INTERVAL 后再尝试 sidecar。
+    """
+
+    # 没有主题中心向量: predict_topic_from_vector 会退回 predict_topic -> transform
+    topic_embeddings_ = None
+    _outliers = 1
+
+    def __init__(self, client, version, topic_keywords):
+        self.client = client
+        self.version = version
+        self.topic_keywords = topic_keywords
+        self.embedding_model = RemoteEmbedder(self)
+        self._local = None
+        self._local_lock = threading.Lock()
+
+    def _local_model(self):
+        with self._local_lock:
+            if self._local is None:
+                from bertopic_analysis import load_bertopic_model
+                print(f"[Inference] Loading in-process fallback model {self.version}...")
+                self._local = load_bertopic_model(self.version)
+            if self._local is None:
+                raise RuntimeError("sidecar 不可用且进程内模型加载失败")
+            return self._local
+
+    def _call(self, method, texts):
+        if time.time() >= _down_until:
+            try:
+                if method == 'embed':
+                    return self.client.embed(texts)
+                return self.client.topic_ids(texts)
+            except InferenceUnavailable as e:
+                mark_unavailable(e)
+
+        from bertopic_analysis import _encode_texts, predict_topic_ids
+        local = self._local_model()
+        if method == 'embed':
+            return np.asarray(_encode_texts(texts, local), dtype=np.float32)
+        return predict_topic_ids(texts, local)
+
+    def transform(self, documents, embeddings=None):
+        return np.asarray(self._call('topic_ids', list(documents))), None
+
+    def get_topics(self):
+        topics = {-1: []}
+        for tid, name in self.topic_keywords.items():
+            topics[tid] = [(word, 1.0) for word in name.split('-')]
+        return topics
+
+    def get_topic(self, topic_id):
+        return self.get_topics().get(topic_id, False)
+
+    def get_topic_info(self):
+        return [{'Topic': tid, 'Name': name} for tid, name in self.topic_keywords.items()]
+
+
+def connect_remote_model(version=None, wait=30):
+    """sidecar 可用时返回 RemoteBERTopic，否则返回 None (注册表退回进程内加载)
+
+    sidecar 与 web worker 各自监视 current.json；版本不一致时最多等待 wait 秒让 sidecar 先完成切换。
+    """
+    client = get_inference_client()
+    if client is None:
+        return None
+    deadline = time.time() + wait
+    try:
+        while True:
+            info = client.ping()
+            if version is None or info.get('version') == version or time.time() >= deadline:
+                break
+            time.sleep(1)
+        return RemoteBERTopic(client, info.get('version'), client.topic_keywords())
+    except InferenceUnavailable as e:
+        mark_unavailable(e)
+        return None
+
+
+def main():
+    global _server_mode
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", default=InferenceConfig.SOCKET_PATH or '/tmp/postg-inference.sock')
+    parser.add_argument("--max-batch", type=int, default=InferenceConfig.MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=InferenceConfig.MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    if not hasattr(socket, 'AF_UNIX'):
+        print("[Inference] Unix domain sockets are not supported on this platform.")
+        sys.exit(1)
+
+    _server_mode = True
+    InferenceConfig.MAX_BATCH = args.max_batch
+    InferenceConfig.MAX_WAIT_MS = args.max_wait_ms
+    InferenceServer(args.socket).serve_forever()
+
+
+if __name__ == '__main__':
+    # 通过模块名导入后运行，保证 bertopic_analysis 看到的是同一份 _server_mode
+    import inference_service
+    inference_service.main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+诗歌 item-item Top-K 近邻表
+
+ItemCF 原本每次请求都计算 (n_poems, n_reviewed) 的相似度矩阵: 500 条评论、10 万首诗
+就是每次 5000 万个浮点数。这里离线为每首诗预计算最相似的 K 首诗及其相似度，
+以紧凑数组保存在向量缓存中 (行号 int32 + 相似度 float16，每首诗 6K 字节)；
+ItemCF 只需取出用户已读诗歌的近邻列表稀疏累加，计算量与诗歌总数无关。
+
+- 构建: 小规模语料分块矩阵乘精确计算；大规模语料逐行查询 ANN 索引 (与推荐共用)
+- 新诗追加: 新行的近邻由一次矩阵向量乘得到，同时把新诗插入相似度超过其当前
+  第 K 名的已有行 (替换该行最小项，行内不再保持有序)
+- 诗歌删除后随向量存储压缩，指向被删除诗歌的近邻置空
+- 持久化到 saved_models/vector_cache/item_neighbors；已保存的诗歌ID是当前ID列表的
+  前缀时加载后只补算新增部分，否则由调用方在后台重建
+- 加载时以 mmap_mode='r' 只读映射 (多个 worker 共享页缓存)，第一次追加时才复制为私有数组；
+  写盘先写临时文件再替换，不影响正在映射旧文件的进程
+"""
+
+import os
+import json
+import time
+
+import numpy as np
+
+from ann_index import ExactIndex, _top_k
+
+
+class ItemNeighborConfig:
+    """近邻表配置"""
+
+    # 每首诗保留的近邻数
+    K = 50
+
+    # 精确构建时每块相似度矩阵的元素数上限 (块行数 = BLOCK_ELEMENTS // 诗歌数)
+    BLOCK_ELEMENTS = 16 * 1024 * 1024
+
+    # 新增行超过已保存行数的该比例时不再逐行补算，直接重建
+    REBUILD_RATIO = 0.05
+
+    DIR_NAME = 'item_neighbors'
+
+
+class ItemNeighborTable:
+    """每行 K 个近邻 (行号, 相似度)；不足 K 个时以 -1 / -inf 填充"""
+
+    def __init__(self, k=None):
+        self.k = k or ItemNeighborConfig.K
+        self.size = 0
+        self._neighbors = np.full((0, self.k), -1, dtype=np.int32)
+        self._scores = np.full((0, self.k), -np.inf, dtype=np.float16)
+        # 每行当前最小相似度及其位置，新诗插入时只需与之比较；映射加载的表在第一次追加时才计算
+        self._min = np.zeros(0, dtype=np.float32)
+        self._argmin = np.zeros(0, dtype=np.int32)
+
+    @property
+    def neighbors(self):
+        return self._neighbors[:self.size]
+
+    @property
+    def scores(self):
+        return self._scores[:self.size]
+
+    @property
+    def nbytes(self):
+        return self.neighbors.nbytes + self.scores.nbytes
+
+    def _reserve(self, n):
+        capacity = len(self._neighbors)
+        if n <= capacity and self._min is not None:
+            return
+        capacity = max(n, capacity * 2 if n > capacity else capacity, 1024)
+        neighbors = np.full((capacity, self.k), -1, dtype=np.int32)
+        scores = np.full((capacity, self.k), -np.inf, dtype=np.float16)
+        neighbors[:self.size] = self.neighbors
+        scores[:self.size] = self.scores
+        mins = np.full(capacity, -np.inf, dtype=np.float32)
+        argmin = np.zeros(capacity, dtype=np.int32)
+        mapped = self._min is None
+        if not mapped:
+            mins[:self.size] = self._min[:self.size]
+            argmin[:self.size] = self._argmin[:self.size]
+        self._neighbors, self._scores, self._min, self._argmin = neighbors, scores, mins, argmin
+        if mapped:
+            self._refresh_min(np.arange(self.size))
+
+    def _refresh_min(self, rows):
+        scores = self._scores[rows].astype(np.float32)
+        self._argmin[rows] = scores.argmin(axis=1)
+        self._min[rows] = scores.min(axis=1)
+
+    def _set_rows(self, start, sims):
+        """sims: (m, n) 新行与全部行的相似度 (自身已屏蔽)，写入新行的 Top-K"""
+        m, n = sims.shape
+        k = min(self.k, n)
+        if k < n:
+            top = np.argpartition(sims, n - k, axis=1)[:, n - k:]
+        else:
+            top = np.tile(np.arange(n), (m, 1))
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        top[~np.isfinite(top_scores)] = -1
+        rows = slice(start, start + m)
+        self._neighbors[rows] = -1
+        self._scores[rows] = -np.inf
+        self._neighbors[rows, :k] = top
+        self._scores[rows, :k] = top_scores
+        self._refresh_min(np.arange(start, start + m))
+
+    def build(self, matrix, index=None):
+        """为归一化矩阵构建近邻表；index 为非精确 ANN 索引时逐行查询索引"""
+        n = len(matrix)
+        self.size = 0
+        self._reserve(n)
+        self.size = n
+        if index is None or isinstance(index, ExactIndex):
+            block = max(1, ItemNeighborConfig.BLOCK_ELEMENTS // max(n, 1))
+            for start in range(0, n, block):
+                end = min(n, start + block)
+                sims = matrix[start:end] @ matrix.T
+                sims[np.arange(end - start), np.arange(start, end)] = -np.inf
+                self._set_rows(start, sims)
+        else:
+            for i in range(n):
+                rows, scores = index.search(matrix[i], self.k + 1, exclude=[i])
+                rows, scores = rows[:self.k], scores[:self.k]
+                self._neighbors[i] = -1
+                self._scores[i] = -np.inf
+                self._neighbors[i, :len(rows)] = rows
+                self._scores[i, :len(rows)] = scores
+            self._refresh_min(np.arange(n))
+        return self
+
+    def add(self, matrix):
+        """补算矩阵中 self.size 之后的新行，并把新行插入已有行的近邻列表"""
+        n = len(matrix)
+        start = self.size
+        if n <= start:
+            return
+        self._reserve(n)
+        self.size = n
+        sims = matrix[start:n] @ matrix[:n].T
+        sims[np.arange(n - start), np.arange(start, n)] = -np.inf
+        self._set_rows(start, sims)
+        # 已有行: 新诗相似度超过该行第 K 名时替换最小项
+        for j in range(n - start):
+            col = sims[j, :start]
+            rows = np.nonzero(col > self._min[:start])[0]
+            if not len(rows):
+                continue
+            slots = self._argmin[rows]
+            self._neighbors[rows, slots] = start + j
+            self._scores[rows, slots] = col[rows]
+            self._refresh_min(rows)
+
+    def compact(self, keep):
+        """只保留 keep 行 (升序行号) 并按新行号重写近邻；指向被删除行的近邻置空"""
+        keep = np.asarray(keep, dtype=np.int64)
+        remap = np.full(self.size + 1, -1, dtype=np.int32)
+        remap[keep] = np.arange(len(keep), dtype=np.int32)
+        table = ItemNeighborTable(self.k)
+        table._reserve(len(keep))
+        table.size = len(keep)
+        # -1 (空位) 经 remap[-1] 仍映射为 -1
+        neighbors = remap[self._neighbors[keep]]
+        scores = self._scores[keep].copy()
+        scores[neighbors < 0] = -np.inf
+        table._neighbors[:table.size] = neighbors
+        table._scores[:table.size] = scores
+        table._refresh_min(np.arange(table.size))
+        return table
+
+    def aggregate(self, rows, weights, k, exclude=None):
+        """已读诗歌近邻的加权相似度之和 / 权重和，返回得分最高的 k 个 (行号, 得分)"""
+        rows = np.asarray(rows, dtype=np.intp)
+        weights = np.asarray(weights, dtype=np.float32)
+        neighbors = self._neighbors[rows]
+        scores = self._scores[rows].astype(np.float32) * weights[:, None]
+        valid = neighbors >= 0
+        candidates, inverse = np.unique(neighbors[valid], return_inverse=True)
+        totals = np.bincount(inverse, weights=scores[valid], minlength=len(candidates))
+        totals = (totals / max(float(weights.sum()), 1e-12)).astype(np.float32)
+        return _top_k(candidates.astype(np.int64), totals, k, exclude)
+
+    def save(self, table_dir, poem_ids, embedding_name=None):
+        os.makedirs(table_dir, exist_ok=True)
+        for name, data in (('neighbors.npy', self.neighbors), ('scores.npy', self.scores),
+                           ('ids.npy', np.asarray(poem_ids[:self.size], dtype=np.int64))):
+            path = os.path.join(table_dir, name)
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, data)
+            os.replace(path + '.tmp', path)
+        with open(os.path.join(table_dir, 'meta.json'), 'w') as f:
+            json.dump({
+                'k': self.k,
+                'size': self.size,
+                'embedding_model': embedding_name,
+                'saved_at': time.time()
+            }, f)
+
+    @classmethod
+    def load(cls, table_dir):
+        with open(os.path.join(table_dir, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        table = cls(meta['k'])
+        table._neighbors = np.load(os.path.join(table_dir, 'neighbors.npy'), mmap_mode='r')
+        table._scores = np.load(os.path.join(table_dir, 'scores.npy'), mmap_mode='r')
+        table._min = table._argmin = None
+        table.size = len(table._neighbors)
+        return table, meta
+
+
+def build_item_neighbors(matrix, index=None):
+    """构建近邻表 (耗时，应在后台线程中调用)"""
+    start = time.time()
+    table = ItemNeighborTable().build(matrix, index)
+    print(f"[ItemNeighbors] Built top-{table.k} table over {table.size} poems "
+          f"({time.time() - start:.2f}s, {table.nbytes / 1024 / 1024:.1f} MB)")
+    return table
+
+
+def save_item_neighbors(cache_dir, table, poem_ids, embedding_name=None):
+    table.save(os.path.join(cache_dir, ItemNeighborConfig.DIR_NAME), poem_ids, embedding_name)
+
+
+def load_item_neighbors(cache_dir, poem_ids, matrix, embedding_name=None):
+    """加载持久化的近邻表并补算新增行；不存在或已失效时返回 None"""
+    table_dir = os.path.join(cache_dir, ItemNeighborConfig.DIR_NAME)
+    ids_path = os.path.join(table_dir, 'ids.npy')
+    if not os.path.exists(ids_path) or not os.path.exists(os.path.join(table_dir, 'meta.json')):
+        return None
+    try:
+        saved_ids = np.load(ids_path)
+        n = len(saved_ids)
+        if not (0 < n <= len(poem_ids)) \
+                or not np.array_equal(saved_ids, np.asarray(poem_ids[:n], dtype=np.int64)) \
+                or len(poem_ids) - n > n * ItemNeighborConfig.REBUILD_RATIO:
+            return None
+        table, meta = ItemNeighborTable.load(table_dir)
+        if meta.get('embedding_model') != embedding_name or meta.get('k') != ItemNeighborConfig.K \
+                or table.size != n:
+            return None
+        if n < len(poem_ids):
+            table.add(matrix)
+            save_item_neighbors(cache_dir, table, poem_ids, embedding_name)
+        print(f"[ItemNeighbors] Loaded top-{table.k} table ({n} cached, {len(poem_ids) - n} added)")
+        return table
+    except Exception as e:
+        print(f"[ItemNeighbors] Failed to load cached table: {e}")
+        return None
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BERTopic 模型注册表
+
+进程内唯一持有已加载的 BERTopic 模型。app.py 的全局 bertopic_model、
+IncrementalRecommender 与 SemanticColorAnalyzer 都从这里借用同一个实例，
+避免每个请求重新构建 SentenceTransformer 并反序列化整个模型目录。
+
+模型以版本快照 (ModelSnapshot) 的形式持有。重新训练后 (current.json 指向新版本)
+由管理接口或文件监视线程触发热切换: 后台加载新版本并准备好依赖数据
+(主题关键词、向量矩阵)，再一次性替换当前快照并通知各使用方；旧快照在借用它的
+请求全部结束后才释放。
+"""
+
+import gc
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from flask import jsonify, request
+
+
+class ModelSnapshot:
+    """某个模型版本及其派生数据 (主题关键词等)"""
+
+    def __init__(self, model, version, topic_keywords=None, embedding_name=None):
+        self.model = model
+        self.version = version
+        self.topic_keywords = topic_keywords or {}
+        self.embedding_name = embedding_name
+        self.loaded_at = time.time()
+        self.extras = {}      # 切换前由 prepare 钩子填充 (例如新向量矩阵)
+        self.borrowers = 0
+        self.retired = False
+
+
+class ModelRegistry:
+    """BERTopic 模型注册表 (进程内单例)"""
+
+    STATE_IDLE = 'idle'
+    STATE_LOADING = 'loading'
+    STATE_READY = 'ready'
+    STATE_FAILED = 'failed'
+
+    # 加载失败后的重试间隔（秒），避免每个请求都去重新尝试加载
+    RETRY_INTERVAL = 60
+
+    # current.json 的轮询间隔（秒）
+    WATCH_INTERVAL = 10
+
+    # 等待旧版本上的请求结束的最长时间（秒），超时后直接释放引用
+    RETIRE_TIMEOUT = 120
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self._initialized = True
+        self._lock = threading.Lock()
+        self._borrow_lock = threading.Lock()
+        self._snapshot = None
+        self._state = self.STATE_IDLE
+        self._error = None
+        self._loaded_at = None
+        self._load_seconds = None
+        self._failed_at = None
+
+        # 热切换
+        self._swap_hooks = []          # [(prepare, commit)]
+        self._reload_thread = None
+        self._reload_state = None
+        self._retiring = []
+        self._watcher = None
+        self._watch_stop = threading.Event()
+
+    @property
+    def _model(self):
+        snapshot = self._snapshot
+        return snapshot.model if snapshot else None
+
+    def get_bertopic_model(self, load=True):
+        """借用已加载的模型；load=True 时在首次调用时同步加载"""
+        model = self._model
+        if model is not None or not load:
+            return model
+        if self._state == self.STATE_FAILED and self._failed_at and \
+                time.time() - self._failed_at < self.RETRY_INTERVAL:
+            return None
+        return self.load()
+
+    def get_snapshot(self, load=True):
+        """当前版本快照 (模型、版本号、主题关键词彼此一致)"""
+        if self._snapshot is None and load:
+            self.get_bertopic_model(load=True)
+        return self._snapshot
+
+    @contextmanager
+    def borrow(self, load=True):
+        """在一次请求/批处理期间固定使用同一个版本快照；切换后旧快照等借用结束再释放"""
+        if self._snapshot is None and load:
+            self.get_bertopic_model(load=True)
+        with self._borrow_lock:
+            snapshot = self._snapshot
+            if snapshot is not None:
+                snapshot.borrowers += 1
+        try:
+            yield snapshot
+        finally:
+            if snapshot is not None:
+                with self._borrow_lock:
+                    snapshot.borrowers -= 1
+
+    def _build_snapshot(self, version):
+        from bertopic_analysis import load_bertopic_model, get_all_topics, get_model_metadata, \
+            embedding_cache_name
+        from inference_service import connect_remote_model
+        # 配置了推理 sidecar 时只持有代理，模型只在 sidecar 进程中加载一份
+        model = connect_remote_model(version)
+        if model is not None:
+            version = model.version
+        else:
+            model = load_bertopic_model(version)
+        if model is None:
+            return None
+        metadata = get_model_metadata(version) if version else {}
+        return ModelSnapshot(
+            model,
+            version,
+            topic_keywords=get_all_topics(model),
+            embedding_name=metadata.get('embedding_model') or embedding_cache_name()
+        )
+
+    def load(self, force=False):
+        """加载模型 (同一时刻只有一个线程真正执行加载)"""
+        with self._lock:
+            if self._snapshot is not None and not force:
+                return self._model
+
+            from bertopic_analysis import get_current_model_version
+
+            self._state = self.STATE_LOADING
+            start = time.time()
+            snapshot = None
+            version = None
+            try:
+                version = get_current_model_version()
+                snapshot = self._build_snapshot(version)
+            except Exception as e:
+                traceback.print_exc()
+                self._error = str(e)
+
+            if snapshot is None:
+                self._state = self.STATE_FAILED
+                self._failed_at = time.time()
+                self._error = self._error or '模型目录不存在或加载失败'
+                print(f"[ModelRegistry] BERTopic model unavailable: {self._error}")
+                return self._model
+
+            with self._borrow_lock:
+                self._snapshot = snapshot
+            self._state = self.STATE_READY
+            self._error = None
+            self._failed_at = None
+            self._loaded_at = time.time()
+            self._load_seconds = self._loaded_at - start
+            print(f"[ModelRegistry] BERTopic model {version} ready ({self._load_seconds:.2f}s)")
+            return snapshot.model
+
+    # ==================== 热切换 ====================
+
+    def add_swap_hooks(self, prepare=None, commit=None):
+        """注册热切换钩子
+
+        prepare(new, old): 在后台线程中执行，可做耗时准备 (结果放进 new.extras)
+        commit(new, old): 在切换锁内执行，只做引用替换
+        """
+        self._swap_hooks.append((prepare, commit))
+
+    def reload_async(self, version=None, pin=False):
+        """后台加载指定版本 (默认 current.json 指向的版本) 并热切换；已有切换进行中时返回 False"""
+        with self._lock:
+            if self._reload_thread and self._reload_thread.is_alive():
+                return False
+            self._reload_state = {'version': version, 'state': self.STATE_LOADING, 'error': None,
+                                  'started_at': time.time(), 'finished_at': None}
+            self._reload_thread = threading.Thread(target=self.reload, args=(version, pin), daemon=True)
+            self._reload_thread.start()
+        return True
+
+    def reload(self, version=None, pin=False):
+        """加载新版本 -> prepare 钩子 -> 原子替换快照 -> commit 钩子 -> 等待旧版本释放
+
+        pin=True (手动指定版本) 时切换成功后把 current.json 指向该版本，
+        否则监视线程会按旧指针再切换回去；其他 worker 也随指针切换。
+        """
+        from bertopic_analysis import get_current_model_version, set_current_model_version
+
+        reload_state = self._reload_state or {'started_at': time.time()}
+        self._reload_state = reload_state
+        old = self._snapshot
+        try:
+            version = version or get_current_model_version()
+            reload_state['version'] = version
+            if old is not None and old.version == version:
+                if pin and get_current_model_version() != version:
+                    set_current_model_version(version)
+                reload_state.update({'state': 'unchanged', 'finished_at': time.time()})
+                return old
+
+            start = time.time()
+            print(f"[ModelRegistry] Loading model {version} in background...")
+            new = self._build_snapshot(version)
+            if new is None:
+                raise RuntimeError(f"模型版本 {version} 加载失败")
+            for prepare, _ in self._swap_hooks:
+                if prepare:
+                    prepare(new, old)
+
+            with self._lock:
+                with self._borrow_lock:
+                    self._snapshot = new
+                for _, commit in self._swap_hooks:
+                    if commit:
+                        commit(new, old)
+                self._state = self.STATE_READY
+                self._error = None
+                self._failed_at = None
+                self._loaded_at = time.time()
+                self._load_seconds = self._loaded_at - start
+                if pin and get_current_model_version() != version:
+                    set_current_model_version(version)
+            print(f"[ModelRegistry] Swapped model {old.version if old else None} -> {version} "
+                  f"({self._load_seconds:.2f}s)")
+            reload_state.update({'state': self.STATE_READY, 'finished_at': time.time()})
+        except Exception as e:
+            traceback.print_exc()
+            reload_state.update({'state': self.STATE_FAILED, 'error': str(e), 'finished_at': time.time()})
+            return None
+
+        if old is not None:
+            self._retire(old)
+        return new
+
+    def _retire(self, snapshot):
+        """等借用旧快照的请求结束后释放模型 (gc 在后台线程中执行，不占用请求线程)"""
+        snapshot.retired = True
+        self._retiring.append(snapshot)
+        deadline = time.time() + self.RETIRE_TIMEOUT
+        while snapshot.borrowers > 0 and time.time() < deadline:
+            time.sleep(0.1)
+        if snapshot.borrowers > 0:
+            print(f"[ModelRegistry] Releasing model {snapshot.version} with "
+                  f"{snapshot.borrowers} borrowers still active")
+        snapshot.model = None
+        snapshot.extras.clear()
+        self._retiring.remove(snapshot)
+        gc.collect()
+        print(f"[ModelRegistry] Released model {snapshot.version}")
+
+    def start_watcher(self, interval=None):
+        """轮询 current.json，版本变化时自动热切换"""
+        if self._watcher and self._watcher.is_alive():
+            return self._watcher
+        self._watch_stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval or self.WATCH_INTERVAL,),
+                                         daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def stop_watcher(self):
+        self._watch_stop.set()
+
+    def _watch(self, interval):
+        from bertopic_analysis import get_current_model_version
+        attempted = None
+        while not self._watch_stop.wait(interval):
+            try:
+                snapshot = self._snapshot
+                # 模型尚未加载时不在这里触发首次加载 (由启动预热负责)
+                if snapshot is None:
+                    continue
+                version = get_current_model_version()
+                # 同一个版本只自动尝试一次，加载失败后等待指针再次变化或手动触发
+                if version in (snapshot.version, attempted):
+                    continue
+                if self.reload_async(version):
+                    attempted = version
+            except Exception as e:
+                print(f"[ModelRegistry] Watcher error: {e}")
+
+    # ==================== 状态 ====================
+
+    def get_embedding_model(self, load=True):
+        """返回 BERTopic 内部的 SentenceTransformer 实例 (供颜色分析器等复用)"""
+        model = self.get_bertopic_model(load=load)
+        if model is None:
+            return None
+        backend = getattr(model, 'embedding_model', None)
+        # BERTopic 会把 SentenceTransformer 包装成 SentenceTransformerBackend；
+        # ONNX 等自定义后端本身就提供 encode
+        inner = getattr(backend, 'embedding_model', None)
+        return inner if inner is not None else backend
+
+    @property
+    def is_ready(self):
+        return self._model is not None
+
+    @property
+    def version(self):
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else None
+
+    def get_status(self):
+        """获取模型就绪状态"""
+        return {
+            'state': self._state,
+            'ready': self.is_ready,
+            'version': self.version,
+            'error': self._error,
+            'loaded_at': self._loaded_at,
+            'load_seconds': round(self._load_seconds, 3) if self._load_seconds is not None else None,
+            'reload': dict(self._reload_state) if self._reload_state else None,
+            'retiring': [{'version': s.version, 'borrowers': s.borrowers} for s in list(self._retiring)],
+            'watching': bool(self._watcher and self._watcher.is_alive())
+        }
+
+
+model_registry = ModelRegistry()
+
+
+def get_bertopic_model(load=True):
+    """借用进程内共享的 BERTopic 模型"""
+    return model_registry.get_bertopic_model(load=load)
+
+
+def get_embedding_model(load=True):
+    """借用进程内共享的句向量模型"""
+    return model_registry.get_embedding_model(load=load)
+
+
+def get_model_status():
+    """获取模型注册表状态"""
+    return model_registry.get_status()
+
+
+def add_model_routes(app):
+    """添加模型版本管理接口"""
+
+    @app.route('/api/admin/model/status')
+    def get_model_registry_status():
+        """当前模型版本与热切换状态"""
+        from bertopic_analysis import get_current_model_version
+        status = model_registry.get_status()
+        status['current_pointer'] = get_current_model_version()
+        return jsonify(status)
+
+    @app.route('/api/admin/model/reload', methods=['POST'])
+    def reload_model():
+        """后台加载新版本并热切换 (默认 current.json 指向的版本)"""
+        from bertopic_analysis import list_model_versions
+        data = request.get_json(silent=True) or {}
+        version = data.get('version')
+        # 版本号会拼进模型目录路径，只接受 versions/ 下已有的条目
+        if version is not None and (not isinstance(version, str) or version not in list_model_versions()):
+            return jsonify({'message': f'模型版本不存在: {version}'}), 400
+        if not model_registry.reload_async(version, pin=version is not None):
+            return jsonify({'message': '已有模型切换正在进行', 'status': model_registry.get_status()}), 409
+        return jsonify({'message': '模型切换已开始', 'status': model_registry.get_status()}), 202
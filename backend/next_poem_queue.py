@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+“换诗”的每用户预取队列
+
+/api/recommend_one/<username> 原本每次点击都计算 20 首完整的混合推荐，再 random.choice
+返回其中一首，其余 19 首丢弃；而用户往往连续点击。这里为每个用户保留一个按排名排好、
+尚未展示过的诗歌ID队列:
+- 每次点击从队首取一首 (O(1))，取出的诗歌记入最近展示历史，之后补充时不再入队
+- 队列低于 LOW_WATER 时由调用方在后台补充到 QUEUE_SIZE；队列为空 (首次点击) 时同步填充
+- 用户新增评论时从队列中移除被评论的诗歌，并作废进行中的补充 (其结果基于旧评论)
+- 队列与生成它的版本 (模型版本 / 向量模型) 绑定，版本变化后全部清空
+- 每次补充至多请求 MAX_FETCH (预计算列表长度) 个排名，跳过已在队列 / 展示历史中的诗歌；
+  这些排名都已展示过时清空历史，从头开始轮换
+- 按最近使用保留至多 MAX_USERS 个用户的队列
+"""
+
+import threading
+from collections import OrderedDict, deque
+
+from recommendation_store import RecommendationStoreConfig
+
+
+class NextPoemQueueConfig:
+    """换诗预取队列配置"""
+
+    # 每次补充后的队列长度
+    QUEUE_SIZE = 20
+
+    # 队列剩余数低于该值时后台补充
+    LOW_WATER = 5
+
+    # 每个用户记住的最近展示过的诗歌数 (补充时跳过)
+    SHOWN_HISTORY = 100
+
+    # 每次补充最多请求的推荐数: 不超过预计算列表长度，补充总能直接取预计算列表
+    MAX_FETCH = RecommendationStoreConfig.LIST_SIZE
+
+    # 保留队列的用户数上限 (最近使用)
+    MAX_USERS = 10000
+
+
+class _UserQueue:
+    """单个用户的待展示队列与最近展示历史"""
+
+    def __init__(self):
+        self.pending = deque()
+        self.shown = deque(maxlen=NextPoemQueueConfig.SHOWN_HISTORY)
+        # 每次作废递增；补充结果只在代数未变时写入
+        self.generation = 0
+        self.refilling = False
+
+
+class NextPoemQueues:
+    """user_id -> 预取队列"""
+
+    def __init__(self):
+        self.version = None
+        self._queues = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.dropped = 0
+
+    def _queue(self, user_id):
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = self._queues[user_id] = _UserQueue()
+            while len(self._queues) > NextPoemQueueConfig.MAX_USERS:
+                self._queues.popitem(last=False)
+        else:
+            self._queues.move_to_end(user_id)
+        return queue
+
+    def check_version(self, version):
+        """版本变化: 清空所有队列"""
+        with self._lock:
+            if version != self.version:
+                self._queues = OrderedDict()
+                self.version = version
+
+    def pop(self, user_id):
+        """取出队首的诗歌ID并记入展示历史；队列为空时返回 None"""
+        with self._lock:
+            queue = self._queue(user_id)
+            if not queue.pending:
+                self.misses += 1
+                return None
+            self.hits += 1
+            poem_id = queue.pending.popleft()
+            queue.shown.append(poem_id)
+            return poem_id
+
+    def claim_refill(self, user_id, force=False):
+        """队列低于低水位且没有进行中的补充时 (force 时总是) 占用补充，返回 (代数, 需要请求的推荐数)；否则返回 None"""
+        with self._lock:
+            queue = self._queue(user_id)
+            if not force and (queue.refilling or len(queue.pending) >= NextPoemQueueConfig.LOW_WATER):
+                return None
+            queue.refilling = True
+            # 排在前面的推荐可能已在队列或展示历史中，多请求这些数量 (至多 MAX_FETCH 个)；
+            # 排名列表都展示过之后由 fill 清空历史，在同一份列表中重新轮换
+            fetch = NextPoemQueueConfig.QUEUE_SIZE + len(queue.pending) + len(queue.shown)
+            return queue.generation, min(fetch, NextPoemQueueConfig.MAX_FETCH)
+
+    def fill(self, user_id, poem_ids, generation):
+        """按排名把未在队列 / 展示历史中的诗歌补充到 QUEUE_SIZE，返回补充数；代数已变化时丢弃"""
+        with self._lock:
+            queue = self._queue(user_id)
+            if generation != queue.generation:
+                self.dropped += 1
+                return 0
+            queue.refilling = False
+            skip = set(queue.pending)
+            skip.update(queue.shown)
+            if poem_ids and not queue.pending and all(pid in skip for pid in poem_ids):
+                # 可推荐的诗歌都已展示过: 清空历史重新轮换
+                queue.shown.clear()
+                skip = set()
+            added = 0
+            for pid in poem_ids:
+                if len(queue.pending) >= NextPoemQueueConfig.QUEUE_SIZE:
+                    break
+                # 排名列表中重复出现的诗歌只入队一次
+                if pid in skip:
+                    continue
+                queue.pending.append(pid)
+                skip.add(pid)
+                added += 1
+            self.refills += 1
+            return added
+
+    def discard(self, user_id, poem_id):
+        """用户评论了该诗: 从队列中移除，并作废进行中的补充"""
+        with self._lock:
+            queue = self._queues.get(user_id)
+            if queue is None:
+                return
+            try:
+                queue.pending.remove(poem_id)
+            except ValueError:
+                pass
+            queue.generation += 1
+            queue.refilling = False
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {
+            'users': len(self._queues),
+            'version': self.version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else None,
+            'refills': self.refills,
+            'dropped_refills': self.dropped
+        }
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MiniLM 句向量的 ONNX / int8 量化 CPU 推理后端 (可选)
+
+服务器没有 GPU，而 torch 的 fp32 推理在 CPU 上代价较高。这里把
+paraphrase-multilingual-MiniLM-L12-v2 导出为 ONNX，并用 onnxruntime 做
+动态 int8 量化；推理时与 sentence-transformers 一样做 attention mask 均值池化。
+
+依赖 (可选): onnxruntime、transformers (sentence-transformers 已自带)
+导出: python scripts/export_onnx_embedding.py
+启用: 设置环境变量 POSTG_EMBEDDING_BACKEND=onnx-int8 (或 onnx)
+"""
+
+import os
+
+import numpy as np
+
+try:
+    from bertopic.backend import BaseEmbedder
+except ImportError:  # 未安装 bertopic 时仍可独立用于编码
+    BaseEmbedder = object
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ONNX_MODEL_DIR = os.path.join(BASE_DIR, 'saved_models', 'onnx_embedding')
+FP32_FILENAME = 'model.onnx'
+INT8_FILENAME = 'model-int8.onnx'
+
+
+def onnx_model_path(quantized=True, model_dir=ONNX_MODEL_DIR):
+    return os.path.join(model_dir, INT8_FILENAME if quantized else FP32_FILENAME)
+
+
+def is_exported(quantized=True, model_dir=ONNX_MODEL_DIR):
+    """检查 ONNX 模型与分词器是否已导出"""
+    return os.path.exists(onnx_model_path(quantized, model_dir)) and \
+        os.path.exists(os.path.join(model_dir, 'tokenizer_config.json'))
+
+
+def export_onnx_model(model_name, model_dir=ONNX_MODEL_DIR, quantize=True, opset=14):
+    """把 HuggingFace 权重导出为 ONNX，并可选生成动态 int8 量化版本"""
+    import torch
+    from transformers import AutoTokenizer, AutoModel
+
+    os.makedirs(model_dir, exist_ok=True)
+    hf_name = model_name if '/' in model_name else f"sentence-transformers/{model_name}"
+
+    print(f"[ONNX] Exporting {hf_name} ...")
+    tokenizer = AutoTokenizer.from_pretrained(hf_name)
+    model = AutoModel.from_pretrained(hf_name)
+    model.eval()
+    tokenizer.save_pretrained(model_dir)
+
+    sample = tokenizer(["床前明月光", "疑是地上霜"], padding=True, truncation=True, return_tensors='pt')
+    input_names = list(sample.keys())
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+    fp32_path = onnx_model_path(False, model_dir)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True
+        )
+    print(f"[ONNX] fp32 model saved to {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        int8_path = onnx_model_path(True, model_dir)
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"[ONNX] int8 model saved to {int8_path}")
+    return model_dir
+
+
+class OnnxEmbeddingBackend(BaseEmbedder):
+    """onnxruntime 句向量后端，可直接作为 BERTopic 的 embedding_model"""
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, quantized=True, batch_size=32,
+                 max_length=128, intra_op_threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.embedding_model = None
+        self.word_embedding_model = None
+        self.model_dir = model_dir
+        self.quantized = quantized
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = int(intra_op_threads)
+        self.session = ort.InferenceSession(
+            onnx_model_path(quantized, model_dir),
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def _encode_batch(self, texts):
+        tokens = self.tokenizer(texts, padding=True, truncation=True,
+                                max_length=self.max_length, return_tensors='np')
+        feeds = {k: v.astype(np.int64) for k, v in tokens.items() if k in self.input_names}
+        hidden = self.session.run(None, feeds)[0]
+        # 与 sentence-transformers 的 MeanPooling 一致
+        mask = tokens['attention_mask'][..., None].astype(np.float32)
+        summed = (hidden * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        return (summed / counts).astype(np.float32)
+
+    def encode(self, sentences, batch_size=None, **kwargs):
+        """兼容 SentenceTransformer.encode 的调用方式 (始终返回 numpy)"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        size = batch_size or self.batch_size
+        # 按长度排序后分批，减少 padding
+        order = np.argsort([len(t) for t in texts])
+        chunks = []
+        for i in range(0, len(texts), size):
+            idx = order[i:i + size]
+            chunks.append((idx, self._encode_batch([texts[j] for j in idx])))
+        dim = chunks[0][1].shape[1]
+        out = np.empty((len(texts), dim), dtype=np.float32)
+        for idx, vecs in chunks:
+            out[idx] = vecs
+        return out[0] if single else out
+
+    def embed(self, documents, verbose=False):
+        """BERTopic BaseEmbedder 接口"""
+        return self.encode(documents)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+训练语料的多进程分片编码
+
+train_bertopic_model 在单进程内编码最多 20000 首诗，多核 CPU 上大部分核心闲置。
+这里把语料切成若干分片交给进程池，每个进程持有自己的句向量模型并限制推理
+线程数 (总线程数约等于核心数，避免互相抢占)，结果直接写入共享的内存映射
+数组，最后整体交给 BERTopic.fit_transform(docs, embeddings=...)。
+
+进程使用 spawn 启动：torch 在 fork 出的子进程中可能因线程池状态而死锁。
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import numpy as np
+
+
+class ParallelEmbeddingConfig:
+    """分片编码配置"""
+
+    # 默认进程数
+    WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+    # 每个进程分到的分片数 (多切几片，快慢进程之间可以互相平衡)
+    SHARDS_PER_WORKER = 4
+
+    # 进程内 encode 的批大小
+    BATCH_SIZE = 64
+
+
+def default_threads_per_worker(workers):
+    """每个进程的推理线程数: 核心数平均分给各进程"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+# ==================== 子进程 ====================
+
+_worker_model = None
+
+
+def _init_worker(threads, backend):
+    global _worker_model
+    # 必须在 import torch 之前设置，限制 OpenMP / MKL 线程池
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    from bertopic_analysis import load_embedding_model
+    _worker_model = load_embedding_model(backend=backend, num_threads=threads)
+
+
+def _embedding_dim():
+    return int(np.asarray(_worker_model.encode(["床前明月光"])).reshape(1, -1).shape[1])
+
+
+def _encode_shard(mmap_path, shape, start, texts, batch_size):
+    """编码一个分片并写入共享内存映射数组的 [start, start + len(texts)) 行"""
+    began = time.perf_counter()
+    vectors = np.asarray(_worker_model.encode(texts, batch_size=batch_size), dtype=np.float32)
+    out = np.memmap(mmap_path, dtype=np.float32, mode='r+', shape=shape)
+    out[start:start + len(texts)] = vectors
+    out.flush()
+    del out
+    return start, len(texts), time.perf_counter() - began
+
+
+# ==================== 主进程 ====================
+
+class ShardedEmbedder:
+    """持有进程池的分片编码器；可复用 (基准测试中只加载一次模型)"""
+
+    def __init__(self, workers=None, threads_per_worker=None, backend=None, batch_size=None):
+        self.workers = max(1, int(workers or ParallelEmbeddingConfig.WORKERS))
+        self.threads_per_worker = threads_per_worker or default_threads_per_worker(self.workers)
+        self.backend = backend
+        self.batch_size = batch_size or ParallelEmbeddingConfig.BATCH_SIZE
+        self.pool = None
+        self.dim = None
+        self.load_seconds = None
+
+    def start(self):
+        if self.pool is not None:
+            return self
+        began = time.perf_counter()
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.threads_per_worker, self.backend)
+        )
+        # 每个进程一个探测任务: 让所有进程完成模型加载，同时取得向量维度
+        futures = [self.pool.submit(_embedding_dim) for _ in range(self.workers)]
+        wait(futures)
+        self.dim = futures[0].result()
+        self.load_seconds = time.perf_counter() - began
+        print(f"[ParallelEmbedding] {self.workers} workers x {self.threads_per_worker} threads ready "
+              f"({self.load_seconds:.1f}s)")
+        return self
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def encode(self, texts):
+        """返回 (n, dim) float32 矩阵，行顺序与 texts 一致"""
+        texts = list(texts)
+        self.start()
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        shape = (len(texts), self.dim)
+        n_shards = min(len(texts), self.workers * ParallelEmbeddingConfig.SHARDS_PER_WORKER)
+        bounds = np.linspace(0, len(texts), n_shards + 1, dtype=int)
+
+        tmp_dir = tempfile.mkdtemp(prefix='postg-embed-')
+        mmap_path = os.path.join(tmp_dir, 'embeddings.f32')
+        try:
+            out = np.memmap(mmap_path, dtype=np.float32, mode='w+', shape=shape)
+            del out
+            futures = [
+                self.pool.submit(_encode_shard, mmap_path, shape, int(lo), texts[lo:hi], self.batch_size)
+                for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo
+            ]
+            for future in futures:
+                future.result()
+            # 拷贝到普通内存后删除临时文件
+            return np.array(np.memmap(mmap_path, dtype=np.float32, mode='r', shape=shape))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def parallel_embed_texts(texts, workers=None, threads_per_worker=None, backend=None):
+    """经由向量缓存获取文档向量，未命中的文档交给多进程分片编码"""
+    from bertopic_analysis import embedding_cache_name
+    from embedding_cache import get_embedding_store
+
+    store = get_embedding_store(embedding_cache_name(backend))
+    embedder = ShardedEmbedder(workers=workers, threads_per_worker=threads_per_worker, backend=backend)
+
+    def encode_missing(missing):
+        began = time.perf_counter()
+        with embedder:
+            vectors = embedder.encode(missing)
+        elapsed = time.perf_counter() - began
+        print(f"[ParallelEmbedding] Encoded {len(missing)} documents in {elapsed:.1f}s "
+              f"({len(missing) / elapsed:.1f} docs/s incl. model load)")
+        return vectors
+
+    try:
+        return store.get_or_compute(list(texts), encode_missing)
+    finally:
+        embedder.close()
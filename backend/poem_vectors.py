@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可增长的诗歌向量存储
+
+新诗入库原本用 np.vstack 把向量追加到 topic_matrix，每首诗都复制整个矩阵；被删除的诗歌
+则一直留在矩阵中。这里预分配按倍数扩容的缓冲区，追加均摊 O(1):
+- matrix 是缓冲区前 size 行的视图 (不复制)，行号即 ANN 索引 / 近邻表中的行号
+- 删除只做墓碑标记: 向量清零 (内积检索得分为 0)、alive 置 False、从 id_map 中移除
+- 墓碑行超过一定比例时由调用方在后台压缩 (compacted 返回只含存活行的新存储)
+
+向量缓存 (saved_models/vector_cache/matrix/<快照>/topic_matrix.npy + poem_ids.npy，
+由 saved_models/vector_cache/matrix_meta.json 指向当前快照):
+- 有效性由元数据中的摘要 (诗歌ID列表 + 向量模型) 判断，不再逐项比较ID列表
+- 以 mmap_mode='r' 只读映射，多个 worker 共享同一份页缓存，启动时不读取每一行；
+  存储在第一次追加 / 删除时才复制为私有缓冲区 (写时复制)，写回缓存后重新映射
+- 诗歌有增删时只为新增的诗歌计算向量，其余行从旧缓存按ID复制
+- 矩阵与ID列表先写入新的快照目录，最后 os.replace 元数据一次性切换；中途崩溃时
+  元数据仍指向完整的旧快照。上一个快照保留到下一次写入，正在加载它的进程不受影响
+- 旧版本缓存 (元数据没有快照目录) 的文件直接位于 vector_cache 下，仍可读取
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+
+from ann_index import normalize_rows
+
+
+class PoemVectorConfig:
+    """诗歌向量存储配置"""
+
+    # 初始容量 (行数)，不足时翻倍
+    INITIAL_CAPACITY = 1024
+
+    # 墓碑行数超过 max(COMPACT_MIN_DEAD, COMPACT_RATIO * 行数) 时压缩
+    COMPACT_RATIO = 0.1
+    COMPACT_MIN_DEAD = 256
+
+    # 缓存格式版本 (2: 行已归一化 + ID摘要)
+    CACHE_FORMAT = 2
+
+    # 矩阵快照目录 (位于向量缓存目录下)
+    SNAPSHOT_DIR = 'matrix'
+
+    # 写入中断留下的临时快照目录超过该时间（秒）后清理
+    STALE_TMP_SECONDS = 3600
+
+
+class PoemVectorStore:
+    """行号 -> (诗歌ID, 向量, 作者编号, 是否存活)"""
+
+    def __init__(self, matrix, poem_ids, authors=None, capacity=None):
+        n, self.dim = matrix.shape
+        if isinstance(matrix, np.memmap) and capacity is None:
+            # 只读映射的缓存直接作为缓冲区，修改前再复制
+            capacity = n
+            self._buffer = matrix
+        else:
+            capacity = max(capacity or 0, n, PoemVectorConfig.INITIAL_CAPACITY)
+            self._buffer = np.zeros((capacity, self.dim), dtype=np.float32)
+            self._buffer[:n] = matrix
+        self._authors = np.full(capacity, -1, dtype=np.int32)
+        if authors is not None:
+            self._authors[:n] = authors
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:n] = True
+        self.ids = list(poem_ids)
+        self.id_map = {pid: idx for idx, pid in enumerate(self.ids)}
+        self.size = n
+        self.dead = 0
+        self.max_id = max(self.ids) if self.ids else 0
+
+    @property
+    def capacity(self):
+        return len(self._buffer)
+
+    @property
+    def is_mapped(self):
+        return isinstance(self._buffer, np.memmap)
+
+    @property
+    def matrix(self):
+        return self._buffer[:self.size]
+
+    @property
+    def authors(self):
+        return self._authors[:self.size]
+
+    @property
+    def alive(self):
+        return self._alive[:self.size]
+
+    def _grow(self, capacity):
+        buffer = np.zeros((capacity, self.dim), dtype=np.float32)
+        buffer[:self.size] = self.matrix
+        authors = np.full(capacity, -1, dtype=np.int32)
+        authors[:self.size] = self.authors
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.size] = self.alive
+        # 先写好新数组再替换引用，并发读取的旧视图仍然有效
+        self._buffer, self._authors, self._alive = buffer, authors, alive
+
+    def append(self, poem_ids, vectors, authors=None):
+        """追加新行 (向量应已归一化)，返回新行的起始行号；已存在的诗歌ID由调用方过滤"""
+        vectors = np.atleast_2d(vectors)
+        start = self.size
+        end = start + len(vectors)
+        if end > self.capacity:
+            self._grow(max(end, self.capacity * 2))
+        self._buffer[start:end] = vectors
+        self._authors[start:end] = -1 if authors is None else authors
+        self._alive[start:end] = True
+        for offset, pid in enumerate(poem_ids):
+            self.ids.append(pid)
+            self.id_map[pid] = start + offset
+            self.max_id = max(self.max_id, pid)
+        self.size = end
+        return start
+
+    def remove(self, poem_ids):
+        """墓碑删除，返回被删除的行号"""
+        rows = [self.id_map.pop(pid) for pid in poem_ids if pid in self.id_map]
+        if rows:
+            if not self._buffer.flags.writeable:
+                self._grow(self.capacity)
+            rows = np.asarray(rows, dtype=np.int64)
+            self._buffer[rows] = 0.0
+            self._alive[rows] = False
+            self.dead += len(rows)
+        return rows
+
+    def adopt(self, mapped):
+        """改用内容相同的只读映射 (写回缓存后释放私有缓冲区)"""
+        if len(mapped) != self.size:
+            return False
+        self._buffer = mapped
+        self._authors = self._authors[:self.size].copy()
+        self._alive = self._alive[:self.size].copy()
+        return True
+
+    def needs_compaction(self):
+        return self.dead > max(PoemVectorConfig.COMPACT_MIN_DEAD, PoemVectorConfig.COMPACT_RATIO * self.size)
+
+    def compacted(self, keep):
+        """只含 keep 行 (升序行号) 的新存储，行号依次重排"""
+        keep = np.asarray(keep, dtype=np.int64)
+        return PoemVectorStore(self.matrix[keep], [self.ids[i] for i in keep], self.authors[keep],
+                               capacity=max(len(keep) * 2, PoemVectorConfig.INITIAL_CAPACITY))
+
+
+def ids_digest(poem_ids, embedding_name=None):
+    """诗歌ID列表 + 向量模型的摘要"""
+    h = hashlib.sha1(str(embedding_name or '').encode('utf-8'))
+    h.update(np.asarray(poem_ids, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+def _meta_path(cache_dir):
+    return os.path.join(cache_dir, 'matrix_meta.json')
+
+
+def _cache_paths(cache_dir, meta):
+    """元数据指向的快照中的 (矩阵, ID列表) 路径；旧版本缓存直接位于 cache_dir"""
+    base = cache_dir
+    if meta.get('dir'):
+        base = os.path.join(cache_dir, PoemVectorConfig.SNAPSHOT_DIR, os.path.basename(meta['dir']))
+    return os.path.join(base, 'topic_matrix.npy'), os.path.join(base, 'poem_ids.npy')
+
+
+def _read_meta(meta_path):
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, 'r') as f:
+        return json.load(f)
+
+
+def cached_matrix_path(cache_dir):
+    """当前缓存矩阵文件的路径 (供基准脚本直接读取)"""
+    return _cache_paths(cache_dir, _read_meta(_meta_path(cache_dir)))[0]
+
+
+def open_matrix_cache(cache_dir, poem_ids, embedding_name=None):
+    """摘要与行数都一致时只读映射缓存矩阵，否则返回 None"""
+    try:
+        meta = _read_meta(_meta_path(cache_dir))
+        matrix_path, _ = _cache_paths(cache_dir, meta)
+        if meta.get('format') != PoemVectorConfig.CACHE_FORMAT or meta.get('count') != len(poem_ids) \
+                or meta.get('digest') != ids_digest(poem_ids, embedding_name):
+            return None
+        matrix = np.load(matrix_path, mmap_mode='r')
+        if matrix.dtype != np.float32 or matrix.ndim != 2 or len(matrix) != len(poem_ids):
+            return None
+        return matrix
+    except Exception as e:
+        print(f"[VectorCache] Failed to open cache: {e}")
+        return None
+
+
+def load_cached_rows(cache_dir, poem_ids, embedding_name=None):
+    """按ID从旧缓存复制可复用的行
+
+    返回 (matrix, missing)：matrix 为新的 (n, dim) 数组 (没有可复用的缓存时为 None)，
+    missing 为需要重新计算向量的行号。向量模型不同的缓存不复用。
+    """
+    everything = list(range(len(poem_ids)))
+    try:
+        meta = _read_meta(_meta_path(cache_dir))
+        matrix_path, ids_path = _cache_paths(cache_dir, meta)
+        if meta.get('embedding_model') not in (None, embedding_name) or not os.path.exists(matrix_path):
+            return None, everything
+        if os.path.exists(ids_path):
+            cached_ids = np.load(ids_path)
+        else:
+            # 旧版本缓存的ID列表为 JSON
+            with open(os.path.join(cache_dir, 'poem_ids.json'), 'r') as f:
+                cached_ids = np.asarray(json.load(f), dtype=np.int64)
+        old = np.load(matrix_path, mmap_mode='r')
+        if len(old) != len(cached_ids):
+            return None, everything
+        position = {int(pid): i for i, pid in enumerate(cached_ids)}
+        source = np.fromiter((position.get(pid, -1) for pid in poem_ids), dtype=np.int64, count=len(poem_ids))
+        reuse = np.nonzero(source >= 0)[0]
+        matrix = np.zeros((len(poem_ids), old.shape[1]), dtype=np.float32)
+        if len(reuse):
+            rows = np.asarray(old[source[reuse]], dtype=np.float32)
+            # 旧格式缓存的行未必已归一化
+            matrix[reuse] = rows if meta.get('format') == PoemVectorConfig.CACHE_FORMAT else normalize_rows(rows)
+        return matrix, np.nonzero(source < 0)[0].tolist()
+    except Exception as e:
+        print(f"[VectorCache] Failed to reuse cached rows: {e}")
+        return None, everything
+
+
+def _prune_snapshots(snapshot_root, keep):
+    """删除 keep 以外的快照目录，以及中断写入留下的过期临时目录"""
+    now = time.time()
+    for name in os.listdir(snapshot_root):
+        path = os.path.join(snapshot_root, name)
+        if name in keep or not os.path.isdir(path):
+            continue
+        if name.startswith('.tmp-') and now - os.path.getmtime(path) < PoemVectorConfig.STALE_TMP_SECONDS:
+            continue  # 可能是其他进程正在写入的快照
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def save_matrix_cache(cache_dir, poem_ids, matrix, embedding_name=None):
+    """写入新的缓存快照并切换元数据，返回其只读映射 (写入失败时返回 None)"""
+    meta_path = _meta_path(cache_dir)
+    snapshot_root = os.path.join(cache_dir, PoemVectorConfig.SNAPSHOT_DIR)
+    tmp_dir = None
+    try:
+        previous = _read_meta(meta_path) if os.path.exists(meta_path) else {}
+        os.makedirs(snapshot_root, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=snapshot_root)
+        np.save(os.path.join(tmp_dir, 'topic_matrix.npy'), np.asarray(matrix, dtype=np.float32))
+        np.save(os.path.join(tmp_dir, 'poem_ids.npy'), np.asarray(poem_ids, dtype=np.int64))
+        name = os.path.basename(tmp_dir)[len('.tmp-'):]
+        os.rename(tmp_dir, os.path.join(snapshot_root, name))
+        tmp_dir = None
+
+        # 元数据是唯一的切换点: 替换之前读取方看到的始终是完整的旧快照
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'format': PoemVectorConfig.CACHE_FORMAT,
+                'dir': name,
+                'embedding_model': embedding_name,
+                'count': len(poem_ids),
+                'digest': ids_digest(poem_ids, embedding_name)
+            }, f)
+        os.replace(tmp_path, meta_path)
+
+        _prune_snapshots(snapshot_root, keep={name, previous.get('dir')})
+        if not previous.get('dir'):
+            # 从旧版本布局迁移: 根目录下的缓存文件已不再被引用
+            for legacy in _cache_paths(cache_dir, {}):
+                if os.path.exists(legacy):
+                    os.remove(legacy)
+        return np.load(_cache_paths(cache_dir, {'dir': name})[0], mmap_mode='r')
+    except Exception as e:
+        print(f"[VectorCache] Failed to save cache: {e}")
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return None
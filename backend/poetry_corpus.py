@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+chinese-poetry 数据集的流式读取与蓄水池采样
+
+完整数据集有数十万首诗，逐个文件 json.load 再把全部内容放进列表后
+random.sample，峰值内存随语料规模增长。这里:
+- iter_json_array 增量解析顶层 JSON 数组，同一时刻只持有一个条目和一小段读缓冲
+- iter_poems 遍历数据目录，边读边合并 paragraphs
+- reservoir_sample 用固定种子做蓄水池采样，内存只与样本数有关
+
+train_bertopic.collect_poetry_data、batch_import_poetry.py 与 import_poems.py 共用。
+"""
+
+import os
+import json
+import random
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POETRY_DATA_DIR = os.path.join(BASE_DIR, 'data', 'chinese-poetry')
+
+# 训练语料默认扫描的目录及每个目录最多读取的文件数 (None 表示不限)
+DEFAULT_TARGETS = [
+    ('全唐诗', 300),
+    ('宋词', 30),
+    ('元曲', 10),
+    ('曹操诗集', None),
+    ('诗经', None),
+    ('楚辞', None),
+    ('御定全唐詩', 300)
+]
+
+READ_CHUNK_SIZE = 1 << 16
+_WHITESPACE = ' \t\r\n'
+
+
+def _skip(buf, pos, chars):
+    n = len(buf)
+    while pos < n and buf[pos] in chars:
+        pos += 1
+    return pos
+
+
+def iter_json_array(path, chunk_size=READ_CHUNK_SIZE):
+    """逐个产出 JSON 文件顶层数组中的元素 (顶层不是数组时整体作为一个元素产出)"""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        buf, pos, eof = '', 0, False
+
+        def refill(keep_from):
+            nonlocal buf, pos, eof
+            # 读缓冲不够一个完整元素时按当前长度翻倍读取，避免对大元素反复重试
+            more = f.read(max(chunk_size, len(buf) - keep_from))
+            if not more:
+                eof = True
+            buf, pos = buf[keep_from:] + more, 0
+
+        # 定位顶层的 '['
+        while True:
+            pos = _skip(buf, pos, _WHITESPACE)
+            if pos < len(buf) or eof:
+                break
+            refill(pos)
+        if pos >= len(buf):
+            return
+        if buf[pos] != '[':
+            yield json.loads(buf[pos:] + f.read())
+            return
+        pos += 1
+
+        while True:
+            pos = _skip(buf, pos, _WHITESPACE + ',')
+            if pos >= len(buf):
+                if eof:
+                    raise ValueError(f"{path}: JSON 数组不完整")
+                refill(pos)
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                refill(pos)
+                continue
+            # 数字等标量可能在缓冲末尾被截断 (例如 "2.5" 只读到 "2")，
+            # 只有后面紧跟 ',' 或 ']' 时才算完整，否则补读后重新解析
+            after = _skip(buf, end, _WHITESPACE)
+            if after >= len(buf) or buf[after] not in ',]':
+                if eof:
+                    if after >= len(buf):
+                        raise ValueError(f"{path}: JSON 数组不完整")
+                    raise ValueError(f"{path}: 第 {after} 个字符处应为 ',' 或 ']'")
+                refill(pos)
+                continue
+            yield item
+            pos = end
+            if pos > chunk_size:
+                buf, pos = buf[pos:], 0
+
+
+def join_paragraphs(paragraphs, sep=''):
+    """合并 paragraphs 字段 (字符串或字符串列表)；段落原样拼接，不做清洗，导入的诗歌文本与逐文件 json.load 时一致"""
+    if not paragraphs:
+        return ''
+    if isinstance(paragraphs, str):
+        return paragraphs
+    return sep.join(p for p in paragraphs if isinstance(p, str))
+
+
+def iter_poetry_files(targets=None, data_dir=POETRY_DATA_DIR):
+    """按 targets 顺序产出 (目录名, JSON 文件路径)"""
+    for folder, file_limit in (targets or DEFAULT_TARGETS):
+        dir_path = os.path.join(data_dir, folder)
+        if not os.path.isdir(dir_path):
+            continue
+        files = sorted(f for f in os.listdir(dir_path) if f.endswith('.json'))
+        if file_limit:
+            files = files[:file_limit]
+        for filename in files:
+            yield folder, os.path.join(dir_path, filename)
+
+
+def iter_file_poems(path, sep='', min_length=0):
+    """流式读取单个 JSON 文件，产出带 'content' 字段的诗歌条目
+
+    min_length > 0 时跳过内容不超过该长度的诗歌 (训练语料)；为 0 时全部产出，包括空内容 (导入)
+    """
+    for item in iter_json_array(path):
+        if not isinstance(item, dict):
+            continue
+        content = join_paragraphs(item.get('paragraphs'), sep=sep)
+        if min_length and len(content) <= min_length:
+            continue
+        item['content'] = content
+        yield item
+
+
+def iter_poems(targets=None, data_dir=POETRY_DATA_DIR, sep='', min_length=0):
+    """遍历数据目录下的全部诗歌；单个文件损坏时跳过并继续"""
+    for folder, path in iter_poetry_files(targets, data_dir):
+        try:
+            for item in iter_file_poems(path, sep=sep, min_length=min_length):
+                item['source'] = folder
+                yield item
+        except (OSError, ValueError) as e:
+            print(f"[Corpus] Skipping {path}: {e}")
+
+
+def reservoir_sample(iterable, k, seed=None):
+    """蓄水池采样 (Algorithm R)，返回 (样本列表, 遍历总数)
+
+    总数不超过 k 时按原顺序返回全部元素。
+    """
+    rng = random.Random(seed)
+    sample = []
+    seen = 0
+    for item in iterable:
+        seen += 1
+        if len(sample) < k:
+            sample.append(item)
+        else:
+            j = rng.randrange(seen)
+            if j < k:
+                sample[j] = item
+    return sample, seen
@@ -2,8 +2,14 @@ import os
 import json
 import random
 from app import app
-from models import db, Poem
+from models import Poem
 import bertopic_analysis
+from bulk_retag import bulk_retag_poems
+
+def quick_real_topic(content, author=None):
+    label = bertopic_analysis.generate_real_topic(content)
+    keywords = bertopic_analysis.get_individual_keywords(content, top_k=4)
+    return f"{label}-{keywords}" if keywords and keywords not in {"未知", "未分类"} else label
 
 def quick_train(limit=2000):
     print(f"[QuickTrain] Collecting {limit} poems...")
@@ -20,18 +26,11 @@ def quick_train(limit=2000):
     model, topics, probs = bertopic_analysis.train_bertopic_model(docs)
     
     print("[QuickTrain] Saving model...")
-    bertopic_analysis.save_bertopic_model(model)
+    bertopic_analysis.save_bertopic_model(model, metadata={'kind': 'quick', 'docs': len(docs)})
     
     print("[QuickTrain] Updating DB tags...")
     with app.app_context():
-        all_poems = Poem.query.all()
-        for p in all_poems:
-            tid, tname = bertopic_analysis.predict_topic(p.content, model)
-            p.Bertopic = tname
-            label = bertopic_analysis.generate_real_topic(p.content)
-            keywords = bertopic_analysis.get_individual_keywords(p.content, top_k=4)
-            p.Real_topic = f"{label}-{keywords}" if keywords and keywords not in {"未知", "未分类"} else label
-        db.session.commit()
+        bulk_retag_poems(job='quick', real_topic_fn=quick_real_topic)
     print("[Success] System is now functional with Mini-Model.")
 
 if __name__ == '__main__':
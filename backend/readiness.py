@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动分阶段预热与就绪状态
+
+服务启动后立即对外提供接口 (推荐接口先以热门诗歌降级服务)，模型加载、
+向量矩阵构建与词典预热在后台线程中完成。/api/health/ready 报告每个组件
+(数据库 / BERTopic / 向量矩阵 / 词典) 的状态。
+"""
+
+import threading
+import time
+import logging
+import traceback
+
+from flask import jsonify
+
+
+class ReadinessTracker:
+    """各组件的就绪状态"""
+
+    PENDING = 'pending'
+    LOADING = 'loading'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    COMPONENTS = ('database', 'lexicons', 'bertopic', 'vector_matrix')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.components = {
+            name: {'state': self.PENDING, 'error': None, 'seconds': None, 'updated_at': None}
+            for name in self.COMPONENTS
+        }
+
+    def mark(self, name, state, error=None, seconds=None):
+        with self._lock:
+            entry = self.components.setdefault(name, {})
+            entry['state'] = state
+            entry['error'] = error
+            if seconds is not None:
+                entry['seconds'] = round(seconds, 3)
+            entry['updated_at'] = time.time()
+
+    def state(self, name):
+        return self.components.get(name, {}).get('state', self.PENDING)
+
+    def is_ready(self, name):
+        return self.state(name) == self.READY
+
+    @property
+    def degraded(self):
+        """模型或向量矩阵未就绪时，推荐接口以热门诗歌降级服务"""
+        return not (self.is_ready('bertopic') and self.is_ready('vector_matrix'))
+
+    def snapshot(self):
+        with self._lock:
+            components = {k: dict(v) for k, v in self.components.items()}
+        return {
+            'ready': all(c['state'] == self.READY for c in components.values()),
+            'degraded': self.degraded,
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'components': components
+        }
+
+
+readiness = ReadinessTracker()
+_warmup_thread = None
+logger = logging.getLogger('Readiness')
+
+
+def is_degraded():
+    """推荐接口是否处于降级模式"""
+    return readiness.degraded
+
+
+def warmup_started():
+    """后台预热是否已接管模型加载 (此时请求线程不应再同步加载模型)"""
+    return _warmup_thread is not None
+
+
+def _run_phase(name, fn):
+    readiness.mark(name, ReadinessTracker.LOADING)
+    start = time.time()
+    try:
+        ok = fn()
+    except Exception as e:
+        logger.error(f"预热阶段 {name} 失败: {e}\n{traceback.format_exc()}")
+        readiness.mark(name, ReadinessTracker.FAILED, error=str(e), seconds=time.time() - start)
+        return False
+    if ok is False:
+        readiness.mark(name, ReadinessTracker.FAILED, error='组件不可用', seconds=time.time() - start)
+        return False
+    readiness.mark(name, ReadinessTracker.READY, seconds=time.time() - start)
+    return True
+
+
+def _warmup(app, after_ready):
+    from bertopic_analysis import warm_up_lexicons
+    from model_registry import model_registry
+
+    _run_phase('lexicons', warm_up_lexicons)
+
+    if not _run_phase('bertopic', lambda: model_registry.load() is not None):
+        error = model_registry.get_status().get('error')
+        readiness.mark('bertopic', ReadinessTracker.FAILED, error=error)
+        readiness.mark('vector_matrix', ReadinessTracker.FAILED, error='BERTopic 模型不可用')
+        return
+
+    def build_matrix():
+        from recommendation_update import recommendation_service, IncrementalRecommender
+        with app.app_context():
+            recommender = recommendation_service.recommender if recommendation_service else IncrementalRecommender()
+            recommender._build_poem_vector_matrix()
+        return True
+
+    _run_phase('vector_matrix', build_matrix)
+
+    if after_ready:
+        try:
+            after_ready()
+        except Exception as e:
+            logger.error(f"预热后续任务失败: {e}\n{traceback.format_exc()}")
+
+
+def start_background_warmup(app, after_ready=None):
+    """在后台线程中加载模型与向量矩阵；after_ready 在全部组件就绪后执行"""
+    global _warmup_thread
+    if _warmup_thread and _warmup_thread.is_alive():
+        return _warmup_thread
+    _warmup_thread = threading.Thread(target=_warmup, args=(app, after_ready), daemon=True)
+    _warmup_thread.start()
+    return _warmup_thread
+
+
+def add_health_routes(app):
+    """添加健康检查接口"""
+
+    @app.route('/api/health/ready')
+    def get_readiness():
+        """各组件就绪状态；全部就绪返回 200，否则 503"""
+        data = readiness.snapshot()
+        return jsonify(data), (200 if data['ready'] else 503)
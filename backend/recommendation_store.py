@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线预计算的个性化推荐列表
+
+/api/recommend_personal、/api/user/<username>/recommendations、/api/recommend_one
+每次请求都完整执行混合推荐 (相似用户、UserCF、ItemCF、内容推荐、热门、多样性重排)。
+这里由后台批处理为活跃用户预先计算排好序的候选列表，请求时直接取前 limit 个:
+- 每个用户记录其评论标记 (评论数, 最近一次评论 / 修改时间)；批处理只重算标记变化、
+  列表过期或尚未计算的用户
+- 列表与生成它的版本 (模型版本 / 向量模型) 绑定，版本变化后全部视为过期；
+  诗歌增删不改变版本: 新诗按内容相似度插入各列表，已删除的诗歌在读取时跳过
+- 本进程内新增 / 修改评论时立即作废该用户的列表，请求回退到在线计算，直到下一次批处理
+- 以 CSR 形式 (用户ID / 偏移 / 诗歌ID int32) 保存为 saved_models/vector_cache/user_recommendations.npz
+"""
+
+import os
+import time
+import threading
+
+import numpy as np
+
+
+class RecommendationStoreConfig:
+    """预计算推荐列表配置"""
+
+    # 每个用户预计算的候选数 (请求按前缀截取)
+    LIST_SIZE = 50
+
+    # 列表超过该时间（秒）视为过期，请求回退在线计算
+    MAX_AGE = 6 * 3600
+
+    # 后台批处理间隔（秒）
+    REFRESH_INTERVAL = 600
+
+    # 最近该天数内有评论的用户才预计算 (None 表示所有评论过的用户)
+    ACTIVE_DAYS = 90
+
+    FILE_NAME = 'user_recommendations.npz'
+
+
+class RecommendationStore:
+    """user_id -> (诗歌ID数组, 评论标记, 计算时间)"""
+
+    def __init__(self, path=None, version=None):
+        self.path = path
+        self.version = version
+        self._entries = {}
+        # user_id -> 最近一次作废时间；批处理开始后被作废的用户不写入旧结果
+        self._invalidated = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshed_at = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id, limit, version, live=None):
+        """新鲜的预计算列表前 limit 个诗歌ID；没有或已过期时返回 None
+
+        live: 现存诗歌ID的集合 (或字典)，提供时跳过已删除的诗歌；剩下的不足 limit 个时同样返回 None
+        """
+        entry = self._entries.get(user_id) if version == self.version else None
+        if entry is None or time.time() - entry[2] > RecommendationStoreConfig.MAX_AGE:
+            self.misses += 1
+            return None
+        poem_ids = entry[0].tolist()
+        if live is not None:
+            alive = [pid for pid in poem_ids if pid in live]
+            if len(alive) < min(limit, len(poem_ids)):
+                self.misses += 1
+                return None
+            poem_ids = alive
+        self.hits += 1
+        return poem_ids[:limit]
+
+    def put(self, user_id, poem_ids, marker, started_at=None):
+        """写入列表；started_at 之后该用户被作废过 (计算期间有新评论) 时丢弃"""
+        with self._lock:
+            if started_at is not None and self._invalidated.get(user_id, 0) >= started_at:
+                return False
+            self._entries[user_id] = (np.asarray(poem_ids, dtype=np.int32), marker, time.time())
+            return True
+
+    def items(self):
+        """[(user_id, 诗歌ID数组)] 的快照"""
+        with self._lock:
+            return [(user_id, entry[0]) for user_id, entry in self._entries.items()]
+
+    def insert(self, user_id, poem_id, position):
+        """把新诗插入列表的 position 处 (超出 LIST_SIZE 的末尾截掉)，不改变评论标记与计算时间"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or position >= RecommendationStoreConfig.LIST_SIZE or poem_id in entry[0]:
+                return False
+            poem_ids = np.insert(entry[0], min(position, len(entry[0])), poem_id)
+            self._entries[user_id] = (poem_ids[:RecommendationStoreConfig.LIST_SIZE], entry[1], entry[2])
+            return True
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._invalidated[user_id] = time.time()
+
+    def reset(self, version):
+        """版本变化: 丢弃所有列表"""
+        with self._lock:
+            self._entries = {}
+            self.version = version
+
+    def stale_users(self, markers, started_at):
+        """markers: 批处理开始 (started_at) 后查询的 {user_id: 评论标记}；
+        返回需要重算的用户，并移除不再活跃的用户"""
+        now = time.time()
+        with self._lock:
+            for user_id in [uid for uid in self._entries if uid not in markers]:
+                self._entries.pop(user_id, None)
+            # 更早的作废已反映在评论标记中
+            self._invalidated = {uid: t for uid, t in self._invalidated.items() if t >= started_at}
+        stale = []
+        for user_id, marker in markers.items():
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] != marker or now - entry[2] > RecommendationStoreConfig.MAX_AGE:
+                stale.append(user_id)
+        return stale
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {
+            'users': len(self._entries),
+            'version': self.version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else None,
+            'refreshed_at': self.refreshed_at
+        }
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            items = list(self._entries.items())
+            version = self.version
+        lengths = np.array([len(e[0]) for _, e in items], dtype=np.int64)
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    version=str(version or ''),
+                    user_ids=np.array([uid for uid, _ in items], dtype=np.int64),
+                    offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+                    poem_ids=np.concatenate([e[0] for _, e in items]) if items else np.zeros(0, dtype=np.int32),
+                    review_counts=np.array([e[1][0] for _, e in items], dtype=np.int64),
+                    review_times=np.array([e[1][1] for _, e in items], dtype=np.float64),
+                    built_at=np.array([e[2] for _, e in items], dtype=np.float64)
+                )
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"[RecommendationStore] Failed to save: {e}")
+
+    @classmethod
+    def load(cls, path):
+        """加载持久化的列表；文件不存在或损坏时返回空存储"""
+        store = cls(path)
+        if not os.path.exists(path):
+            return store
+        try:
+            with np.load(path) as data:
+                store.version = str(data['version']) or None
+                offsets = data['offsets']
+                poem_ids = data['poem_ids']
+                for i, uid in enumerate(data['user_ids']):
+                    marker = (int(data['review_counts'][i]), float(data['review_times'][i]))
+                    store._entries[int(uid)] = (poem_ids[offsets[i]:offsets[i + 1]].copy(), marker,
+                                                float(data['built_at'][i]))
+        except Exception as e:
+            print(f"[RecommendationStore] Failed to load {path}: {e}")
+            store._entries = {}
+        return store
+
+
+def open_recommendation_store(cache_dir):
+    return RecommendationStore.load(os.path.join(cache_dir, RecommendationStoreConfig.FILE_NAME))
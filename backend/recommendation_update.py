@@ -17,23 +17,32 @@
 
 import threading
 import time
-import json
 import logging
 import traceback
 from datetime import datetime, timedelta
 from collections import Counter
+from itertools import islice
 from functools import wraps
 import psutil
 import os
 import math
 
-from flask import Flask, current_app
+from flask import Flask, current_app, jsonify, request
 from sqlalchemy import event
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 
 from config import Config
 from models import db, User, Poem, Review
+from model_registry import get_bertopic_model
+from inference_executor import run_inference, InferenceRejected
+from ann_index import load_or_build_ann_index, save_ann_index, ExactIndex, normalize_rows
+from item_neighbors import build_item_neighbors, load_item_neighbors, save_item_neighbors
+from poem_vectors import PoemVectorStore, open_matrix_cache, load_cached_rows, save_matrix_cache
+from user_profiles import open_user_profile_store
+from recommendation_store import open_recommendation_store, RecommendationStoreConfig
+from singleflight import SingleFlight
+from next_poem_queue import NextPoemQueues, NextPoemQueueConfig
 
 
 # ==================== 配置 ====================
@@ -58,6 +67,21 @@ class RecommendationConfig:
     # 批处理大小
     BATCH_SIZE = 50
     
+    # MMR 多样性重排中相关性的权重 (其余为与已选诗歌的最大相似度惩罚)
+    MMR_LAMBDA = 0.7
+    
+    # 相似用户搜索的候选范围: 评论数最多的前 N 个用户 (None 表示全部用户)
+    SIMILAR_USER_CANDIDATES = None
+    
+    # 新诗追加后延迟持久化 ANN 索引 / 近邻表（秒），批量导入时合并为一次写盘
+    INDEX_SAVE_DELAY = 30
+    
+    # 构建向量矩阵时每块读取 / 编码的诗歌数；内容按块流式读取，内存与诗歌总数无关
+    MATRIX_CONTENT_CHUNK = 1000
+    
+    # 用户画像累加和的兜底全量重建间隔（秒）；评论新增 / 修改时已增量更新
+    USER_PROFILE_RESYNC_INTERVAL = 3600
+    
     # 日志文件
     LOG_FILE = 'logs/recommendation_update.log'
 
@@ -192,28 +216,25 @@ class PerformanceMonitor:
 # ==================== 增量推荐计算 ====================
 
 # ==================== 增量推荐计算 ====================
-load_bertopic_model = None
 predict_topic = None
+predict_topic_from_vector = None
 get_document_vector = None
 batch_get_vectors = None
-cosine_similarity = None
 np = None
 
 def _lazy_load_recommender_deps():
-    global load_bertopic_model, predict_topic, get_document_vector, batch_get_vectors, cosine_similarity, np
-    if load_bertopic_model is None:
-        from bertopic_analysis import load_bertopic_model as _load_bertopic_model
+    global predict_topic, predict_topic_from_vector, get_document_vector, batch_get_vectors, np
+    if predict_topic is None:
         from bertopic_analysis import predict_topic as _predict_topic
+        from bertopic_analysis import predict_topic_from_vector as _predict_topic_from_vector
         from bertopic_analysis import get_document_vector as _get_document_vector
         from bertopic_analysis import batch_get_vectors as _batch_get_vectors
-        load_bertopic_model = _load_bertopic_model
         predict_topic = _predict_topic
+        predict_topic_from_vector = _predict_topic_from_vector
         get_document_vector = _get_document_vector
         batch_get_vectors = _batch_get_vectors
-    if cosine_similarity is None or np is None:
-        from sklearn.metrics.pairwise import cosine_similarity as _cosine_similarity
+    if np is None:
         import numpy as _np
-        cosine_similarity = _cosine_similarity
         np = _np
 
 class IncrementalRecommender:
@@ -222,23 +243,48 @@ class IncrementalRecommender:
     def __init__(self):
         self.logger = RecommendationLogger()
         self.monitor = PerformanceMonitor()
-        self.bertopic_model = None
-        self.topic_matrix = None # 诗歌主题向量矩阵 (n_poems, vector_dim)
-        self.poem_id_map = {}    # poem_id -> matrix_index
-        self.poem_ids = []       # [poem_id1, poem_id2, ...]
+        # 可增长的诗歌向量存储 (poem_vectors.PoemVectorStore)；以下四项是它的视图，增删诗歌后重新绑定
+        self.vector_store = None
+        self.topic_matrix = None # 诗歌主题向量矩阵 (n_poems, vector_dim)，L2 归一化的 float32；已删除的行为零向量
+        self.poem_id_map = {}    # poem_id -> matrix_index (只含未删除的诗歌)
+        self.poem_ids = []       # [poem_id1, poem_id2, ...] (按行号，含已删除的行)
+        self.poem_authors = None  # 每行诗歌的作者编号 (int32，-1 表示作者未知)，多样性重排用
+        self.author_codes = {}    # 作者名 -> 作者编号
+        self.matrix_embedding_name = None  # 构建矩阵所用的向量模型标识
+        self.ann_index = None    # topic_matrix 上的近似最近邻索引 (行号与矩阵一致)
+        self.neighbor_table = None  # item-item Top-K 近邻表 (后台构建，未就绪时 ItemCF 改用索引查询)
+        # 修改向量存储 / 索引 / 近邻表时持有 (读取不加锁)
+        self._matrix_lock = threading.Lock()
+        self._neighbor_building = False
+        self._compacting = False
+        self._index_save_timer = None
         
         self.cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saved_models', 'vector_cache')
         os.makedirs(self.cache_dir, exist_ok=True)
         
-        self.user_vector_cache = {}
-        self.user_vector_cache_ttl = 300
+        # 增量维护的用户画像累加和 (user_profiles.UserProfileStore)，相似用户搜索一次矩阵向量乘完成
+        self.profile_store = None
+        self._profile_lock = threading.Lock()
+        self._profile_resyncing = False
+        
+        # 离线预计算的推荐列表 (recommendation_store.RecommendationStore)，请求优先从中读取
+        self.recommendation_store = open_recommendation_store(self.cache_dir)
+        self._precompute_lock = threading.Lock()
+        # 并发的相同在线推荐 (同一用户 / 数量 / 版本) 合并为一次计算
+        self.recommendation_flights = SingleFlight()
+        # “换诗”的每用户预取队列
+        self.next_poem_queues = NextPoemQueues()
         
         # 延迟加载向量矩阵
 
+    @property
+    def bertopic_model(self):
+        """共享模型注册表中的 BERTopic 实例 (不触发加载)"""
+        return get_bertopic_model(load=False)
+
     def _ensure_model_loaded(self):
         _lazy_load_recommender_deps()
-        if self.bertopic_model is None:
-            self.bertopic_model = load_bertopic_model()
+        get_bertopic_model()
 
     def update_user_preference(self, user_id):
         """分析用户所有评论，更新用户偏好主题文本 (Restored from previous version)"""
@@ -268,111 +314,449 @@ class IncrementalRecommender:
             return
             
         with current_app.app_context():
-            poems = Poem.query.all()
-            if not poems:
+            result = self._load_or_compute_matrix(self.bertopic_model)
+            if result is None:
                 return
-            
-            self.poem_ids = [p.id for p in poems]
-            self.poem_id_map = {pid: idx for idx, pid in enumerate(self.poem_ids)}
-            
-            # 尝试从缓存加载
-            matrix_path = os.path.join(self.cache_dir, 'topic_matrix.npy')
-            ids_path = os.path.join(self.cache_dir, 'poem_ids.json')
-            
-            # 检查缓存是否有效 (ID列表匹配)
-            cache_valid = False
-            if os.path.exists(matrix_path) and os.path.exists(ids_path):
-                try:
-                    with open(ids_path, 'r') as f:
-                        cached_ids = json.load(f)
-                    if cached_ids == self.poem_ids:
-                        self.topic_matrix = np.load(matrix_path)
-                        self.logger.logger.info(f"成功从缓存加载 {len(self.poem_ids)} 首诗歌的向量矩阵")
-                        cache_valid = True
-                except Exception as e:
-                    self.logger.logger.warning(f"缓存加载失败: {e}")
-            
-            if not cache_valid:
-                # 获取所有诗歌内容重新计算
-                contents = [p.content for p in poems]
-                self.logger.logger.info(f"正在构建 {len(poems)} 首诗歌的向量矩阵 (全量计算)...")
-                self.topic_matrix = batch_get_vectors(contents, self.bertopic_model)
-                
-                # 保存到缓存
-                try:
-                    np.save(matrix_path, self.topic_matrix)
-                    with open(ids_path, 'w') as f:
-                        json.dump(self.poem_ids, f)
-                    self.logger.logger.info("向量矩阵已持久化到本地缓存")
-                except Exception as e:
-                    self.logger.logger.error(f"缓存保存失败: {e}")
-            
+            self._install_matrix(*result)
             self.logger.logger.info("向量矩阵准备就绪")
 
-    def _get_cached_user_vector(self, user_id):
-        entry = self.user_vector_cache.get(user_id)
-        if not entry:
+    def _load_or_compute_matrix(self, model, embedding_name=None, progress=None):
+        """返回 (poem_ids, matrix, embedding_name, ann_index, neighbor_table, authors)
+
+        缓存的摘要 (诗歌ID + 向量模型) 一致时只读映射缓存矩阵，不读取诗歌内容与每一行向量；
+        否则从旧缓存按ID复用向量，只为新增的诗歌计算向量。progress(已编码数, 待编码数) 在每块编码后调用。
+        """
+        from bertopic_analysis import embedding_cache_name
+        embedding_name = embedding_name or embedding_cache_name()
+
+        rows = db.session.query(Poem.id, Poem.author).order_by(Poem.id).all()
+        if not rows:
+            return None
+        poem_ids = [pid for pid, _ in rows]
+        authors = [author for _, author in rows]
+
+        matrix = open_matrix_cache(self.cache_dir, poem_ids, embedding_name)
+        if matrix is not None:
+            self.logger.logger.info(f"成功映射 {len(poem_ids)} 首诗歌的向量矩阵缓存")
+            return self._with_indexes(poem_ids, matrix, embedding_name, authors)
+
+        matrix, missing = load_cached_rows(self.cache_dir, poem_ids, embedding_name)
+        self.logger.logger.info(f"正在构建 {len(poem_ids)} 首诗歌的向量矩阵 "
+                                f"(复用 {len(poem_ids) - len(missing)}，计算 {len(missing)})...")
+        if missing:
+            matrix = self._embed_poems(model, poem_ids, missing, matrix, progress or self._log_matrix_progress())
+            if matrix is None:
+                return None
+
+        mapped = self._save_matrix_cache(poem_ids, matrix, embedding_name)
+        if mapped is not None:
+            matrix = mapped
+        return self._with_indexes(poem_ids, matrix, embedding_name, authors)
+
+    def _stream_poem_contents(self, poem_ids=None):
+        """按块产出 [(诗歌ID, 内容), ...]；poem_ids 为 None 时以服务端游标流式读取全部诗歌"""
+        chunk = RecommendationConfig.MATRIX_CONTENT_CHUNK
+        if poem_ids is None:
+            rows = iter(db.session.query(Poem.id, Poem.content).order_by(Poem.id).yield_per(chunk))
+            while True:
+                batch = list(islice(rows, chunk))
+                if not batch:
+                    return
+                yield batch
+        else:
+            for i in range(0, len(poem_ids), chunk):
+                yield db.session.query(Poem.id, Poem.content).filter(Poem.id.in_(poem_ids[i:i + chunk])).all()
+
+    def _embed_poems(self, model, poem_ids, missing, matrix, progress):
+        """逐块编码 missing 行的诗歌并写入 matrix (为 None 时按第一块的维度分配)；编码失败返回 None"""
+        position = {poem_ids[i]: i for i in missing}
+        streaming = len(missing) == len(poem_ids)
+        done = 0
+        for batch in self._stream_poem_contents(None if streaming else [poem_ids[i] for i in missing]):
+            batch = [(pid, content) for pid, content in batch if pid in position]
+            if not batch:
+                continue
+            # 构建时一次性归一化为 float32，之后的打分都是单次内积，不再逐次归一化
+            vectors = normalize_rows(batch_get_vectors([content or '' for _, content in batch], model))
+            if len(vectors) != len(batch):
+                self.logger.logger.error("向量计算失败，无法构建向量矩阵")
+                return None
+            if matrix is None:
+                matrix = np.zeros((len(poem_ids), vectors.shape[1]), dtype=np.float32)
+            matrix[[position[pid] for pid, _ in batch]] = vectors
+            done += len(batch)
+            progress(done, len(missing))
+        if done < len(missing):
+            # 构建期间被删除的诗歌保持零向量，由 sync_deleted_poems 移除
+            self.logger.logger.warning(f"{len(missing) - done} 首诗歌在构建期间被删除")
+        return matrix
+
+    def _log_matrix_progress(self):
+        """默认进度回调: 每完成约 10% 记录一次"""
+        start = time.time()
+        state = {'logged': 0}
+
+        def log(done, total):
+            if done == total or done - state['logged'] >= total / 10:
+                state['logged'] = done
+                self.logger.logger.info(f"向量矩阵构建进度: {done}/{total} ({done / total * 100:.1f}%), "
+                                        f"耗时: {time.time() - start:.2f}秒")
+        return log
+
+    def _save_matrix_cache(self, poem_ids, matrix, embedding_name):
+        """保存到缓存 (原子替换)，返回缓存的只读映射；失败时返回 None"""
+        mapped = save_matrix_cache(self.cache_dir, poem_ids, matrix, embedding_name)
+        if mapped is not None:
+            self.logger.logger.info("向量矩阵已持久化到本地缓存")
+        else:
+            self.logger.logger.error("缓存保存失败")
+        return mapped
+
+    def _persist_vector_store(self):
+        """向量存储写回缓存；写盘期间没有增删时改用缓存的只读映射，释放私有缓冲区"""
+        with self._matrix_lock:
+            store = self.vector_store
+            if store is None or store.is_mapped:
+                return
+            poem_ids, matrix = list(store.ids), store.matrix
+            size, dead, embedding_name = store.size, store.dead, self.matrix_embedding_name
+        mapped = self._save_matrix_cache(poem_ids, matrix, embedding_name)
+        if mapped is None:
+            return
+        with self._matrix_lock:
+            if self.vector_store is store and store.size == size and store.dead == dead \
+                    and self.matrix_embedding_name == embedding_name and store.adopt(mapped):
+                self.ann_index.attach(store.matrix)
+                self._bind_vector_store()
+
+    def _with_indexes(self, poem_ids, matrix, embedding_name, authors=None):
+        """为矩阵加载 (或构建) ANN 索引，并加载持久化的近邻表 (没有时返回 None，安装后后台构建)"""
+        ann_index = load_or_build_ann_index(self.cache_dir, poem_ids, matrix, embedding_name)
+        neighbor_table = load_item_neighbors(self.cache_dir, poem_ids, matrix, embedding_name)
+        return poem_ids, matrix, embedding_name, ann_index, neighbor_table, authors
+
+    def _install_matrix(self, poem_ids, matrix, embedding_name=None, ann_index=None, neighbor_table=None,
+                        authors=None):
+        """一次性替换向量矩阵及其索引"""
+        _lazy_load_recommender_deps()
+        matrix = normalize_rows(matrix)
+        author_codes = {}
+        poem_authors = np.fromiter(
+            (author_codes.setdefault(a, len(author_codes)) if a else -1 for a in (authors or [None] * len(poem_ids))),
+            dtype=np.int32, count=len(poem_ids))
+        store = PoemVectorStore(matrix, poem_ids, poem_authors)
+        if ann_index is None:
+            ann_index = ExactIndex().build(store.matrix)
+        else:
+            # 索引改为引用存储的缓冲区，之后的追加 / 删除 (清零) 对索引直接可见
+            ann_index.attach(store.matrix)
+        with self._matrix_lock:
+            self.vector_store = store
+            self.author_codes = author_codes
+            self.matrix_embedding_name = embedding_name
+            self.ann_index = ann_index
+            self.neighbor_table = neighbor_table
+            self._bind_vector_store()
+        if neighbor_table is None:
+            self._build_neighbors_async()
+
+    def _bind_vector_store(self):
+        """向量存储增删 / 压缩后，重新绑定矩阵视图 (持有 _matrix_lock)"""
+        store = self.vector_store
+        self.poem_ids = store.ids
+        self.poem_id_map = store.id_map
+        self.poem_authors = store.authors
+        self.topic_matrix = store.matrix
+
+    def _append_poem(self, poem, vec):
+        """新诗追加到向量存储 (均摊 O(1))，ANN 索引与近邻表同步插入新行"""
+        vec = normalize_rows(vec)
+        with self._matrix_lock:
+            store = self.vector_store
+            if store is None or poem.id in store.id_map:
+                return
+            code = self.author_codes.setdefault(poem.author, len(self.author_codes)) if poem.author else -1
+            store.append([poem.id], vec, [code])
+            self._bind_vector_store()
+            self.ann_index.add(vec, backing=store.matrix)
+            table = self.neighbor_table
+            if table is not None:
+                table.add(store.matrix)
+            self._schedule_index_save()
+
+    def _schedule_index_save(self):
+        """延迟保存向量缓存与索引: INDEX_SAVE_DELAY 秒内追加的多首新诗只写一次盘 (持有 _matrix_lock)"""
+        if self._index_save_timer is not None:
+            return
+
+        def save():
+            with self._matrix_lock:
+                self._index_save_timer = None
+                poem_ids, table = list(self.poem_ids), self.neighbor_table
+            self._persist_vector_store()
+            self._save_indexes(poem_ids, table)
+
+        self._index_save_timer = threading.Timer(RecommendationConfig.INDEX_SAVE_DELAY, save)
+        self._index_save_timer.daemon = True
+        self._index_save_timer.start()
+
+    def remove_poems(self, poem_ids):
+        """已删除的诗歌: 向量存储中墓碑标记，ANN 索引同步删除；墓碑过多时后台压缩"""
+        with self._matrix_lock:
+            store = self.vector_store
+            if store is None:
+                return 0
+            rows = store.remove(poem_ids)
+            if len(rows):
+                # 只读映射的存储在删除时复制为私有缓冲区，索引与矩阵视图改为引用它 (墓碑行已清零)
+                self.ann_index.attach(store.matrix)
+                self._bind_vector_store()
+                self.ann_index.remove(rows)
+            needs_compaction = store.needs_compaction()
+        if len(rows):
+            self.logger.logger.info(f"已从向量矩阵中移除 {len(rows)} 首诗歌")
+        if needs_compaction:
+            self._compact_async()
+        return len(rows)
+
+    def sync_deleted_poems(self):
+        """对比数据库中的诗歌ID，移除已被删除的诗歌"""
+        if self.vector_store is None:
+            return 0
+        existing = {pid for (pid,) in db.session.query(Poem.id).all()}
+        deleted = [pid for pid in list(self.poem_id_map) if pid not in existing]
+        return self.remove_poems(deleted) if deleted else 0
+
+    def _compact_async(self):
+        """后台压缩向量存储: 去掉墓碑行并重排行号，索引与近邻表随之重建，结果写回向量缓存"""
+        with self._matrix_lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        def run():
+            try:
+                with self._matrix_lock:
+                    store, index, table = self.vector_store, self.ann_index, self.neighbor_table
+                    size = store.size
+                    keep = np.nonzero(store.alive)[0]
+                start = time.time()
+                new_store = store.compacted(keep)
+                new_index = index.compact(keep, new_store.matrix)
+                new_table = table.compact(keep) if table is not None else None
+                with self._matrix_lock:
+                    if self.vector_store is not store or self.ann_index is not index:
+                        return  # 压缩期间矩阵被整体替换
+                    # 补上压缩期间追加的新诗与删除的诗歌
+                    tail = [i for i in range(size, store.size) if store.alive[i]]
+                    if tail:
+                        new_store.append([store.ids[i] for i in tail], store.matrix[tail], store.authors[tail])
+                        new_index.add(new_store.matrix[-len(tail):], backing=new_store.matrix)
+                        if new_table is not None:
+                            new_table.add(new_store.matrix)
+                    removed = new_store.remove([store.ids[i] for i in keep if not store.alive[i]])
+                    if len(removed):
+                        new_index.remove(removed)
+                    if table is not None and self.neighbor_table is not table:
+                        new_table = None  # 压缩期间近邻表才构建完成，按新行号重新构建
+                    self.vector_store = new_store
+                    self.ann_index = new_index
+                    self.neighbor_table = new_table
+                    self._bind_vector_store()
+                    poem_ids = list(new_store.ids)
+                self.logger.logger.info(f"向量矩阵已压缩: {size} -> {len(keep)} 行 ({time.time() - start:.2f}s)")
+                self._persist_vector_store()
+                self._save_indexes(poem_ids, new_table)
+                if new_table is None:
+                    self._build_neighbors_async()
+            except Exception as e:
+                self.logger.logger.error(f"向量矩阵压缩失败: {e}")
+            finally:
+                self._compacting = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _save_indexes(self, poem_ids, table):
+        """持久化 ANN 索引 (精确索引不写盘) 与近邻表"""
+        if not isinstance(self.ann_index, ExactIndex):
+            try:
+                save_ann_index(self.cache_dir, self.ann_index, poem_ids, self.matrix_embedding_name)
+            except Exception as e:
+                self.logger.logger.error(f"ANN 索引保存失败: {e}")
+        if table is not None:
+            try:
+                save_item_neighbors(self.cache_dir, table, poem_ids, self.matrix_embedding_name)
+            except Exception as e:
+                self.logger.logger.error(f"近邻表保存失败: {e}")
+
+    def _build_neighbors_async(self):
+        """后台构建近邻表；构建期间追加的新诗在安装前补算，矩阵被整体替换时重新构建"""
+        with self._matrix_lock:
+            if self._neighbor_building:
+                return
+            self._neighbor_building = True
+
+        def run():
+            try:
+                while True:
+                    with self._matrix_lock:
+                        matrix, index = self.topic_matrix, self.ann_index
+                        poem_ids, embedding_name = list(self.poem_ids), self.matrix_embedding_name
+                    table = build_item_neighbors(matrix, index)
+                    with self._matrix_lock:
+                        if self.matrix_embedding_name != embedding_name \
+                                or self.poem_ids[:len(poem_ids)] != poem_ids:
+                            continue
+                        table.add(self.topic_matrix)
+                        self.neighbor_table = table
+                        poem_ids = list(self.poem_ids)
+                    break
+                save_item_neighbors(self.cache_dir, table, poem_ids, embedding_name)
+            except Exception as e:
+                self.logger.logger.error(f"近邻表构建失败: {e}")
+            finally:
+                self._neighbor_building = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def prepare_model_swap(self, new, old, app):
+        """热切换前 (后台线程): 新版本的向量模型不同则为其重建向量矩阵"""
+        _lazy_load_recommender_deps()
+        if self.topic_matrix is None or new.embedding_name == self.matrix_embedding_name:
+            return
+        with app.app_context():
+            result = self._load_or_compute_matrix(new.model, new.embedding_name)
+        if result is not None:
+            new.extras['topic_matrix'] = result
+
+    def commit_model_swap(self, new, old):
+        """热切换时 (切换锁内): 安装为新版本准备好的向量矩阵"""
+        result = new.extras.pop('topic_matrix', None)
+        if result is not None:
+            self._install_matrix(*result)
+
+    def _predict_poem_topic(self, poem):
+        """诗歌向量已在 topic_matrix 中时直接按主题中心分配，避免再跑一次完整推理"""
+        idx = self.poem_id_map.get(poem.id)
+        if self.topic_matrix is not None and idx is not None and idx < len(self.topic_matrix):
+            return run_inference('poem_topic', predict_topic_from_vector, self.topic_matrix[idx],
+                                 self.bertopic_model, text=poem.content, timeout=None)
+        return run_inference('poem_topic', predict_topic, poem.content, self.bertopic_model, timeout=None)
+
+    def _embed_poem(self, poem):
+        """计算新诗向量与主题 (一次推理调用)，返回 (vec, topic_id, topic_name)"""
+        vec = get_document_vector(poem.content, self.bertopic_model)
+        tid, tname = predict_topic_from_vector(vec, self.bertopic_model, text=poem.content)
+        return vec, tid, tname
+
+    def _loaded_profile_store(self):
+        """已加载且与当前向量矩阵一致的用户画像存储 (不触发加载)"""
+        store = self.profile_store
+        if store is None or self.topic_matrix is None:
+            return None
+        if store.dim != self.topic_matrix.shape[1] or store.embedding_name != self.matrix_embedding_name:
             return None
-        expires_at, vector = entry
-        if expires_at < time.time():
-            self.user_vector_cache.pop(user_id, None)
+        return store
+
+    def _get_profile_store(self):
+        """持久化的用户画像存储；首次使用时加载，向量模型变化或评论总数对不上时全量重建"""
+        if self.topic_matrix is None:
             return None
-        return vector
+        store = self._loaded_profile_store()
+        if store is not None:
+            if time.time() - store.built_at > RecommendationConfig.USER_PROFILE_RESYNC_INTERVAL:
+                self._resync_profiles_async(current_app._get_current_object())
+            return store
+        dim = self.topic_matrix.shape[1]
+        with self._profile_lock:
+            store = self._loaded_profile_store()
+            if store is not None:
+                return store
+            store = open_user_profile_store(self.cache_dir, dim, self.matrix_embedding_name)
+            if store.size == 0 or store.total_reviews != Review.query.count():
+                self._rebuild_profiles(store)
+            self.profile_store = store
+            return store
 
-    def _set_cached_user_vector(self, user_id, vector):
-        self.user_vector_cache[user_id] = (time.time() + self.user_vector_cache_ttl, vector)
-        return vector
+    def _rebuild_profiles(self, store):
+        """一次查询全部评论，用稀疏权重矩阵乘诗歌矩阵重建所有用户的累加和"""
+        start = time.time()
+        rows = db.session.query(Review.user_id, Review.poem_id, Review.rating, Review.liked,
+                                Review.created_at).yield_per(10000)
+        store.rebuild(rows, self.topic_matrix, self.poem_id_map)
+        self.logger.logger.info(f"用户画像已重建: {store.size} 个用户 ({time.time() - start:.2f}s)")
 
-    def _get_user_profile_vector(self, user_id):
-        """构建用户偏好向量 (基于交互历史加权平均)"""
+    def _resync_profiles_async(self, app):
+        """定期兜底全量重建 (多进程部署时其他 worker 写入的评论、脚本直接改库等)"""
+        with self._profile_lock:
+            if self._profile_resyncing:
+                return
+            self._profile_resyncing = True
+
+        def run():
+            try:
+                with app.app_context():
+                    self._rebuild_profiles(self.profile_store)
+            except Exception as e:
+                self.logger.logger.error(f"用户画像重建失败: {e}")
+            finally:
+                self._profile_resyncing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _review_entry(self, review):
+        """(诗歌向量 或 None, created_at, rating, liked)"""
+        poem_idx = self.poem_id_map.get(review.poem_id)
+        vector = self.topic_matrix[poem_idx] if poem_idx is not None else None
+        return vector, review.created_at, review.rating, bool(getattr(review, 'liked', False))
+
+    def _invalidate_recommendations(self, user_id):
+        """作废预计算列表；进行中的在线计算基于旧评论，之后的请求不再加入"""
+        self.recommendation_store.invalidate(user_id)
+        self.recommendation_flights.forget(lambda key: key[0] == user_id)
+
+    def on_review_added(self, review):
+        """新评论: O(dim) 更新该用户的累加和，并作废该用户的预计算推荐列表
+
+        存储尚未加载时不在这里加载: 之后加载时评论总数对不上会全量重建，已包含这条评论。
+        """
+        self._invalidate_recommendations(review.user_id)
+        self.next_poem_queues.discard(review.user_id, review.poem_id)
+        store = self._loaded_profile_store()
+        if store is not None:
+            store.add_review(review.user_id, *self._review_entry(review))
+
+    def on_review_updated(self, review, old_rating, old_liked):
+        """评论的评分 / 喜欢被修改: 撤销旧权重再计入新权重"""
+        self._invalidate_recommendations(review.user_id)
+        store = self._loaded_profile_store()
+        if store is None:
+            return
+        vector, created_at, rating, liked = self._review_entry(review)
+        store.update_review(review.user_id, vector, created_at, (old_rating, bool(old_liked)), (rating, liked))
+
+    def _get_user_profile_vector(self, user_id, reviews=None):
+        """用户偏好向量 (交互历史的时间衰减加权平均)，直接取自增量维护的累加和
+
+        reviews: 调用方已查出的该用户全部评论；条数与存储不一致 (例如其他进程写入) 时据此重算该用户
+        """
         _lazy_load_recommender_deps()
-        cached = self._get_cached_user_vector(user_id)
-        if cached is not None:
-            return cached
-        reviews = Review.query.filter_by(user_id=user_id).all()
-        if not reviews or self.topic_matrix is None:
+        store = self._get_profile_store()
+        if store is None:
             return None
-            
-        user_vector = np.zeros(self.topic_matrix.shape[1])
-        weight_sum = 0.0
-        now = datetime.utcnow()
-        
-        for r in reviews:
-            poem_idx = self.poem_id_map.get(r.poem_id)
-            if poem_idx is None:
-                continue
-            age_days = (now - r.created_at).total_seconds() / 86400 if r.created_at else 0
-            decay = math.exp(-age_days / 30.0)
-            rating = r.rating if r.rating is not None else 3.0
-            rating_weight = max(0.2, min(1.0, rating / 5.0))
-            like_boost = 1.2 if getattr(r, "liked", False) else 1.0
-            w = decay * rating_weight * like_boost
-            user_vector += self.topic_matrix[poem_idx] * w
-            weight_sum += w
-                
-        if weight_sum > 0:
-            user_vector /= weight_sum
-            
-        return self._set_cached_user_vector(user_id, user_vector)
+        if reviews is not None and len(reviews) != store.review_count(user_id):
+            store.reset_user(user_id, [self._review_entry(r) for r in reviews])
+        return store.profile(user_id)
 
-    def _get_similar_users(self, target_user_id, top_k=10):
-        """寻找相似用户 (User-CF Strategy)"""
+    def _get_similar_users(self, target_user_id, top_k=10, target_vector=None):
+        """寻找相似用户 (User-CF Strategy): 目标画像与全部用户累加和做一次矩阵向量乘后取 Top-K"""
         _lazy_load_recommender_deps()
-        target_vector = self._get_user_profile_vector(target_user_id)
+        if target_vector is None:
+            target_vector = self._get_user_profile_vector(target_user_id)
         if target_vector is None:
             return []
-            
-        other_users = User.query.filter(User.id != target_user_id, User.total_reviews > 0).order_by(User.total_reviews.desc()).limit(300).all()
-        similarities = []
-        
-        for u in other_users:
-            u_vector = self._get_user_profile_vector(u.id)
-            if u_vector is not None:
-                sim = cosine_similarity([target_vector], [u_vector])[0][0]
-                similarities.append((u.id, sim))
-        
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return similarities[:top_k]
+        return self.profile_store.similar(target_vector, top_k, exclude_user_id=target_user_id,
+                                          candidate_limit=RecommendationConfig.SIMILAR_USER_CANDIDATES)
 
     def _normalize_scores(self, items):
         if not items:
@@ -423,39 +807,45 @@ class IncrementalRecommender:
         return res[:limit]
 
     def _diversify_candidates(self, candidates, limit):
-        if not candidates:
+        """MMR 多样性重排: 每步选 λ·相关性 - (1-λ)·与已选诗歌的最大向量相似度 最高的诗歌，
+        相关性按同作者已选次数降权；候选向量与作者编号直接取自矩阵，不查询数据库"""
+        _lazy_load_recommender_deps()
+        if not candidates or limit <= 0:
             return []
         ids = list(candidates.keys())
-        poems = Poem.query.filter(Poem.id.in_(ids)).all()
-        poem_map = {p.id: p for p in poems}
-        remaining = set(ids)
-        selected = []
-        author_counts = Counter()
-        topic_counts = Counter()
+        m = len(ids)
+        relevance = np.fromiter(candidates.values(), dtype=np.float32, count=m)
+        top = relevance.max()
+        if top > 0:
+            relevance /= top
         
-        while remaining and len(selected) < limit:
-            best_id = None
-            best_score = -1
-            for pid in list(remaining):
-                base = candidates.get(pid, 0)
-                poem = poem_map.get(pid)
-                author = poem.author if poem else None
-                topic = poem.Bertopic if poem else None
-                author_penalty = 1 / (1 + author_counts[author]) if author else 1.0
-                topic_penalty = 1 / (1 + topic_counts[topic]) if topic else 1.0
-                score = base * author_penalty * topic_penalty
-                if score > best_score:
-                    best_score = score
-                    best_id = pid
-            if best_id is None:
-                break
-            selected.append(best_id)
-            remaining.remove(best_id)
-            poem = poem_map.get(best_id)
-            if poem and poem.author:
-                author_counts[poem.author] += 1
-            if poem and poem.Bertopic:
-                topic_counts[poem.Bertopic] += 1
+        # 不在矩阵中的候选 (刚入库的新诗) 向量按零处理，作者未知
+        rows = np.fromiter((self.poem_id_map.get(pid, -1) for pid in ids), dtype=np.int64, count=m)
+        known = rows >= 0
+        if self.topic_matrix is not None and self.poem_authors is not None:
+            known &= rows < min(len(self.topic_matrix), len(self.poem_authors))
+            vectors = np.zeros((m, self.topic_matrix.shape[1]), dtype=np.float32)
+            vectors[known] = self.topic_matrix[rows[known]]
+            authors = np.full(m, -1, dtype=np.int32)
+            authors[known] = self.poem_authors[rows[known]]
+        else:
+            vectors = np.zeros((m, 1), dtype=np.float32)
+            authors = np.full(m, -1, dtype=np.int32)
+        
+        lam = RecommendationConfig.MMR_LAMBDA
+        max_sim = np.zeros(m, dtype=np.float32)
+        author_hits = np.zeros(m, dtype=np.float32)
+        taken = np.zeros(m, dtype=bool)
+        selected = []
+        for _ in range(min(limit, m)):
+            score = lam * relevance / (1.0 + author_hits) - (1.0 - lam) * max_sim
+            score[taken] = -np.inf
+            best = int(np.argmax(score))
+            selected.append(ids[best])
+            taken[best] = True
+            np.maximum(max_sim, vectors @ vectors[best], out=max_sim)
+            if authors[best] >= 0:
+                author_hits[authors == authors[best]] += 1
         
         return selected
 
@@ -480,25 +870,27 @@ class IncrementalRecommender:
         if not user_reviewed_indices:
             return []
             
-        reviewed_vectors = self.topic_matrix[user_reviewed_indices]
-        
-        # 计算所有诗歌与用户历史诗歌的相似度平均值
-        # 这里使用矩阵运算加速: (n_all, dim) . (n_reviewed, dim).T -> (n_all, n_reviewed)
-        sim_matrix = cosine_similarity(self.topic_matrix, reviewed_vectors)
-        # 取平均相似度作为得分
-        weight_sum = sum(weights)
-        if weight_sum > 0:
-            scores = np.average(sim_matrix, axis=1, weights=np.array(weights))
-        else:
-            scores = np.mean(sim_matrix, axis=1)
+        weights = np.array(weights, dtype=np.float32)
+        if weights.sum() <= 0:
+            weights = np.ones_like(weights)
         
-        # 排除已读
-        for idx in user_reviewed_indices:
-            scores[idx] = -1.0
-            
-        # 获取Top-N
-        top_indices = np.argsort(scores)[::-1][:top_n]
-        return [(self.poem_ids[i], float(scores[i])) for i in top_indices if scores[i] > 0]
+        table = self.neighbor_table
+        if table is not None and max(user_reviewed_indices) < table.size:
+            # 已读诗歌近邻列表的加权相似度稀疏累加 (不在近邻列表中的相似度按 0 计)
+            rows, scores = table.aggregate(user_reviewed_indices, weights, top_n,
+                                           exclude=user_reviewed_indices)
+        else:
+            # 近邻表未就绪: 与用户历史诗歌的加权平均余弦相似度 = 诗歌向量与 (归一化历史向量
+            # 加权平均) 的内积，用平均向量查询一次索引 (排除已读)
+            reviewed_vectors = normalize_rows(self.topic_matrix[user_reviewed_indices])
+            query = weights @ reviewed_vectors / weights.sum()
+            rows, scores = self.ann_index.search(query, top_n, exclude=user_reviewed_indices)
+        return self._rows_to_poems(rows, scores)
+
+    def _rows_to_poems(self, rows, scores):
+        """检索结果 (行号, 得分) -> [(poem_id, score)]，跳过非正得分与已删除的行"""
+        alive = self.vector_store.alive
+        return [(self.poem_ids[i], float(s)) for i, s in zip(rows, scores) if s > 0 and alive[i]]
 
     def _content_based_recommend(self, target_vector, user_reviewed_indices, top_n=20):
         """基于用户画像向量的内容推荐"""
@@ -506,22 +898,105 @@ class IncrementalRecommender:
         if self.topic_matrix is None or target_vector is None:
             return []
             
-        # 计算用户向量与所有诗歌的相似度
-        scores = cosine_similarity([target_vector], self.topic_matrix)[0]
-        
-        # 排除已读
-        for idx in user_reviewed_indices:
-            scores[idx] = -1.0
-            
-        top_indices = np.argsort(scores)[::-1][:top_n]
-        return [(self.poem_ids[i], float(scores[i])) for i in top_indices if scores[i] > 0]
+        # 用户向量归一化后与诗歌向量的内积即余弦相似度，经索引检索 Top-N (排除已读)
+        rows, scores = self.ann_index.search(normalize_rows(target_vector), top_n,
+                                             exclude=user_reviewed_indices)
+        return self._rows_to_poems(rows, scores)
+
+    def _serving_version(self):
+        """预计算列表的版本: 模型版本或向量模型变化后旧列表全部失效 (诗歌增删只增量修补)"""
+        from model_registry import model_registry
+        return f"{model_registry.version}|{self.matrix_embedding_name}"
+
+    def _insert_into_precomputed(self, poem_id):
+        """新诗按与用户画像的余弦相似度插入各预计算列表: 排在相似度不低于它的诗歌之后"""
+        _lazy_load_recommender_deps()
+        store = self.recommendation_store
+        profiles = self._loaded_profile_store()
+        if profiles is None or not len(store):
+            return 0
+        with self._matrix_lock:
+            matrix, id_map = self.topic_matrix, self.poem_id_map
+        row = id_map.get(poem_id)
+        if row is None:
+            return 0
+        inserted = 0
+        for user_id, poem_ids in store.items():
+            profile = profiles.profile(user_id)
+            if profile is None:
+                continue
+            profile = normalize_rows(profile)
+            score = float(matrix[row] @ profile)
+            if score <= 0:
+                continue
+            rows = np.fromiter((id_map.get(int(pid), -1) for pid in poem_ids), dtype=np.int64, count=len(poem_ids))
+            alive = rows >= 0
+            scores = np.full(len(rows), -np.inf, dtype=np.float32)
+            scores[alive] = matrix[rows[alive]] @ profile
+            if store.insert(user_id, poem_id, int(np.count_nonzero(scores >= score))):
+                inserted += 1
+        return inserted
 
     def get_new_poems_for_user(self, user_id, limit=6):
-        """混合推荐主逻辑 (Hybrid Strategy)"""
+        """个性化推荐: 优先取预计算列表，没有或已过期时在线计算"""
+        poem_ids = self._ranked_poem_ids(user_id, limit)
+        id_map = {p.id: p for p in Poem.query.filter(Poem.id.in_(poem_ids)).all()}
+        return [id_map[pid] for pid in poem_ids if pid in id_map]
+
+    def _ranked_poem_ids(self, user_id, limit):
+        """排好序的推荐诗歌ID: 预计算列表 -> 合并的在线计算"""
+        version = self._serving_version() if self.topic_matrix is not None else None
+        poem_ids = None
+        if user_id is not None and version is not None and limit <= RecommendationStoreConfig.LIST_SIZE:
+            poem_ids = self.recommendation_store.get(user_id, limit, version, live=self.poem_id_map)
+        if poem_ids is None:
+            # 页面加载时几个接口同时请求同一用户的推荐，共享一次在线计算的诗歌ID
+            poem_ids, _ = self.recommendation_flights.do((user_id, limit, version), self.get_new_poem_ids_for_user,
+                                                         user_id, limit)
+        return poem_ids
+
+    def next_poem_for_user(self, user_id):
+        """换诗: 从该用户的预取队列按排名取下一首未展示过的诗歌；队列低于低水位时后台补充"""
+        queues = self.next_poem_queues
+        queues.check_version(self._serving_version() if self.topic_matrix is not None else None)
+        poem = None
+        for _ in range(NextPoemQueueConfig.QUEUE_SIZE):
+            poem_id = queues.pop(user_id)
+            if poem_id is None:
+                # 首次点击 (或补充跟不上点击): 同步填充一次
+                self._refill_next_poems(user_id, queues.claim_refill(user_id, force=True))
+                poem_id = queues.pop(user_id)
+                if poem_id is None:
+                    break
+            poem = Poem.query.get(poem_id)
+            if poem is not None:
+                break  # 已被删除的诗歌跳过
+        claim = queues.claim_refill(user_id)
+        if claim is not None:
+            app = current_app._get_current_object()
+            threading.Thread(target=self._refill_next_poems_in_app, args=(app, user_id, claim), daemon=True).start()
+        return poem
+
+    def _refill_next_poems(self, user_id, claim):
+        generation, limit = claim
+        poem_ids = []
+        try:
+            poem_ids = self._ranked_poem_ids(user_id, limit)
+        except Exception as e:
+            self.logger.logger.error(f"换诗队列补充失败 (用户 {user_id}): {e}")
+        finally:
+            self.next_poem_queues.fill(user_id, poem_ids, generation)
+
+    def _refill_next_poems_in_app(self, app, user_id, claim):
+        with app.app_context():
+            self._refill_next_poems(user_id, claim)
+
+    def get_new_poem_ids_for_user(self, user_id, limit=6):
+        """混合推荐主逻辑 (Hybrid Strategy)，返回排好序的诗歌ID列表"""
         _lazy_load_recommender_deps()
-        user = User.query.get(user_id)
+        user = User.query.get(user_id) if user_id is not None else None
         if not user or not self.bertopic_model:
-            return self.get_global_popular(limit)
+            return [p.id for p in self.get_global_popular(limit)]
         
         if self.topic_matrix is None:
             self._build_poem_vector_matrix()
@@ -553,16 +1028,18 @@ class IncrementalRecommender:
             w_content = 0.2
             w_popular = 0.0
             
+        # 画像直接取自增量维护的累加和；已查出的评论用于校验该用户的条数
+        user_vec = self._get_user_profile_vector(user_id, reviews=user_reviews) if interaction_count else None
+
         user_cf_recs = []
         if w_cf_user > 0:
-            similar_users = self._get_similar_users(user_id)
+            similar_users = self._get_similar_users(user_id, target_vector=user_vec)
             user_cf_recs = self._get_user_cf_candidates(similar_users, user_reviewed_ids, per_user_limit=5, limit=300)
 
         item_recs = self._topic_based_item_cf(user_reviews) if w_cf_item > 0 else []
 
         content_recs = []
         if w_content > 0:
-            user_vec = self._get_user_profile_vector(user_id)
             if user_vec is not None:
                 content_recs = self._content_based_recommend(user_vec, user_reviewed_indices)
 
@@ -601,9 +1078,48 @@ class IncrementalRecommender:
                     if len(selected_ids) >= limit:
                         break
                         
-        id_map = {p.id: p for p in Poem.query.filter(Poem.id.in_(selected_ids)).all()}
-        return [id_map[pid] for pid in selected_ids if pid in id_map]
+        return selected_ids
     
+    def _review_markers(self):
+        """活跃用户的评论标记 {user_id: (评论数, 最近评论 / 修改时间戳)}，一次分组查询"""
+        latest = db.func.max(db.func.coalesce(Review.updated_at, Review.created_at))
+        query = db.session.query(Review.user_id, db.func.count(Review.id), latest).group_by(Review.user_id)
+        if RecommendationStoreConfig.ACTIVE_DAYS:
+            query = query.having(latest >= datetime.utcnow() - timedelta(days=RecommendationStoreConfig.ACTIVE_DAYS))
+        return {uid: (int(count), ts.timestamp() if ts else 0.0) for uid, count, ts in query.all()}
+
+    def precompute_recommendations(self, app=None):
+        """批处理: 为评论标记变化、列表过期或尚未计算的活跃用户重算推荐列表"""
+        flask_app = app or current_app
+        if not self._precompute_lock.acquire(blocking=False):
+            return {'success': False, 'error': '预计算正在进行'}
+        try:
+            with flask_app.app_context():
+                if self.topic_matrix is None or not self.bertopic_model:
+                    return {'success': False, 'error': '向量矩阵未就绪'}
+                store = self.recommendation_store
+                version = self._serving_version()
+                if store.version != version:
+                    store.reset(version)
+                started_at = time.time()
+                markers = self._review_markers()
+                stale = store.stale_users(markers, started_at)
+                for i, user_id in enumerate(stale):
+                    poem_ids = self.get_new_poem_ids_for_user(user_id, RecommendationStoreConfig.LIST_SIZE)
+                    store.put(user_id, poem_ids, markers[user_id], started_at=started_at)
+                    if (i + 1) % RecommendationConfig.BATCH_SIZE == 0:
+                        # 长批处理中释放已加载的 ORM 对象
+                        db.session.expunge_all()
+                store.refreshed_at = time.time()
+                store.save()
+                elapsed = time.time() - started_at
+                self.logger.logger.info(f"推荐列表预计算完成: 重算 {len(stale)} / {len(markers)} 个活跃用户 "
+                                        f"({elapsed:.2f}s)")
+                return {'success': True, 'refreshed_users': len(stale), 'active_users': len(markers),
+                        'elapsed': round(elapsed, 3)}
+        finally:
+            self._precompute_lock.release()
+
     def get_global_popular(self, limit=6):
         """获取全局热门诗歌"""
         return Poem.query.order_by(Poem.views.desc()).limit(limit).all()
@@ -628,7 +1144,7 @@ class IncrementalRecommender:
             poems = Poem.query.all()
             for poem in poems:
                 if not poem.Bertopic and self.bertopic_model:
-                     tid, tname = predict_topic(poem.content, self.bertopic_model)
+                     tid, tname = self._predict_poem_topic(poem)
                      poem.Bertopic = tname
                      poem.Real_topic = str(tid)
                 poem.review_count = Review.query.filter_by(poem_id=poem.id).count()
@@ -644,21 +1160,27 @@ class IncrementalRecommender:
                 # 如果是新诗插入，为新诗计算 BERTopic 主题
                 poem = Poem.query.get(poem_id)
                 if poem and self.bertopic_model:
-                    tid, tname = predict_topic(poem.content, self.bertopic_model)
+                    # 先计算 (或从向量缓存取出) 新诗向量，主题直接由向量分配，只做一次编码
+                    # 后台任务不设截止时间；只有推理队列已满时才放弃，交给更新服务稍后重试
+                    try:
+                        vec, tid, tname = run_inference('new_poem', self._embed_poem, poem, timeout=None)
+                    except InferenceRejected as e:
+                        self.logger.logger.warning(f"新诗 {poem.id} 向量计算推迟: {e}")
+                        return {'success': False, 'error': str(e)}
                     poem.Bertopic = tname
                     poem.Real_topic = str(tid)
                     db.session.commit()
                     
-                    # 更新向量矩阵缓存 (增量更新暂未实现，简单触发全量重建或append)
-                    if self.topic_matrix is not None:
-                        # 简单的增量添加
-                        vec = get_document_vector(poem.content, self.bertopic_model)
-                        if vec is not None:
-                            self.topic_matrix = np.vstack([self.topic_matrix, vec])
-                            self.poem_ids.append(poem.id)
-                            self.poem_id_map[poem.id] = len(self.poem_ids) - 1
+                    # 新诗向量追加到向量存储，并插入已有的预计算列表
+                    self._append_poem(poem, vec)
+                    inserted = self._insert_into_precomputed(poem.id)
+                    if inserted:
+                        self.logger.logger.info(f"新诗 {poem.id} 已插入 {inserted} 个用户的预计算推荐列表")
 
             self.batch_update_all_recommendations(flask_app)
+            self.sync_deleted_poems()
+            # 只重算评论标记变化或列表过期的用户
+            self.precompute_recommendations(flask_app)
             
         return {'success': True, 'processed_users': len(user_ids) if user_ids else 0}
 
@@ -690,6 +1212,7 @@ class RecommendationUpdateService:
         self.new_poem_ids = []  # 待处理的新诗歌ID列表
         self.last_poem_count = 0  # 上次检测的诗歌数量
         self.poll_thread = None  # 后台轮询线程
+        self.precompute_thread = None  # 推荐列表定期预计算线程
         self.app = None  # 保存 Flask 应用引用
     
     def register_database_listener(self, app):
@@ -712,6 +1235,28 @@ class RecommendationUpdateService:
                 daemon=True
             )
             self.poll_thread.start()
+            
+            # 启动推荐列表定期预计算线程
+            self.precompute_thread = threading.Thread(
+                target=self._precompute_periodically,
+                args=(app,),
+                daemon=True
+            )
+            self.precompute_thread.start()
+    
+    def _precompute_periodically(self, app):
+        """向量矩阵就绪后，每 REFRESH_INTERVAL 秒增量重算一次预计算推荐列表"""
+        last_run = 0
+        while True:
+            time.sleep(10)
+            if self.recommender.topic_matrix is None \
+                    or time.time() - last_run < RecommendationStoreConfig.REFRESH_INTERVAL:
+                continue
+            try:
+                self.recommender.precompute_recommendations(app)
+            except Exception as e:
+                self.logger.logger.error(f"推荐列表预计算失败: {e}")
+            last_run = time.time()
     
     def _poll_for_new_poems(self, app):
         """轮询检测新诗歌（每10秒检查一次）"""
@@ -734,6 +1279,10 @@ class RecommendationUpdateService:
                                 f"📝 检测到 {new_count} 首新诗歌, 最新ID: {latest_poem.id}"
                             )
                             self._on_new_poem_inserted(latest_poem.id)
+                    elif current_count < self.last_poem_count:
+                        # 有诗歌被删除: 从向量矩阵中移除
+                        self.last_poem_count = current_count
+                        self.recommender.sync_deleted_poems()
                     
             except Exception as e:
                 self.logger.logger.error(f"轮询错误: {e}")
@@ -838,6 +1387,9 @@ class RecommendationUpdateService:
             'pending_poems': self.new_poem_ids.copy(),
             'last_update_time': self.last_update_time.isoformat() if self.last_update_time else None,
             'retry_count': self.retry_count,
+            'precomputed': self.recommender.recommendation_store.get_stats(),
+            'coalesced': self.recommender.recommendation_flights.get_stats(),
+            'next_poem': self.recommender.next_poem_queues.get_stats(),
             'config': {
                 'trigger_delay': RecommendationConfig.TRIGGER_DELAY,
                 'max_processing_time': RecommendationConfig.MAX_PROCESSING_TIME,
@@ -862,6 +1414,16 @@ def init_recommendation_system(app):
     
     # 注册数据库监听器
     recommendation_service.register_database_listener(app)
+
+    # 模型热切换时同步替换向量矩阵
+    if not getattr(recommendation_service, '_swap_hooks_registered', False):
+        from model_registry import model_registry
+        recommender = recommendation_service.recommender
+        model_registry.add_swap_hooks(
+            prepare=lambda new, old: recommender.prepare_model_swap(new, old, app),
+            commit=recommender.commit_model_swap
+        )
+        recommendation_service._swap_hooks_registered = True
     
     # 记录初始化完成
     logger = RecommendationLogger()
@@ -907,6 +1469,15 @@ def add_recommendation_routes(app):
                 'details': result
             }), 500
     
+    @app.route('/api/admin/recommendation/precompute', methods=['POST'])
+    def trigger_recommendation_precompute():
+        """手动触发推荐列表预计算 (只重算评论有变化或列表过期的用户)"""
+        if recommendation_service is None:
+            return jsonify({'error': '推荐系统未初始化'}), 500
+        
+        result = recommendation_service.recommender.precompute_recommendations(recommendation_service.app)
+        return jsonify(result), 200 if result.get('success', False) else 409
+    
     @app.route('/api/admin/recommendation/logs')
     def get_recommendation_logs():
         """获取推荐更新日志"""
@@ -254,7 +254,8 @@ def retrain_all_users_lda():
     print(f"   - 更新用户数: {updated_users}")
     print(f"   - 总耗时: {elapsed_time:.2f} 秒")
     print()
-    print("💡 提示: 模型已自动重新加载，下次API调用将使用新模型")
+    print("💡 提示: 运行中的服务使用 BERTopic 模型，不会加载这里保存的 LDA 模型；")
+    print("   更新 BERTopic 模型请运行 train_bertopic.py，服务会检测到新版本并自动热切换")
     print()
     
     return True
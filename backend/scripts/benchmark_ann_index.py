@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANN 索引基准: recall@k 与查询延迟 (对比精确检索)
+
+默认生成带簇结构的合成向量 (与句向量一样分布不均匀)；--from-cache 时使用
+向量缓存 (saved_models/vector_cache) 中的真实诗歌向量。查询为随机库向量
+加噪声，模拟用户画像向量。
+
+用法:
+    python scripts/benchmark_ann_index.py --size 100000 --queries 200 --k 20
+    python scripts/benchmark_ann_index.py --from-cache
+"""
+
+import sys
+import os
+import time
+import argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from ann_index import ExactIndex, IVFIndex, HnswIndex, hnswlib_available, normalize_rows
+from poem_vectors import cached_matrix_path
+
+
+def synthetic_vectors(size, dim, clusters, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size)
+    vectors = centers[labels] + 1.5 * rng.standard_normal((size, dim)).astype(np.float32)
+    return vectors
+
+
+def load_cached_matrix():
+    path = cached_matrix_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'saved_models',
+                                           'vector_cache'))
+    if not os.path.exists(path):
+        return None
+    return np.load(path)
+
+
+def make_queries(vectors, n, seed):
+    rng = np.random.default_rng(seed + 1)
+    picks = vectors[rng.choice(len(vectors), n, replace=False)]
+    noise = 0.3 * rng.standard_normal(picks.shape).astype(np.float32) * np.abs(picks).mean()
+    return normalize_rows(picks + noise)
+
+
+def run(index, queries, k, truth=None, **search_kwargs):
+    latencies = []
+    recalls = []
+    for i, q in enumerate(queries):
+        start = time.perf_counter()
+        rows, _ = index.search(q, k, **search_kwargs)
+        latencies.append(time.perf_counter() - start)
+        if truth is not None:
+            recalls.append(len(set(rows.tolist()) & truth[i]) / k)
+    latencies = np.array(latencies) * 1000
+    return {
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'recall': float(np.mean(recalls)) if recalls else 1.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--from-cache", action="store_true", help="使用向量缓存中的真实诗歌向量")
+    args = parser.parse_args()
+
+    vectors = load_cached_matrix() if args.from_cache else None
+    if vectors is None:
+        if args.from_cache:
+            print("[Warn] 向量缓存中没有 topic_matrix.npy，改用合成数据")
+        vectors = synthetic_vectors(args.size, args.dim, args.clusters, args.seed)
+    queries = make_queries(vectors, min(args.queries, len(vectors)), args.seed)
+    print(f"[Bench] {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}")
+
+    exact = ExactIndex().build(vectors)
+    base = run(exact, queries, args.k)
+    truth = [set(exact.search(q, args.k)[0].tolist()) for q in queries]
+
+    results = [('exact', '-', 0.0, base)]
+
+    start = time.perf_counter()
+    ivf = IVFIndex().build(vectors)
+    ivf_build = time.perf_counter() - start
+    for n_probe in (4, 8, 16, 32, 64):
+        if n_probe > ivf.n_lists:
+            break
+        results.append(('ivf', f"lists={ivf.n_lists} probe={n_probe}", ivf_build,
+                        run(ivf, queries, args.k, truth, n_probe=n_probe)))
+
+    if hnswlib_available():
+        start = time.perf_counter()
+        hnsw = HnswIndex().build(vectors)
+        hnsw_build = time.perf_counter() - start
+        for ef in (32, 64, 128, 256):
+            results.append(('hnsw', f"M={hnsw.m} ef={ef}", hnsw_build,
+                            run(hnsw, queries, args.k, truth, ef=ef)))
+    else:
+        print("[Bench] hnswlib 未安装，跳过 HNSW")
+
+    print("\n" + "=" * 78)
+    print(f"{'backend':<8}{'params':<24}{'build s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'recall@' + str(args.k):>12}{'speedup':>9}")
+    print("-" * 78)
+    for backend, params, build, stats in results:
+        speedup = base['p50_ms'] / stats['p50_ms'] if stats['p50_ms'] > 0 else 0.0
+        print(f"{backend:<8}{params:<24}{build:>10.2f}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}"
+              f"{stats['recall']:>12.3f}{speedup:>8.1f}x")
+    print("=" * 78)
+
+
+if __name__ == "__main__":
+    main()
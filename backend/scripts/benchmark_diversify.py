@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多样性重排基准: 原 ORM 贪心循环 vs 向量化 MMR
+
+原实现先查询全部候选的 Poem 对象，再用纯 Python 双重循环按作者 / 主题字符串计数降权；
+这里只计其中的循环部分 (候选对象用内存中的简单对象代替，不含数据库往返)。
+MMR 直接使用候选在矩阵中的向量与预先编码的作者编号。
+
+用法:
+    python scripts/benchmark_diversify.py --candidates 300,1000,5000 --limit 50
+"""
+
+import sys
+import os
+import time
+import argparse
+from collections import Counter
+from types import SimpleNamespace
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from ann_index import normalize_rows
+from recommendation_update import IncrementalRecommender
+
+
+def legacy_diversify(candidates, limit, poem_map):
+    """原 _diversify_candidates 的贪心循环"""
+    remaining = set(candidates)
+    selected = []
+    author_counts = Counter()
+    topic_counts = Counter()
+    while remaining and len(selected) < limit:
+        best_id = None
+        best_score = -1
+        for pid in list(remaining):
+            poem = poem_map.get(pid)
+            author_penalty = 1 / (1 + author_counts[poem.author]) if poem.author else 1.0
+            topic_penalty = 1 / (1 + topic_counts[poem.Bertopic]) if poem.Bertopic else 1.0
+            score = candidates[pid] * author_penalty * topic_penalty
+            if score > best_score:
+                best_score = score
+                best_id = pid
+        selected.append(best_id)
+        remaining.remove(best_id)
+        author_counts[poem_map[best_id].author] += 1
+        topic_counts[poem_map[best_id].Bertopic] += 1
+    return selected
+
+
+def timed(fn, repeat):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples = np.array(samples) * 1000
+    return float(np.percentile(samples, 50)), float(np.percentile(samples, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--poems", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--authors", type=int, default=5000)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--candidates", default="300,1000,5000")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    matrix = normalize_rows(rng.standard_normal((args.poems, args.dim), dtype=np.float32))
+    authors = rng.integers(0, args.authors, args.poems)
+    topics = rng.integers(0, args.topics, args.poems)
+    poem_ids = list(range(1, args.poems + 1))
+
+    recommender = IncrementalRecommender.__new__(IncrementalRecommender)
+    recommender.topic_matrix = matrix
+    recommender.poem_id_map = {pid: i for i, pid in enumerate(poem_ids)}
+    recommender.poem_authors = authors.astype(np.int32)
+    poem_map = {pid: SimpleNamespace(author=f"a{authors[i]}", Bertopic=f"t{topics[i]}")
+                for i, pid in enumerate(poem_ids)}
+
+    print(f"{'candidates':>11}{'legacy p50':>12}{'legacy p95':>12}{'mmr p50':>10}{'mmr p95':>10}{'speedup':>9}")
+    for n in [int(s) for s in args.candidates.split(',') if s.strip()]:
+        picks = rng.choice(poem_ids, n, replace=False)
+        candidates = {int(pid): float(score) for pid, score in zip(picks, rng.random(n))}
+        legacy = timed(lambda: legacy_diversify(candidates, args.limit, poem_map), args.repeat)
+        mmr = timed(lambda: recommender._diversify_candidates(candidates, args.limit), args.repeat)
+        print(f"{n:>11}{legacy[0]:>10.2f}ms{legacy[1]:>10.2f}ms{mmr[0]:>8.2f}ms{mmr[1]:>8.2f}ms"
+              f"{legacy[0] / mmr[0]:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
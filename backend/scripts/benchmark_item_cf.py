@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ItemCF 打分基准: 稠密相似度矩阵 vs 平均向量索引查询 vs 预计算近邻表
+
+- dense: 原实现，cosine_similarity 计算 (n_poems, n_reviewed) 矩阵再加权平均、全量 argsort
+- centroid: 近邻表未就绪时的回退路径，归一化历史向量加权平均后查询一次 ANN 索引
+- neighbors: 已读诗歌的 Top-K 近邻列表稀疏累加
+
+内存为单次调用的峰值临时分配 (tracemalloc)，另列出近邻表本身的常驻大小与构建耗时；
+overlap 为与 dense 结果 Top-N 的重合率。
+
+用法:
+    python scripts/benchmark_item_cf.py --size 50000 --reviewed 50,500
+    python scripts/benchmark_item_cf.py --from-cache
+"""
+
+import sys
+import os
+import time
+import argparse
+import tracemalloc
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from ann_index import build_ann_index, normalize_rows
+from item_neighbors import build_item_neighbors
+from benchmark_ann_index import synthetic_vectors, load_cached_matrix
+
+
+def dense_item_cf(matrix, reviewed, weights, top_n):
+    """原 _topic_based_item_cf 的实现"""
+    from sklearn.metrics.pairwise import cosine_similarity
+    sim_matrix = cosine_similarity(matrix, matrix[reviewed])
+    scores = np.average(sim_matrix, axis=1, weights=weights)
+    for idx in reviewed:
+        scores[idx] = -1.0
+    return np.argsort(scores)[::-1][:top_n]
+
+
+def centroid_item_cf(matrix, index, reviewed, weights, top_n):
+    query = weights @ matrix[reviewed] / weights.sum()
+    return index.search(query, top_n, exclude=reviewed)[0]
+
+
+def neighbor_item_cf(table, reviewed, weights, top_n):
+    return table.aggregate(reviewed, weights, top_n, exclude=reviewed)[0]
+
+
+def measure(fn, users, repeat):
+    """返回 (p50 ms, p95 ms, 峰值临时内存 MB, 每个用户的结果)"""
+    results = [fn(*u) for u in users]  # 预热
+    latencies = []
+    for _ in range(repeat):
+        for u in users:
+            start = time.perf_counter()
+            fn(*u)
+            latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(*users[0])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    latencies = np.array(latencies) * 1000
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95)), peak / 1024 / 1024, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--reviewed", default="50,500", help="每个用户的已读诗歌数 (逗号分隔)")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--top-n", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--from-cache", action="store_true", help="使用向量缓存中的真实诗歌向量")
+    args = parser.parse_args()
+
+    matrix = load_cached_matrix() if args.from_cache else None
+    if matrix is None:
+        if args.from_cache:
+            print("[Warn] 向量缓存中没有 topic_matrix.npy，改用合成数据")
+        matrix = synthetic_vectors(args.size, args.dim, args.clusters, args.seed)
+    matrix = normalize_rows(matrix)
+    n = len(matrix)
+    print(f"[Bench] {n} poems x {matrix.shape[1]} dims")
+
+    index = build_ann_index(matrix)
+    start = time.perf_counter()
+    table = build_item_neighbors(matrix, index)
+    build_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(args.seed)
+    rows = []
+    for n_reviewed in [int(s) for s in args.reviewed.split(',') if s.strip()]:
+        n_reviewed = min(n_reviewed, n - args.top_n)
+        users = []
+        for _ in range(args.users):
+            # 用户已读诗歌集中在少数几个簇附近，与真实阅读历史相似
+            seeds = rng.choice(n, 5, replace=False)
+            pool = np.unique(np.concatenate([table.neighbors[s][table.neighbors[s] >= 0] for s in seeds]
+                                            + [rng.choice(n, n_reviewed, replace=False)]))
+            reviewed = rng.choice(pool, min(n_reviewed, len(pool)), replace=False).tolist()
+            weights = rng.uniform(0.2, 1.2, len(reviewed)).astype(np.float32)
+            users.append((reviewed, weights))
+
+        dense = measure(lambda r, w: dense_item_cf(matrix, r, w, args.top_n), users, args.repeat)
+        centroid = measure(lambda r, w: centroid_item_cf(matrix, index, r, w, args.top_n), users, args.repeat)
+        neighbors = measure(lambda r, w: neighbor_item_cf(table, r, w, args.top_n), users, args.repeat)
+
+        for name, stats in (('dense', dense), ('centroid', centroid), ('neighbors', neighbors)):
+            overlap = np.mean([len(set(np.asarray(a).tolist()) & set(np.asarray(b).tolist())) / args.top_n
+                               for a, b in zip(stats[3], dense[3])])
+            rows.append((len(users[0][0]), name, stats[0], stats[1], stats[2], overlap))
+
+    print("\n" + "=" * 72)
+    print(f"neighbor table: K={table.k}, {table.nbytes / 1024 / 1024:.1f} MB resident, "
+          f"built in {build_seconds:.1f}s ({index.backend} index)")
+    print("-" * 72)
+    print(f"{'reviewed':>9}  {'path':<10}{'p50 ms':>10}{'p95 ms':>10}{'peak MB':>10}"
+          f"{'overlap@' + str(args.top_n):>12}{'speedup':>9}")
+    print("-" * 72)
+    base = {}
+    for n_reviewed, name, p50, p95, peak, overlap in rows:
+        base.setdefault(n_reviewed, p50)
+        print(f"{n_reviewed:>9}  {name:<10}{p50:>10.2f}{p95:>10.2f}{peak:>10.1f}"
+              f"{overlap:>12.2f}{base[n_reviewed] / p50:>8.1f}x")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量矩阵全量构建基准: Poem.query.all() vs 按列投影的分块流式读取
+
+在临时 SQLite 库中生成 --size 首合成诗歌 (各列都有内容)，分别在独立进程中构建向量矩阵:
+- legacy:    原实现，Poem.query.all() 实例化全部 ORM 对象，取出全部内容后一次性编码
+- streaming: 当前实现，只查询 (id, author)，内容以 yield_per 游标按块读取、逐块编码写入矩阵
+
+编码器用固定种子的随机向量代替 (不加载模型)，只比较读库与组装矩阵的耗时和内存；
+峰值内存为构建进程的 ru_maxrss 减去构建前的常驻内存。
+
+用法:
+    python scripts/benchmark_matrix_build.py --size 300000
+"""
+
+import sys
+import os
+import time
+import shutil
+import resource
+import argparse
+import tempfile
+import multiprocessing
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import psutil
+from flask import Flask
+
+from models import db, Poem
+from ann_index import normalize_rows
+
+
+def make_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def populate(app, size, seed):
+    rng = np.random.default_rng(seed)
+    chars = np.array(list("床前明月光疑是地上霜举头望明月低头思故乡春眠不觉晓处处闻啼鸟夜来风雨声花落知多少"))
+    with app.app_context():
+        db.create_all()
+        for start in range(0, size, 10000):
+            rows = []
+            for i in range(start, min(size, start + 10000)):
+                content = "，".join("".join(rng.choice(chars, 7)) for _ in range(8)) + "。"
+                rows.append({
+                    'title': f"合成诗歌 {i}", 'author': f"作者{i % 5000}", 'content': content, 'dynasty': '唐',
+                    'genre_type': '五言律诗', 'rhythm_name': '平起', 'rhythm_type': '近体诗',
+                    'Bertopic': '明月-故乡-思乡-夜', 'Real_topic': '思乡'
+                })
+            db.session.execute(db.insert(Poem), rows)
+            db.session.commit()
+
+
+def fake_vectors(dim):
+    rng = np.random.default_rng(0)
+    return lambda texts, model: rng.standard_normal((len(texts), dim), dtype=np.float32)
+
+
+def legacy_build(recommender, model):
+    """原 _load_or_compute_matrix 的全量计算路径"""
+    import recommendation_update
+    poems = Poem.query.all()
+    poem_ids = [p.id for p in poems]
+    contents = [p.content for p in poems]
+    matrix = normalize_rows(recommendation_update.batch_get_vectors(contents, model))
+    return poem_ids, matrix
+
+
+def streaming_build(recommender, model):
+    rows = db.session.query(Poem.id).order_by(Poem.id).all()
+    poem_ids = [pid for (pid,) in rows]
+    matrix = recommender._embed_poems(model, poem_ids, list(range(len(poem_ids))), None, lambda done, total: None)
+    return poem_ids, matrix
+
+
+def worker(mode, db_path, dim, results):
+    import recommendation_update
+    from recommendation_update import IncrementalRecommender
+    recommendation_update._lazy_load_recommender_deps()
+    recommendation_update.batch_get_vectors = fake_vectors(dim)
+    app = make_app(db_path)
+    recommender = IncrementalRecommender.__new__(IncrementalRecommender)
+    recommender.logger = recommendation_update.RecommendationLogger()
+    build = legacy_build if mode == 'legacy' else streaming_build
+    with app.app_context():
+        base = psutil.Process().memory_info().rss
+        start = time.perf_counter()
+        poem_ids, matrix = build(recommender, object())
+        seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    results.put((seconds, (peak - base) / 1024 / 1024, len(poem_ids), matrix.nbytes / 1024 / 1024))
+
+
+def run(mode, db_path, dim):
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    proc = ctx.Process(target=worker, args=(mode, db_path, dim, results))
+    proc.start()
+    stats = results.get()
+    proc.join()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=300000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='matrix_build_')
+    try:
+        db_path = os.path.join(tmp_dir, 'poems.db')
+        start = time.perf_counter()
+        populate(make_app(db_path), args.size, args.seed)
+        print(f"[Bench] {args.size} synthetic poems ({os.path.getsize(db_path) / 1024 / 1024:.0f} MB sqlite, "
+              f"generated in {time.perf_counter() - start:.1f}s), {args.dim} dims")
+
+        print("\n" + "=" * 64)
+        print(f"{'mode':<12}{'rebuild':>10}{'peak MB':>12}{'matrix MB':>12}{'poems':>10}")
+        print("-" * 64)
+        for mode in ('legacy', 'streaming'):
+            seconds, peak, count, matrix_mb = run(mode, db_path, args.dim)
+            print(f"{mode:<12}{seconds:>9.2f}s{peak:>12.1f}{matrix_mb:>12.1f}{count:>10}")
+        print("=" * 64)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量缓存加载基准: 每个 worker np.load 私有副本 vs mmap_mode='r' 共享页缓存
+
+启动 --workers 个进程，各自加载 --size 行的缓存矩阵 (原实现还要逐项比较ID列表并检查范数)，
+再执行 --queries 次全量内积查询，报告启动耗时与每个 worker 的内存:
+- rss: 常驻内存 (包含共享的文件页)
+- uss: 进程独占内存，即每多一个 worker 增加的内存
+- pss: 共享页按进程数均摊后的内存
+
+用法:
+    python scripts/benchmark_matrix_cache.py --size 300000 --workers 4
+"""
+
+import sys
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import psutil
+
+from ann_index import normalize_rows
+from poem_vectors import open_matrix_cache, save_matrix_cache
+
+
+def legacy_load(cache_dir, poem_ids):
+    """原 _load_or_compute_matrix 的缓存路径"""
+    with open(os.path.join(cache_dir, 'poem_ids.json'), 'r') as f:
+        cached_ids = json.load(f)
+    if cached_ids != poem_ids:
+        return None
+    return normalize_rows(np.load(os.path.join(cache_dir, 'topic_matrix.npy')))
+
+
+def worker(mode, cache_dir, size, queries, ready, results):
+    poem_ids = list(range(1, size + 1))
+    start = time.perf_counter()
+    if mode == 'np.load':
+        matrix = legacy_load(cache_dir, poem_ids)
+    else:
+        matrix = open_matrix_cache(cache_dir, poem_ids, 'bench')
+    startup = time.perf_counter() - start
+    rng = np.random.default_rng(os.getpid())
+    for _ in range(queries):
+        np.argmax(matrix @ normalize_rows(rng.standard_normal(matrix.shape[1]).astype(np.float32)))
+    # 所有 worker 都完成查询后再统计，共享页才按实际进程数均摊
+    ready.wait()
+    info = psutil.Process().memory_full_info()
+    results.put((startup, info.rss, info.uss, getattr(info, 'pss', 0)))
+    ready.wait()
+
+
+def run(mode, cache_dir, args):
+    ctx = multiprocessing.get_context('spawn')
+    ready = ctx.Barrier(args.workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, cache_dir, args.size, args.queries, ready, results))
+             for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    stats = np.array([results.get() for _ in procs])
+    for p in procs:
+        p.join()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=300000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix='matrix_cache_')
+    try:
+        rng = np.random.default_rng(args.seed)
+        matrix = normalize_rows(rng.standard_normal((args.size, args.dim), dtype=np.float32))
+        poem_ids = list(range(1, args.size + 1))
+        save_matrix_cache(cache_dir, poem_ids, matrix, 'bench')
+        # 原缓存布局: 根目录下的 topic_matrix.npy + poem_ids.json
+        np.save(os.path.join(cache_dir, 'topic_matrix.npy'), matrix)
+        with open(os.path.join(cache_dir, 'poem_ids.json'), 'w') as f:
+            json.dump(poem_ids, f)
+        del matrix
+        print(f"[Bench] {args.size} poems x {args.dim} dims "
+              f"({args.size * args.dim * 4 / 1024 / 1024:.0f} MB), {args.workers} workers")
+
+        print("\n" + "=" * 72)
+        print(f"{'mode':<10}{'startup p50':>13}{'startup max':>13}{'rss MB':>11}{'uss MB':>11}{'pss MB':>11}")
+        print("-" * 72)
+        for mode in ('np.load', 'mmap'):
+            stats = run(mode, cache_dir, args)
+            mb = stats[:, 1:].mean(axis=0) / 1024 / 1024
+            print(f"{mode:<10}{np.median(stats[:, 0]) * 1000:>11.1f}ms{stats[:, 0].max() * 1000:>11.1f}ms"
+                  f"{mb[0]:>11.1f}{mb[1]:>11.1f}{mb[2]:>11.1f}")
+        print("=" * 72)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分片编码扩展性基准: 1 到 N 个进程的 docs/s
+
+语料取自 train_bertopic.collect_poetry_data (与训练时一致)，不经过向量缓存。
+每个进程数下先启动进程池并预热 (模型加载时间单独列出)，再计时编码整个语料。
+
+用法:
+    python scripts/benchmark_parallel_embedding.py --limit 5000 --max-workers 8
+"""
+
+import sys
+import os
+import time
+import argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from parallel_embedding import ShardedEmbedder, default_threads_per_worker
+
+
+def worker_counts(max_workers):
+    counts, n = [], 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    counts.append(max_workers)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=5000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="默认按核心数平均分配")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--backend", default=None, help="torch / onnx / onnx-int8")
+    args = parser.parse_args()
+
+    from train_bertopic import collect_poetry_data
+    docs = collect_poetry_data(sample_limit=args.limit)
+    if not docs:
+        print("[Error] 没有可用语料")
+        return
+
+    results = []
+    for workers in worker_counts(args.max_workers):
+        threads = args.threads_per_worker or default_threads_per_worker(workers)
+        print(f"\n[Bench] {workers} workers x {threads} threads ...")
+        with ShardedEmbedder(workers=workers, threads_per_worker=threads,
+                             backend=args.backend, batch_size=args.batch_size) as embedder:
+            embedder.encode(docs[:workers * args.batch_size])  # 预热
+            start = time.perf_counter()
+            embedder.encode(docs)
+            elapsed = time.perf_counter() - start
+        results.append((workers, threads, embedder.load_seconds, len(docs) / elapsed))
+
+    base_rate = results[0][3]
+    print("\n" + "=" * 64)
+    print(f"{'workers':>8}{'threads':>9}{'load s':>9}{'docs/s':>11}{'speedup':>10}{'efficiency':>12}")
+    print("-" * 64)
+    for workers, threads, load_seconds, rate in results:
+        speedup = rate / base_rate if base_rate else 0.0
+        print(f"{workers:>8}{threads:>9}{load_seconds:>9.1f}{rate:>11.1f}{speedup:>9.2f}x{speedup / workers:>11.0%}")
+    print("=" * 64)
+    print(f"语料: {len(docs)} 首, batch_size={args.batch_size}, CPU 核心数: {os.cpu_count()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评论写入延迟基准测试 (POST /api/poem/review)
+
+对比两种模式下的 p50 / p99:
+- legacy:   每个请求重新执行 load_bertopic_model() (旧实现)
+- registry: 从模型注册表借用常驻模型 (当前实现)
+
+用法:
+    python scripts/benchmark_review_insert.py --requests 50 --username test
+测试写入的评论以 "[bench]" 开头，结束后会被删除并回填计数。
+"""
+
+import sys
+import os
+import time
+import argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import app as app_module
+from app import app, db
+from models import User, Poem, Review
+from bertopic_analysis import load_bertopic_model
+
+BENCH_PREFIX = "[bench]"
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def run_requests(client, username, poem_id, n):
+    latencies = []
+    for i in range(n):
+        payload = {
+            "username": username,
+            "poem_id": poem_id,
+            "comment": f"{BENCH_PREFIX} 明月几时有，把酒问青天 #{i}",
+            "rating": 4,
+        }
+        start = time.perf_counter()
+        resp = client.post('/api/poem/review', json=payload)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if resp.status_code != 200:
+            print(f"  [Warn] status={resp.status_code} body={resp.get_data(as_text=True)[:120]}")
+    return latencies
+
+
+def cleanup(user_id, poem_id):
+    with app.app_context():
+        Review.query.filter(Review.comment.like(f"{BENCH_PREFIX}%")).delete(synchronize_session=False)
+        user = User.query.get(user_id)
+        if user:
+            user.total_reviews = Review.query.filter_by(user_id=user_id).count()
+        poem = Poem.query.get(poem_id)
+        if poem:
+            poem.review_count = Review.query.filter_by(poem_id=poem_id).count()
+        db.session.commit()
+
+
+def report(name, latencies):
+    print(f"  {name:<9} n={len(latencies):<4} "
+          f"p50={percentile(latencies, 50):8.1f} ms  "
+          f"p99={percentile(latencies, 99):8.1f} ms  "
+          f"max={max(latencies) if latencies else 0:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--legacy-requests", type=int, default=10,
+                        help="legacy 模式每次都要重新加载模型，请求数可以少一些")
+    parser.add_argument("--username", default=None)
+    parser.add_argument("--poem-id", type=int, default=None)
+    args = parser.parse_args()
+
+    with app.app_context():
+        user = User.query.filter_by(username=args.username).first() if args.username else User.query.first()
+        poem = Poem.query.get(args.poem_id) if args.poem_id else Poem.query.first()
+        if not user or not poem:
+            print("[Error] 需要至少一个用户和一首诗歌")
+            return
+        user_id, username, poem_id = user.id, user.username, poem.id
+
+    client = app.test_client()
+    print("=" * 60)
+    print(f"评论写入基准测试 - 用户: {username}, 诗歌ID: {poem_id}")
+    print("=" * 60)
+
+    original = app_module.get_bertopic_model
+    try:
+        # 旧实现: 每个请求都重新加载模型
+        app_module.get_bertopic_model = lambda load=True: load_bertopic_model()
+        legacy = run_requests(client, username, poem_id, args.legacy_requests)
+    finally:
+        app_module.get_bertopic_model = original
+        cleanup(user_id, poem_id)
+
+    try:
+        # 预热注册表，排除首次加载时间
+        original()
+        current = run_requests(client, username, poem_id, args.requests)
+    finally:
+        cleanup(user_id, poem_id)
+
+    print("\n结果:")
+    report("legacy", legacy)
+    report("registry", current)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+新诗追加基准: np.vstack 逐首追加 vs 按倍数扩容的 PoemVectorStore
+
+模拟批量导入: 在 --size 首诗的矩阵后逐首追加 --inserts 首新诗，比较总耗时与每首均摊耗时；
+另测墓碑删除与压缩的耗时。
+
+用法:
+    python scripts/benchmark_vector_store.py --size 100000 --inserts 2000
+"""
+
+import sys
+import os
+import time
+import argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from ann_index import normalize_rows
+from poem_vectors import PoemVectorStore
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--inserts", type=int, default=2000)
+    parser.add_argument("--deletes", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    matrix = normalize_rows(rng.standard_normal((args.size, args.dim), dtype=np.float32))
+    new = normalize_rows(rng.standard_normal((args.inserts, args.dim), dtype=np.float32))
+    print(f"[Bench] {args.size} poems x {args.dim} dims, {args.inserts} inserts")
+
+    start = time.perf_counter()
+    stacked = matrix
+    for vec in new:
+        stacked = np.vstack([stacked, vec])
+    vstack_seconds = time.perf_counter() - start
+    del stacked
+
+    store = PoemVectorStore(matrix, list(range(args.size)))
+    start = time.perf_counter()
+    for i, vec in enumerate(new):
+        store.append([args.size + i], vec)
+    store_seconds = time.perf_counter() - start
+
+    deleted = rng.choice(store.size, min(args.deletes, store.size), replace=False).tolist()
+    start = time.perf_counter()
+    store.remove(deleted)
+    remove_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    compacted = store.compacted(np.nonzero(store.alive)[0])
+    compact_seconds = time.perf_counter() - start
+
+    print("\n" + "=" * 60)
+    print(f"{'vstack':<22}{vstack_seconds:>10.3f}s{vstack_seconds / args.inserts * 1000:>12.3f} ms/poem")
+    print(f"{'PoemVectorStore':<22}{store_seconds:>10.3f}s{store_seconds / args.inserts * 1000:>12.3f} ms/poem"
+          f"{vstack_seconds / store_seconds:>8.1f}x")
+    print(f"{'remove ' + str(len(deleted)):<22}{remove_seconds:>10.3f}s")
+    print(f"{'compact -> ' + str(compacted.size):<22}{compact_seconds:>10.3f}s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导出 ONNX / int8 句向量模型，并与 torch fp32 对比精度与吞吐
+
+1. 导出 fp32 ONNX 与动态量化 int8 ONNX 到 saved_models/onnx_embedding
+2. 精度: 在诗歌语料上计算 ONNX 向量与 fp32 向量的余弦一致度
+3. 吞吐: 各后端的 docs/s (句/秒)
+
+用法:
+    python scripts/export_onnx_embedding.py --limit 1000
+    python scripts/export_onnx_embedding.py --skip-export   # 仅重新评估
+"""
+
+import sys
+import os
+import csv
+import time
+import argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from bertopic_analysis import EMBEDDING_MODEL_NAME, load_embedding_model
+from onnx_embedding import export_onnx_model, OnnxEmbeddingBackend, is_exported
+
+DATASET_CSV = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'dataset.csv'))
+
+
+def load_corpus(limit):
+    """优先使用数据库中的诗歌，数据库不可用时退回 data/dataset.csv 的评论"""
+    try:
+        from app import app
+        from models import db, Poem
+        with app.app_context():
+            rows = db.session.query(Poem.content).filter(Poem.content != None).limit(limit).all()
+        docs = [c for (c,) in rows if c]
+        if docs:
+            print(f"[Corpus] {len(docs)} poems from database")
+            return docs
+    except Exception as e:
+        print(f"[Corpus] Database unavailable ({e}), using dataset.csv")
+
+    docs = []
+    with open(DATASET_CSV, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row.get('comment'):
+                docs.append(row['comment'])
+    print(f"[Corpus] {len(docs[:limit])} comments from dataset.csv")
+    return docs[:limit]
+
+
+def timed_encode(encoder, docs, batch_size):
+    encoder.encode(docs[:batch_size], batch_size=batch_size)  # 预热
+    start = time.perf_counter()
+    vectors = np.asarray(encoder.encode(docs, batch_size=batch_size), dtype=np.float32)
+    elapsed = time.perf_counter() - start
+    return vectors, len(docs) / elapsed if elapsed > 0 else 0.0
+
+
+def cosine_rows(a, b):
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--skip-export", action="store_true")
+    args = parser.parse_args()
+
+    if not args.skip_export or not is_exported(quantized=True):
+        export_onnx_model(EMBEDDING_MODEL_NAME, quantize=True)
+
+    docs = load_corpus(args.limit)
+    if not docs:
+        print("[Error] 没有可用语料")
+        return
+
+    print("\n[Bench] torch fp32 ...")
+    reference, torch_rate = timed_encode(load_embedding_model(backend="torch"), docs, args.batch_size)
+
+    results = [("torch-fp32", torch_rate, None)]
+    for name, quantized in (("onnx-fp32", False), ("onnx-int8", True)):
+        print(f"[Bench] {name} ...")
+        vectors, rate = timed_encode(OnnxEmbeddingBackend(quantized=quantized), docs, args.batch_size)
+        results.append((name, rate, cosine_rows(reference, vectors)))
+
+    print("\n" + "=" * 72)
+    print(f"{'backend':<12}{'docs/s':>10}{'speedup':>10}{'cos mean':>11}{'cos p01':>10}{'cos min':>10}")
+    print("-" * 72)
+    for name, rate, cos in results:
+        speedup = rate / torch_rate if torch_rate else 0.0
+        if cos is None:
+            print(f"{name:<12}{rate:>10.1f}{speedup:>9.2f}x{'-':>11}{'-':>10}{'-':>10}")
+        else:
+            print(f"{name:<12}{rate:>10.1f}{speedup:>9.2f}x{cos.mean():>11.4f}"
+                  f"{np.percentile(cos, 1):>10.4f}{cos.min():>10.4f}")
+    print("=" * 72)
+    print(f"语料: {len(docs)} 条, batch_size={args.batch_size}")
+
+
+if __name__ == '__main__':
+    main()
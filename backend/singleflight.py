@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相同计算的请求合并 (single-flight)
+
+页面加载时前端同时请求 /api/user/<username>/recommendations、/api/recommend_personal/<username>
+(常常还有 /api/recommend_one/<username>)，每个请求都用相同的参数完整执行一次在线推荐。
+这里按键合并并发的相同计算: 第一个调用方 (leader) 执行，之后到达的相同键的调用方等待并
+共享同一个结果 (或同一个异常)；计算结束后键即释放，不缓存结果。
+
+- 共享的结果应当是不可变的简单值 (例如诗歌ID列表)，ORM 对象由各调用方在自己的会话中加载
+- 等待超过 WAIT_TIMEOUT 时调用方不再等待，自行执行一次
+- forget(match) 使匹配的进行中计算不再接收新的调用方 (例如用户刚新增了评论)
+- 统计调用数、实际执行数与被合并的调用数
+"""
+
+import threading
+
+
+class SingleFlightConfig:
+    """请求合并配置"""
+
+    # 跟随者等待 leader 的最长时间（秒），超时后自行执行
+    WAIT_TIMEOUT = 30.0
+
+
+class _Call:
+    """一次进行中的计算"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """键 -> 进行中的计算"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+        self.shared = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.peak_waiters = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """执行 fn(*args, **kwargs)，同一键的并发调用共享一次执行；返回 (结果, 是否共享)"""
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                call.waiters += 1
+                self.peak_waiters = max(self.peak_waiters, call.waiters)
+                leader = False
+
+        if not leader:
+            if call.done.wait(SingleFlightConfig.WAIT_TIMEOUT):
+                with self._lock:
+                    self.shared += 1
+                if call.error is not None:
+                    raise call.error
+                return call.result, True
+            with self._lock:
+                self.timeouts += 1
+            return self._execute(fn, args, kwargs), False
+
+        try:
+            call.result = self._execute(fn, args, kwargs)
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def _execute(self, fn, args, kwargs):
+        with self._lock:
+            self.executions += 1
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+
+    def forget(self, match):
+        """之后到达的调用方不再加入键满足 match(key) 的进行中计算 (已在等待的仍共享其结果)"""
+        with self._lock:
+            for key in [key for key in self._calls if match(key)]:
+                del self._calls[key]
+
+    def get_stats(self):
+        with self._lock:
+            calls, executions, shared = self.calls, self.executions, self.shared
+            in_flight = len(self._calls)
+        return {
+            'calls': calls,
+            'executions': executions,
+            'shared': shared,
+            'saved_ratio': round(shared / calls, 3) if calls else None,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'in_flight': in_flight,
+            'peak_waiters': self.peak_waiters
+        }
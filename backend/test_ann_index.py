@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from ann_index import ExactIndex, IVFIndex, _top_k, load_or_build_ann_index, normalize_rows
+
+
+def _clustered(n=3000, dim=32, clusters=30, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(clusters, size=n)
+    return normalize_rows(centers[labels] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def _queries(matrix, count=50, seed=1):
+    rng = np.random.default_rng(seed)
+    noise = 0.1 * rng.normal(size=(count, matrix.shape[1]))
+    return normalize_rows(matrix[rng.choice(len(matrix), count, replace=False)] + noise)
+
+
+def _brute_force(matrix, query, k, exclude=()):
+    scores = matrix @ query
+    scores[list(exclude)] = -np.inf
+    return np.argsort(-scores, kind='stable')[:k]
+
+
+def _assert_sorted(scores):
+    assert np.all(np.diff(scores) <= 1e-6)
+
+
+def test_normalize_rows_keeps_unit_matrix():
+    matrix = _clustered(100)
+    assert normalize_rows(matrix) is matrix
+    raw = np.array([[3.0, 4.0], [0.0, 0.0]], dtype=np.float32)
+    assert np.allclose(normalize_rows(raw), [[0.6, 0.8], [0.0, 0.0]])
+
+
+def test_exact_matches_brute_force():
+    matrix = _clustered()
+    index = ExactIndex().build(matrix)
+    for query in _queries(matrix):
+        rows, scores = index.search(query, 10)
+        _assert_sorted(scores)
+        assert set(rows) == set(_brute_force(matrix, query, 10))
+        assert np.allclose(scores, matrix[rows] @ query, atol=1e-5)
+
+
+def test_exact_respects_exclude_and_small_corpus():
+    matrix = _clustered(20)
+    index = ExactIndex().build(matrix)
+    exclude = [0, 3, 7]
+    rows, scores = index.search(matrix[0], 50, exclude=exclude)
+    assert len(rows) == 17
+    assert not set(rows) & set(exclude)
+    _assert_sorted(scores)
+
+
+def test_ivf_recall_and_order():
+    matrix = _clustered()
+    index = IVFIndex().build(matrix)
+    hits = 0
+    for query in _queries(matrix):
+        rows, scores = index.search(query, 10)
+        _assert_sorted(scores)
+        assert np.allclose(scores, matrix[rows] @ query, atol=1e-5)
+        hits += len(set(rows) & set(_brute_force(matrix, query, 10)))
+    assert hits / (10 * 50) >= 0.9
+
+
+def test_ivf_all_lists_is_exact():
+    matrix = _clustered(500)
+    index = IVFIndex(n_lists=8).build(matrix)
+    for query in _queries(matrix, 10):
+        rows, _ = index.search(query, 10, n_probe=8)
+        assert set(rows) == set(_brute_force(matrix, query, 10))
+
+
+def test_ivf_respects_exclude():
+    matrix = _clustered()
+    index = IVFIndex().build(matrix)
+    for query in _queries(matrix, 10):
+        exclude = list(_brute_force(matrix, query, 5))
+        rows, scores = index.search(query, 10, exclude=exclude)
+        assert len(rows) == 10
+        assert not set(rows) & set(exclude)
+        _assert_sorted(scores)
+
+
+@pytest.mark.parametrize('use_backing', [False, True])
+def test_ivf_add_finds_new_rows(use_backing):
+    matrix = _clustered(2000)
+    index = IVFIndex().build(matrix[:1500])
+    index.add(matrix[1500:], backing=matrix if use_backing else None)
+    assert index.size == 2000
+    for row in (1500, 1750, 1999):
+        rows, scores = index.search(matrix[row], 1)
+        assert rows[0] == row
+        assert scores[0] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_ivf_compact_renumbers_rows():
+    matrix = _clustered(1000)
+    index = IVFIndex().build(matrix)
+    keep = np.arange(0, 1000, 2)
+    compacted = index.compact(keep, matrix[keep])
+    assert compacted.size == len(keep)
+    for new_row, old_row in [(0, 0), (10, 20), (499, 998)]:
+        rows, _ = compacted.search(matrix[old_row], 1)
+        assert rows[0] == new_row
+
+
+def test_ivf_persisted_index_is_extended(tmp_path):
+    matrix = _clustered(1200)
+    ids = list(range(1, 1201))
+    index = load_or_build_ann_index(str(tmp_path), ids[:1000], matrix[:1000], 'm', backend='ivf')
+    centroids = index.centroids
+    reloaded = load_or_build_ann_index(str(tmp_path), ids, matrix, 'm', backend='ivf')
+    assert np.array_equal(reloaded.centroids, centroids)
+    assert reloaded.size == 1200
+    rows, _ = reloaded.search(matrix[1100], 1)
+    assert rows[0] == 1100
+    # 嵌入模型不同时不复用
+    rebuilt = load_or_build_ann_index(str(tmp_path), ids, matrix, 'other', backend='ivf')
+    assert rebuilt.size == 1200
+
+
+def test_normalize_rows_float32_and_zero_rows():
+    raw = np.array([[1.0, 1.0], [0.0, 0.0], [0.0, -5.0]], dtype=np.float64)
+    out = normalize_rows(raw)
+    assert out.dtype == np.float32
+    assert np.allclose(np.linalg.norm(out, axis=1), [1.0, 0.0, 1.0])
+    assert np.allclose(normalize_rows(np.array([0.0, 2.0])), [0.0, 1.0])
+
+
+def test_exact_index_shares_matrix_memory():
+    matrix = _clustered(200)
+    index = ExactIndex().build(matrix)
+    assert index.vectors is matrix
+
+
+def test_exact_results_survive_buffer_reuse():
+    matrix = _clustered(500)
+    index = ExactIndex().build(matrix)
+    queries = _queries(matrix, 2)
+    rows, scores = index.search(queries[0], 10)
+    expected = scores.copy()
+    # 第二次查询复用同一个得分缓冲区，不影响之前返回的结果
+    index.search(queries[1], 10, exclude=list(rows))
+    assert np.array_equal(scores, expected)
+    assert np.allclose(scores, matrix[rows] @ queries[0], atol=1e-5)
+
+
+def test_top_k_sorted_with_exclude():
+    rows = np.arange(10, dtype=np.int64)
+    scores = np.array([0.1, 0.9, 0.3, 0.8, 0.5, 0.2, 0.7, 0.4, 0.6, 0.0], dtype=np.float32)
+    top_rows, top_scores = _top_k(rows, scores, 3, exclude={1, 6})
+    assert list(top_rows) == [3, 8, 4]
+    assert np.allclose(top_scores, [0.8, 0.6, 0.5])
+    assert len(_top_k(rows, scores, 0)[0]) == 0
+    assert list(_top_k(rows, scores, 50)[0]) == list(np.argsort(-scores, kind='stable'))
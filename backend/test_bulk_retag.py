@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+from flask import Flask
+
+import bulk_retag
+from bulk_retag import RetagConfig, bulk_retag_poems, checkpoint_path, load_checkpoint, save_checkpoint
+from models import db, Poem
+
+
+def fake_real_topic(content, author=None):
+    return f"topic-{len(content)}"
+
+
+@pytest.fixture(autouse=True)
+def checkpoint_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(RetagConfig, 'CHECKPOINT_DIR', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(bulk_retag.bertopic_analysis, 'get_individual_keywords', lambda content: content[:2])
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        for i in range(1, 8):
+            db.session.add(Poem(id=i, title=f't{i}', content='床前明月光' * i))
+        db.session.commit()
+        yield app
+        db.session.remove()
+
+
+def test_checkpoints_keyed_by_task():
+    save_checkpoint('train', 0, 10, 10, real_topic='a')
+    save_checkpoint('incremental', 500, 600, 3, real_topic='a')
+    assert checkpoint_path('train') != checkpoint_path('incremental', 500)
+    assert load_checkpoint('train', real_topic='a') == (10, 10)
+    assert load_checkpoint('incremental', 500, real_topic='a') == (600, 3)
+    assert load_checkpoint('incremental', 0, real_topic='a') == (0, 0)
+    # Real_topic 规则不同的断点不续跑
+    assert load_checkpoint('train', real_topic='b') == (0, 0)
+
+
+def test_run_keeps_other_jobs_checkpoints(app):
+    save_checkpoint('quick', 0, 3, 3, real_topic='x')
+    assert bulk_retag_poems(job='train', real_topic_fn=fake_real_topic, chunk_size=2, workers=1) == 7
+    assert not os.path.exists(checkpoint_path('train'))
+    assert os.path.exists(checkpoint_path('quick'))
+    poem = db.session.get(Poem, 3)
+    assert poem.Bertopic == '床前' and poem.Real_topic == 'topic-15'
+
+
+def test_resume_continues_from_checkpoint(app):
+    real_topic = f"{fake_real_topic.__module__}.{fake_real_topic.__qualname__}"
+    save_checkpoint('train', 0, 4, 4, real_topic=real_topic)
+    assert bulk_retag_poems(job='train', real_topic_fn=fake_real_topic, chunk_size=2, workers=1, resume=True) == 3
+    assert db.session.get(Poem, 2).Real_topic is None
+    assert db.session.get(Poem, 5).Real_topic == 'topic-25'
+
+
+def test_fresh_run_ignores_checkpoint(app):
+    real_topic = f"{fake_real_topic.__module__}.{fake_real_topic.__qualname__}"
+    save_checkpoint('train', 0, 4, 4, real_topic=real_topic)
+    assert bulk_retag_poems(job='train', real_topic_fn=fake_real_topic, chunk_size=3, workers=1) == 7
+
+
+def test_incremental_only_retags_new_poems(app):
+    assert bulk_retag_poems(job='incremental', real_topic_fn=fake_real_topic, workers=1, start_after=5) == 2
+    assert db.session.get(Poem, 5).Real_topic is None
+    assert db.session.get(Poem, 6).Real_topic == 'topic-30'
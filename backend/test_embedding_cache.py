@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+
+from embedding_cache import EmbeddingStore
+
+
+def _fresh(store):
+    """同一目录上新开的存储 (没有前置缓存，只能从磁盘读取)"""
+    return EmbeddingStore(store.model_name, cache_root=os.path.dirname(store.cache_dir))
+
+
+def test_roundtrip(tmp_path):
+    store = EmbeddingStore('m', cache_root=str(tmp_path))
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+    store.append(['a', 'b', 'c'], vectors)
+    found = _fresh(store).lookup(['c', 'x', 'a'])
+    assert np.array_equal(found[0], vectors[2])
+    assert found[1] is None
+    assert np.array_equal(found[2], vectors[0])
+
+
+def test_append_after_partial_row(tmp_path):
+    store = EmbeddingStore('m', cache_root=str(tmp_path))
+    first = np.ones((2, 4), dtype=np.float32)
+    store.append(['a', 'b'], first)
+    # 模拟上一次追加写到一半中断: 文件末尾多出半行
+    with open(store.vectors_path, 'ab') as f:
+        f.write(b'\x00' * 6)
+    second = np.full((2, 4), 7.0, dtype=np.float32)
+    store.append(['c', 'd'], second)
+
+    reader = _fresh(store)
+    found = reader.lookup(['a', 'b', 'c', 'd'])
+    assert np.array_equal(np.stack(found), np.vstack([first, second]))
+    assert np.fromfile(store.vectors_path, dtype=np.float32).size == 16
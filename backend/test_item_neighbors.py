@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from ann_index import IVFIndex, normalize_rows
+from item_neighbors import ItemNeighborTable
+
+K = 10
+# 相似度以 float16 保存
+TOL = 2e-3
+
+
+def _matrix(n=400, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return normalize_rows(rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def _assert_row_matches(table, reference, row):
+    """同一行的近邻集合与相似度一致 (行内顺序不限；相似度几乎相等的末位可互换)"""
+    scores = np.sort(table.scores[row].astype(np.float32))[::-1]
+    expected = np.sort(reference.scores[row].astype(np.float32))[::-1]
+    assert np.allclose(scores, expected, atol=TOL), row
+    got = dict(zip(table.neighbors[row], table.scores[row].astype(np.float32)))
+    want = dict(zip(reference.neighbors[row], reference.scores[row].astype(np.float32)))
+    cutoff = expected[-1] + TOL
+    assert {r for r, s in want.items() if s > cutoff} <= set(got), row
+    for r, s in got.items():
+        assert r >= 0 and abs(s - want.get(r, s)) <= TOL
+
+
+def _assert_tables_match(table, reference):
+    assert table.size == reference.size
+    for row in range(reference.size):
+        _assert_row_matches(table, reference, row)
+
+
+def test_build_is_exact_top_k():
+    matrix = _matrix()
+    table = ItemNeighborTable(K).build(matrix)
+    sims = matrix @ matrix.T
+    np.fill_diagonal(sims, -np.inf)
+    for row in range(len(matrix)):
+        expected = np.argsort(-sims[row])[:K]
+        assert set(table.neighbors[row]) == set(expected)
+        assert np.all(np.diff(table.scores[row].astype(np.float32)) <= 0)
+
+
+def test_build_with_index_matches_exact():
+    matrix = _matrix()
+    index = IVFIndex(n_lists=4).build(matrix)
+    index.n_probe = 4
+    _assert_tables_match(ItemNeighborTable(K).build(matrix, index), ItemNeighborTable(K).build(matrix))
+
+
+def test_add_matches_rebuild():
+    matrix = _matrix()
+    table = ItemNeighborTable(K).build(matrix[:300])
+    table.add(matrix[:350])
+    table.add(matrix)
+    _assert_tables_match(table, ItemNeighborTable(K).build(matrix))
+
+
+def test_add_after_load_matches_rebuild(tmp_path):
+    matrix = _matrix()
+    ItemNeighborTable(K).build(matrix[:300]).save(str(tmp_path), list(range(300)), 'm')
+    table, meta = ItemNeighborTable.load(str(tmp_path))
+    assert meta['size'] == 300 and meta['embedding_model'] == 'm'
+    mapped = np.array(table.neighbors)
+    table.add(matrix)
+    _assert_tables_match(table, ItemNeighborTable(K).build(matrix))
+    # 映射的文件不被改写
+    reloaded, _ = ItemNeighborTable.load(str(tmp_path))
+    assert np.array_equal(reloaded.neighbors, mapped)
+
+
+def test_small_corpus_is_padded():
+    table = ItemNeighborTable(K).build(_matrix(4))
+    assert np.all(table.neighbors[:, 3:] == -1)
+    assert np.all(np.isneginf(table.scores[:, 3:].astype(np.float32)))
+
+
+def test_compact_keeps_surviving_neighbors():
+    matrix = _matrix()
+    table = ItemNeighborTable(K).build(matrix)
+    keep = np.array([i for i in range(len(matrix)) if i % 3])
+    compacted = table.compact(keep)
+    reference = ItemNeighborTable(K).build(matrix[keep])
+    old_to_new = {int(old): new for new, old in enumerate(keep)}
+    assert compacted.size == len(keep)
+    for new, old in enumerate(keep):
+        surviving = [old_to_new[r] for r in table.neighbors[old] if r in old_to_new]
+        neighbors = compacted.neighbors[new]
+        assert sorted(neighbors[neighbors >= 0]) == sorted(surviving)
+        assert np.all(np.isneginf(compacted.scores[new][neighbors < 0].astype(np.float32)))
+        # 留下的近邻在删除后仍属于从头构建的 Top-K
+        want = dict(zip(reference.neighbors[new], reference.scores[new].astype(np.float32)))
+        for r, s in zip(neighbors, compacted.scores[new].astype(np.float32)):
+            if r >= 0:
+                assert r in want and abs(want[r] - s) <= TOL
+
+
+def test_compact_then_add():
+    matrix = _matrix()
+    keep = np.arange(0, 300)
+    table = ItemNeighborTable(K).build(matrix).compact(keep)
+    # 行 300 之后被删除；重新追加后缺失的近邻由新行补上
+    rest = np.vstack([matrix[keep], matrix[300:]])
+    table.add(rest)
+    reference = ItemNeighborTable(K).build(rest)
+    for row in range(300, len(rest)):
+        _assert_row_matches(table, reference, row)
+
+
+def test_aggregate_weighted_average():
+    matrix = _matrix()
+    table = ItemNeighborTable(K).build(matrix)
+    rows, weights = [0, 5], [2.0, 1.0]
+    candidates, scores = table.aggregate(rows, weights, 5, exclude=rows)
+    assert not set(candidates) & set(rows)
+    assert np.all(np.diff(scores) <= 0)
+    for c, s in zip(candidates, scores):
+        total = sum(w * float(table.scores[r][list(table.neighbors[r]).index(c)])
+                    for r, w in zip(rows, weights) if c in table.neighbors[r])
+        assert abs(s - total / 3.0) <= TOL
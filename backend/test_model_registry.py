@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+from flask import Flask
+
+import bertopic_analysis
+from model_registry import ModelSnapshot, add_model_routes, model_registry
+
+
+@pytest.fixture
+def versions(tmp_path, monkeypatch):
+    monkeypatch.setattr(bertopic_analysis, 'MODEL_DIR', str(tmp_path))
+    for version in ('v1', 'v2'):
+        (tmp_path / 'versions' / version).mkdir(parents=True)
+    bertopic_analysis.set_current_model_version('v1')
+    return tmp_path
+
+
+@pytest.fixture
+def registry(versions, monkeypatch):
+    """不加载真实模型的注册表: 快照只记录版本号"""
+    monkeypatch.setattr(model_registry, '_snapshot', ModelSnapshot(object(), 'v1'))
+    monkeypatch.setattr(model_registry, '_swap_hooks', [])
+    monkeypatch.setattr(model_registry, '_reload_state', None)
+    monkeypatch.setattr(model_registry, '_build_snapshot', lambda version: ModelSnapshot(object(), version))
+    monkeypatch.setattr(model_registry, '_retire', lambda snapshot: None)
+    return model_registry
+
+
+def test_list_model_versions(versions):
+    (versions / 'versions' / 'stray.txt').write_text('x')
+    assert bertopic_analysis.list_model_versions() == ['v1', 'v2']
+
+
+@pytest.mark.parametrize('version', ['../v1', 'v1/../v2', '..', '/tmp', 'missing', 3, ['v2']])
+def test_reload_route_rejects_unknown_version(registry, monkeypatch, version):
+    started = []
+    monkeypatch.setattr(registry, 'reload_async', lambda *args, **kwargs: started.append(args) or True)
+    app = Flask(__name__)
+    add_model_routes(app)
+    response = app.test_client().post('/api/admin/model/reload', json={'version': version})
+    assert response.status_code == 400
+    assert not started
+
+
+def test_reload_route_pins_requested_version(registry, monkeypatch):
+    started = []
+    monkeypatch.setattr(registry, 'reload_async', lambda *args, **kwargs: started.append((args, kwargs)) or True)
+    app = Flask(__name__)
+    add_model_routes(app)
+    client = app.test_client()
+    assert client.post('/api/admin/model/reload', json={'version': 'v2'}).status_code == 202
+    assert client.post('/api/admin/model/reload').status_code == 202
+    assert started == [(('v2',), {'pin': True}), ((None,), {'pin': False})]
+
+
+def test_pinned_reload_moves_pointer(registry):
+    assert registry.reload('v2', pin=True).version == 'v2'
+    # 监视线程读到的指针与当前快照一致，不会切换回去
+    assert bertopic_analysis.get_current_model_version() == 'v2'
+
+
+def test_watcher_reload_leaves_pointer(registry):
+    assert registry.reload('v2').version == 'v2'
+    assert bertopic_analysis.get_current_model_version() == 'v1'
+
+
+def test_pinned_reload_of_loaded_version_moves_pointer(registry):
+    bertopic_analysis.set_current_model_version('v2')
+    assert registry.reload('v1', pin=True).version == 'v1'
+    assert bertopic_analysis.get_current_model_version() == 'v1'
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from next_poem_queue import NextPoemQueueConfig, NextPoemQueues
+
+SIZE = NextPoemQueueConfig.QUEUE_SIZE
+
+
+def _filled(user_id, poem_ids, version='v1'):
+    queues = NextPoemQueues()
+    queues.check_version(version)
+    generation, _ = queues.claim_refill(user_id)
+    queues.fill(user_id, poem_ids, generation)
+    return queues
+
+
+def _drain(queues, user_id):
+    out = []
+    while True:
+        pid = queues.pop(user_id)
+        if pid is None:
+            return out
+        out.append(pid)
+
+
+def test_pop_in_rank_order_up_to_queue_size():
+    queues = _filled(1, list(range(100)))
+    assert _drain(queues, 1) == list(range(SIZE))
+    assert queues.get_stats()['hits'] == SIZE
+
+
+def test_fill_has_no_duplicates():
+    queues = _filled(1, [5, 5, 6, 7, 6, 8])
+    generation, _ = queues.claim_refill(1, force=True)
+    # 已在队列中的诗歌不重复入队
+    assert queues.fill(1, [8, 9, 9, 5, 10], generation) == 2
+    assert _drain(queues, 1) == [5, 6, 7, 8, 9, 10]
+
+
+def test_shown_poems_are_not_requeued():
+    queues = _filled(1, list(range(SIZE)))
+    shown = [queues.pop(1) for _ in range(SIZE - 2)]
+    generation, fetch = queues.claim_refill(1)
+    # 多请求队列中与展示历史中的数量
+    assert fetch == SIZE + 2 + len(shown)
+    queues.fill(1, list(range(SIZE + 10)), generation)
+    pending = _drain(queues, 1)
+    assert not set(pending) & set(shown)
+    assert len(pending) == len(set(pending)) == 12
+
+
+def test_claim_refill_respects_low_water_and_in_flight():
+    queues = NextPoemQueues()
+    assert queues.claim_refill(1) is not None
+    # 已有进行中的补充
+    assert queues.claim_refill(1) is None
+    assert queues.claim_refill(1, force=True) is not None
+    queues = _filled(1, list(range(SIZE)))
+    assert queues.claim_refill(1) is None
+    for _ in range(SIZE - NextPoemQueueConfig.LOW_WATER + 1):
+        queues.pop(1)
+    assert queues.claim_refill(1) is not None
+
+
+def test_discard_drops_in_flight_refill():
+    queues = _filled(1, list(range(SIZE)))
+    for _ in range(SIZE - 1):
+        queues.pop(1)
+    generation, _ = queues.claim_refill(1)
+    queues.discard(1, SIZE - 1)
+    # 补充基于旧评论计算，代数已变，结果被丢弃
+    assert queues.fill(1, list(range(100, 120)), generation) == 0
+    assert queues.get_stats()['dropped_refills'] == 1
+    assert queues.pop(1) is None
+    # 作废后可以立即重新占用补充
+    generation, _ = queues.claim_refill(1)
+    assert queues.fill(1, [200, 201], generation) == 2
+    assert _drain(queues, 1) == [200, 201]
+
+
+def test_discard_removes_reviewed_poem():
+    queues = _filled(1, [1, 2, 3])
+    queues.discard(1, 2)
+    queues.discard(2, 1)
+    assert _drain(queues, 1) == [1, 3]
+
+
+def test_history_resets_when_everything_shown():
+    queues = _filled(1, [1, 2, 3])
+    assert _drain(queues, 1) == [1, 2, 3]
+    generation, _ = queues.claim_refill(1)
+    assert queues.fill(1, [1, 2, 3], generation) == 3
+    assert _drain(queues, 1) == [1, 2, 3]
+    # 仍有没展示过的诗歌时不重置
+    generation, _ = queues.claim_refill(1)
+    assert queues.fill(1, [1, 2, 3, 4], generation) == 1
+    assert _drain(queues, 1) == [4]
+
+
+def test_history_reset_skips_duplicates():
+    queues = _filled(1, [1, 2])
+    _drain(queues, 1)
+    generation, _ = queues.claim_refill(1)
+    assert queues.fill(1, [2, 1, 2, 1], generation) == 2
+    assert _drain(queues, 1) == [2, 1]
+
+
+def test_version_change_clears_queues():
+    queues = _filled(1, [1, 2, 3])
+    queues.check_version('v1')
+    assert queues.pop(1) == 1
+    queues.check_version('v2')
+    assert queues.pop(1) is None
+    assert queues.get_stats()['version'] == 'v2'
+
+
+def test_least_recently_used_users_evicted(monkeypatch):
+    monkeypatch.setattr(NextPoemQueueConfig, 'MAX_USERS', 2)
+    queues = NextPoemQueues()
+    for user_id in (1, 2):
+        generation, _ = queues.claim_refill(user_id)
+        queues.fill(user_id, [user_id], generation)
+    queues.pop(1)
+    queues.claim_refill(3)
+    assert queues.get_stats()['users'] == 2
+    assert queues.pop(2) is None
+
+
+def test_fetch_capped_at_precomputed_list_size():
+    queues = NextPoemQueues()
+    ranked = list(range(NextPoemQueueConfig.MAX_FETCH))
+    seen = []
+    for _ in range(3 * len(ranked)):
+        pid = queues.pop(1)
+        if pid is None:
+            claim = queues.claim_refill(1, force=True)
+            assert claim[1] <= NextPoemQueueConfig.MAX_FETCH
+            queues.fill(1, ranked[:claim[1]], claim[0])
+            pid = queues.pop(1)
+        claim = queues.claim_refill(1)
+        if claim is not None:
+            assert claim[1] <= NextPoemQueueConfig.MAX_FETCH
+            queues.fill(1, ranked[:claim[1]], claim[0])
+        seen.append(pid)
+    # 排名列表每一轮都完整展示一遍，轮内不重复
+    for start in range(0, len(seen), len(ranked)):
+        assert sorted(seen[start:start + len(ranked)]) == ranked
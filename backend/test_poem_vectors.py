@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from ann_index import normalize_rows
+import poem_vectors
+from poem_vectors import (PoemVectorConfig, PoemVectorStore, cached_matrix_path, ids_digest, load_cached_rows,
+                          open_matrix_cache, save_matrix_cache)
+
+
+def _vectors(n, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return normalize_rows(rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def test_append_grows_without_losing_rows():
+    vectors = _vectors(PoemVectorConfig.INITIAL_CAPACITY + 10)
+    store = PoemVectorStore(vectors[:5], [1, 2, 3, 4, 5], authors=[0, 0, 1, 1, 2])
+    view = store.matrix
+    assert store.append([6, 7], vectors[5:7], authors=[3, 3]) == 5
+    # 容量足够时不重新分配，之前取得的视图仍指向同一缓冲区
+    assert np.shares_memory(view, store.matrix)
+    capacity = store.capacity
+    start = store.append(list(range(8, 8 + len(vectors) - 7)), vectors[7:])
+    assert start == 7
+    assert store.capacity >= len(vectors) > capacity
+    assert np.array_equal(store.matrix, vectors)
+    assert store.ids == list(range(1, len(vectors) + 1))
+    assert store.id_map[7] == 6 and store.max_id == len(vectors)
+    assert list(store.authors[:7]) == [0, 0, 1, 1, 2, 3, 3]
+    assert np.all(store.authors[7:] == -1)
+    assert store.alive.all()
+
+
+def test_remove_tombstones_rows():
+    vectors = _vectors(6)
+    store = PoemVectorStore(vectors, [10, 20, 30, 40, 50, 60])
+    rows = store.remove([20, 50, 99])
+    assert list(rows) == [1, 4]
+    assert not np.any(store.matrix[[1, 4]])
+    assert list(store.alive) == [True, False, True, True, False, True]
+    assert 20 not in store.id_map and store.id_map[60] == 5
+    assert store.dead == 2 and store.size == 6
+    # 再次删除同一首诗不重复计数
+    assert len(store.remove([20])) == 0
+    assert store.dead == 2
+
+
+def test_needs_compaction(monkeypatch):
+    monkeypatch.setattr(PoemVectorConfig, 'COMPACT_MIN_DEAD', 1)
+    store = PoemVectorStore(_vectors(20), list(range(20)))
+    store.remove([0, 1])
+    assert not store.needs_compaction()
+    store.remove([2])
+    assert store.needs_compaction()
+
+
+def test_compacted_keeps_live_rows_in_order():
+    vectors = _vectors(6)
+    store = PoemVectorStore(vectors, [10, 20, 30, 40, 50, 60], authors=[1, 2, 3, 4, 5, 6])
+    store.remove([20, 50])
+    keep = np.nonzero(store.alive)[0]
+    compacted = store.compacted(keep)
+    assert compacted.ids == [10, 30, 40, 60]
+    assert compacted.id_map == {10: 0, 30: 1, 40: 2, 60: 3}
+    assert np.array_equal(compacted.matrix, vectors[[0, 2, 3, 5]])
+    assert list(compacted.authors) == [1, 3, 4, 6]
+    assert compacted.dead == 0 and compacted.alive.all()
+    # 新存储与旧存储互不影响
+    assert compacted.append([70], vectors[1]) == 4
+    assert store.size == 6
+
+
+@pytest.mark.parametrize('capacity', [None, 4096])
+def test_initial_capacity(capacity):
+    store = PoemVectorStore(_vectors(3), [1, 2, 3], capacity=capacity)
+    assert store.capacity == (capacity or PoemVectorConfig.INITIAL_CAPACITY)
+    assert not store.is_mapped
+
+
+def test_mapped_store_copies_on_first_write(tmp_path):
+    vectors = _vectors(5)
+    ids = [1, 2, 3, 4, 5]
+    mapped = save_matrix_cache(str(tmp_path), ids, vectors, 'm')
+    store = PoemVectorStore(mapped, ids)
+    assert store.is_mapped and store.capacity == 5
+    store.remove([2])
+    assert not store.is_mapped
+    assert not np.any(store.matrix[1])
+    store.append([6], _vectors(1, seed=1))
+    assert store.size == 6
+    # 映射的缓存文件保持不变
+    assert np.array_equal(open_matrix_cache(str(tmp_path), ids, 'm'), vectors)
+
+
+def test_mapped_store_append_copies(tmp_path):
+    vectors = _vectors(5)
+    ids = [1, 2, 3, 4, 5]
+    store = PoemVectorStore(save_matrix_cache(str(tmp_path), ids, vectors, 'm'), ids)
+    extra = _vectors(2, seed=1)
+    assert store.append([6, 7], extra) == 5
+    assert not store.is_mapped
+    assert np.array_equal(store.matrix, np.vstack([vectors, extra]))
+    assert np.array_equal(np.load(cached_matrix_path(str(tmp_path))), vectors)
+
+
+def test_adopt_written_cache(tmp_path):
+    vectors = _vectors(5)
+    store = PoemVectorStore(vectors[:4], [1, 2, 3, 4], authors=[1, 2, 3, 4])
+    store.append([5], vectors[4], authors=[5])
+    mapped = save_matrix_cache(str(tmp_path), store.ids, store.matrix, 'm')
+    assert store.adopt(mapped)
+    assert store.is_mapped
+    assert np.array_equal(store.matrix, vectors)
+    assert list(store.authors) == [1, 2, 3, 4, 5]
+    # 写回之后又有追加时行数不同，不能改用旧映射
+    store.append([6], _vectors(1, seed=1))
+    assert not store.adopt(mapped)
+    assert store.size == 6
+
+
+def test_open_matrix_cache_validates_digest(tmp_path):
+    cache_dir = str(tmp_path)
+    vectors = _vectors(4)
+    ids = [3, 1, 4, 2]
+    save_matrix_cache(cache_dir, ids, vectors, 'm')
+    cached = open_matrix_cache(cache_dir, ids, 'm')
+    assert isinstance(cached, np.memmap)
+    assert np.array_equal(cached, vectors)
+    # 顺序不同、ID不同、行数不同或向量模型不同都不复用
+    assert open_matrix_cache(cache_dir, [1, 3, 4, 2], 'm') is None
+    assert open_matrix_cache(cache_dir, [3, 1, 4, 5], 'm') is None
+    assert open_matrix_cache(cache_dir, ids[:3], 'm') is None
+    assert open_matrix_cache(cache_dir, ids, 'other') is None
+    assert open_matrix_cache(str(tmp_path / 'missing'), ids, 'm') is None
+
+
+def test_open_matrix_cache_rejects_tampered_meta(tmp_path):
+    cache_dir = str(tmp_path)
+    ids = [1, 2, 3]
+    save_matrix_cache(cache_dir, ids, _vectors(3), 'm')
+    meta_path = os.path.join(cache_dir, 'matrix_meta.json')
+    with open(meta_path) as f:
+        meta = json.load(f)
+    assert meta['digest'] == ids_digest(ids, 'm')
+    meta['digest'] = ids_digest([1, 2, 4], 'm')
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    assert open_matrix_cache(cache_dir, ids, 'm') is None
+    meta['digest'] = ids_digest(ids, 'm')
+    meta['format'] = 1
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    assert open_matrix_cache(cache_dir, ids, 'm') is None
+
+
+def test_load_cached_rows_reuses_by_id(tmp_path):
+    cache_dir = str(tmp_path)
+    vectors = _vectors(4)
+    save_matrix_cache(cache_dir, [10, 20, 30, 40], vectors, 'm')
+    # 删除 20、新增 50，并打乱顺序
+    matrix, missing = load_cached_rows(cache_dir, [40, 50, 10, 30], 'm')
+    assert missing == [1]
+    assert np.array_equal(matrix[[0, 2, 3]], vectors[[3, 0, 2]])
+    assert not np.any(matrix[1])
+
+
+def test_load_cached_rows_rejects_other_model(tmp_path):
+    cache_dir = str(tmp_path)
+    save_matrix_cache(cache_dir, [10, 20], _vectors(2), 'm')
+    matrix, missing = load_cached_rows(cache_dir, [10, 20, 30], 'other')
+    assert matrix is None and missing == [0, 1, 2]
+    matrix, missing = load_cached_rows(str(tmp_path / 'missing'), [10], 'm')
+    assert matrix is None and missing == [0]
+
+
+def test_load_cached_rows_normalizes_legacy_cache(tmp_path):
+    # 旧格式: 只有 topic_matrix.npy + poem_ids.json，行未归一化
+    raw = np.array([[3.0, 4.0], [0.0, 2.0]], dtype=np.float32)
+    np.save(str(tmp_path / 'topic_matrix.npy'), raw)
+    with open(str(tmp_path / 'poem_ids.json'), 'w') as f:
+        json.dump([7, 8], f)
+    matrix, missing = load_cached_rows(str(tmp_path), [8, 9, 7], 'm')
+    assert missing == [1]
+    assert np.allclose(matrix, [[0.0, 1.0], [0.0, 0.0], [0.6, 0.8]])
+
+
+def _snapshots(cache_dir):
+    return sorted(os.listdir(os.path.join(cache_dir, PoemVectorConfig.SNAPSHOT_DIR)))
+
+
+def test_interrupted_save_keeps_previous_cache(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path)
+    old = _vectors(3)
+    save_matrix_cache(cache_dir, [1, 2, 3], old, 'm')
+    real_save = np.save
+    calls = []
+
+    def failing_save(path, data):
+        calls.append(path)
+        if len(calls) == 2:
+            raise OSError('disk full')
+        real_save(path, data)
+
+    monkeypatch.setattr(poem_vectors.np, 'save', failing_save)
+    assert save_matrix_cache(cache_dir, [1, 2, 3, 4], _vectors(4, seed=1), 'm') is None
+    monkeypatch.setattr(poem_vectors.np, 'save', real_save)
+    # 元数据仍指向完整的旧快照，不需要重新计算向量
+    assert np.array_equal(open_matrix_cache(cache_dir, [1, 2, 3], 'm'), old)
+    assert open_matrix_cache(cache_dir, [1, 2, 3, 4], 'm') is None
+    assert len(_snapshots(cache_dir)) == 1
+
+
+def test_save_keeps_previous_snapshot_only(tmp_path):
+    cache_dir = str(tmp_path)
+    first = save_matrix_cache(cache_dir, [1], _vectors(1), 'm')
+    save_matrix_cache(cache_dir, [1, 2], _vectors(2), 'm')
+    # 上一个快照仍可读取 (其他进程可能正在加载)
+    assert np.array_equal(np.load(first.filename), first)
+    assert len(_snapshots(cache_dir)) == 2
+    latest = save_matrix_cache(cache_dir, [1, 2, 3], _vectors(3), 'm')
+    assert len(_snapshots(cache_dir)) == 2
+    assert not os.path.exists(first.filename)
+    assert cached_matrix_path(cache_dir) == latest.filename
+
+
+def test_legacy_layout_migrates(tmp_path):
+    cache_dir = str(tmp_path)
+    vectors = _vectors(2)
+    # 旧版本布局: 文件直接位于缓存目录，元数据没有快照目录
+    np.save(str(tmp_path / 'topic_matrix.npy'), vectors)
+    np.save(str(tmp_path / 'poem_ids.npy'), np.array([5, 6], dtype=np.int64))
+    with open(str(tmp_path / 'matrix_meta.json'), 'w') as f:
+        json.dump({'format': PoemVectorConfig.CACHE_FORMAT, 'embedding_model': 'm', 'count': 2,
+                   'digest': ids_digest([5, 6], 'm')}, f)
+    assert np.array_equal(open_matrix_cache(cache_dir, [5, 6], 'm'), vectors)
+    matrix, missing = load_cached_rows(cache_dir, [6, 7], 'm')
+    assert missing == [1] and np.array_equal(matrix[0], vectors[1])
+    save_matrix_cache(cache_dir, [6, 7], matrix, 'm')
+    assert not os.path.exists(str(tmp_path / 'topic_matrix.npy'))
+    assert np.array_equal(open_matrix_cache(cache_dir, [6, 7], 'm'), matrix)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+from poetry_corpus import iter_file_poems, iter_json_array, join_paragraphs
+
+
+ARRAYS = [
+    [1, 2.5, 3, -0.125, 1e-3, 12345678901234567890, 0],
+    ["床前明月光", "", "疑是\"地上\"霜", "举头望明月\n低头思故乡"],
+    [{"title": "静夜思", "paragraphs": ["床前明月光，", "疑是地上霜。"]}, {}, {"n": 2.5, "t": [1, [2, 3]]}],
+    [1.5, "a", {"b": [True, False, None]}, [], 2e10, None, "]"],
+    [],
+]
+
+
+def _write(tmp_path, text, name='data.json'):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 4, 5, 6, 7, 13, 64])
+@pytest.mark.parametrize('array', ARRAYS)
+def test_small_chunk_sizes(tmp_path, array, chunk_size):
+    for text in (json.dumps(array, ensure_ascii=False), json.dumps(array, ensure_ascii=False, indent=2)):
+        path = _write(tmp_path, text)
+        assert list(iter_json_array(path, chunk_size=chunk_size)) == array
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 6])
+def test_number_split_at_read_boundary(tmp_path, chunk_size):
+    path = _write(tmp_path, '[1, 2.5, 3]')
+    assert list(iter_json_array(path, chunk_size=chunk_size)) == [1, 2.5, 3]
+
+
+def test_top_level_object(tmp_path):
+    path = _write(tmp_path, '{"a": 1}')
+    assert list(iter_json_array(path, chunk_size=2)) == [{"a": 1}]
+
+
+@pytest.mark.parametrize('text', ['[1, 2', '[1, 2.5', '[{"a": 1}', '[1 2]'])
+@pytest.mark.parametrize('chunk_size', [1, 3, 64])
+def test_malformed_raises(tmp_path, text, chunk_size):
+    path = _write(tmp_path, text)
+    with pytest.raises(ValueError):
+        list(iter_json_array(path, chunk_size=chunk_size))
+
+
+def test_join_paragraphs_keeps_text_as_is():
+    paragraphs = ["床前明月光， ", "", " 疑是地上霜。"]
+    assert join_paragraphs(paragraphs, sep='\n') == '\n'.join(paragraphs)
+    assert join_paragraphs(paragraphs) == ''.join(paragraphs)
+    assert join_paragraphs(" 静夜思 ") == " 静夜思 "
+    assert join_paragraphs(None) == ''
+
+
+def test_iter_file_poems_matches_json_load(tmp_path):
+    items = [
+        {"title": "a", "paragraphs": [" 一 ", "二"]},
+        {"title": "b", "paragraphs": []},
+        {"title": "c", "paragraphs": ["", ""]},
+        {"title": "d"},
+    ]
+    path = _write(tmp_path, json.dumps(items, ensure_ascii=False))
+    # 导入: 与 '\n'.join(item.get('paragraphs', [])) 一致，空内容的诗歌同样产出
+    poems = list(iter_file_poems(path, sep='\n'))
+    assert [p['title'] for p in poems] == ['a', 'b', 'c', 'd']
+    assert [p['content'] for p in poems] == ['\n'.join(i.get('paragraphs', [])) for i in items]
+    # 训练语料: 只保留长度超过 min_length 的诗歌
+    assert [p['title'] for p in iter_file_poems(path, min_length=3)] == ['a']
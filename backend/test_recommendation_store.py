@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+from recommendation_store import RecommendationStore, RecommendationStoreConfig
+
+
+def test_put_dropped_after_invalidate():
+    store = RecommendationStore(version='v1')
+    started_at = time.time() - 1
+    store.invalidate(7)
+    # 计算开始后该用户有新评论: 旧结果不写入
+    assert store.put(7, [1, 2, 3], (1, 0.0), started_at=started_at) is False
+    assert store.get(7, 10, 'v1') is None
+    # 其他用户不受影响
+    assert store.put(8, [4, 5], (1, 0.0), started_at=started_at) is True
+    assert store.get(8, 10, 'v1') == [4, 5]
+
+
+def test_put_accepted_when_started_after_invalidate():
+    store = RecommendationStore(version='v1')
+    store.put(7, [9], (1, 0.0))
+    store.invalidate(7)
+    assert store.get(7, 10, 'v1') is None
+    assert store.put(7, [1, 2, 3], (2, 0.0), started_at=time.time() + 1) is True
+    assert store.get(7, 2, 'v1') == [1, 2]
+
+
+def test_get_checks_version_and_age(monkeypatch):
+    store = RecommendationStore(version='v1')
+    store.put(1, [1, 2], (1, 0.0))
+    assert store.get(1, 10, 'v2') is None
+    monkeypatch.setattr(RecommendationStoreConfig, 'MAX_AGE', -1)
+    assert store.get(1, 10, 'v1') is None
+    assert store.hits == 0 and store.misses == 2
+
+
+def test_stale_users_and_prunes_invalidations():
+    store = RecommendationStore(version='v1')
+    store.put(1, [1], (1, 10.0))
+    store.put(2, [2], (1, 10.0))
+    store.put(3, [3], (1, 10.0))
+    store.invalidate(2)
+    started_at = time.time() + 1
+    stale = store.stale_users({1: (1, 10.0), 2: (2, 20.0), 4: (1, 5.0)}, started_at)
+    assert sorted(stale) == [2, 4]
+    # 不再活跃的用户被移除；更早的作废记录已清理，新一轮结果可以写入
+    assert store.get(3, 10, 'v1') is None
+    assert store.put(2, [5], (2, 20.0), started_at=started_at) is True
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / RecommendationStoreConfig.FILE_NAME)
+    store = RecommendationStore(path, version='v1')
+    store.put(1, [3, 1, 2], (3, 1.5))
+    store.put(2, [], (1, 2.5))
+    store.save()
+    loaded = RecommendationStore.load(path)
+    assert loaded.version == 'v1'
+    assert loaded.get(1, 10, 'v1') == [3, 1, 2]
+    assert loaded.get(2, 10, 'v1') == []
+    assert loaded.stale_users({1: (3, 1.5), 2: (2, 9.0)}, time.time()) == [2]
+
+
+def test_get_skips_deleted_poems():
+    store = RecommendationStore(version='v1')
+    store.put(1, [1, 2, 3, 4], (1, 0.0))
+    live = {1: 0, 3: 2, 4: 3}
+    assert store.get(1, 3, 'v1', live=live) == [1, 3, 4]
+    # 删除后不足 limit 个: 回退在线计算
+    assert store.get(1, 4, 'v1', live=live) is None
+    # 列表本身就比 limit 短 (语料很小) 时没有删除就返回全部
+    store.put(2, [1, 3], (1, 0.0))
+    assert store.get(2, 6, 'v1', live=live) == [1, 3]
+
+
+def test_insert_new_poem(monkeypatch):
+    monkeypatch.setattr(RecommendationStoreConfig, 'LIST_SIZE', 4)
+    store = RecommendationStore(version='v1')
+    store.put(1, [1, 2, 3, 4], (1, 0.0))
+    assert store.insert(1, 9, 1) is True
+    assert store.get(1, 10, 'v1') == [1, 9, 2, 3]
+    # 排在列表之外、重复或没有列表的用户不插入
+    assert store.insert(1, 8, 4) is False
+    assert store.insert(1, 9, 0) is False
+    assert store.insert(2, 9, 0) is False
+    assert [uid for uid, _ in store.items()] == [1]
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight, SingleFlightConfig
+
+FOLLOWERS = 5
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "等待超时"
+        time.sleep(0.005)
+
+
+class _Blocking:
+    """第一次调用阻塞直到 release；记录调用次数"""
+
+    def __init__(self, result=None, error=None):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.count = 0
+        self.result = result
+        self.error = error
+
+    def __call__(self, *args):
+        self.count += 1
+        self.entered.set()
+        assert self.release.wait(5.0)
+        if self.error is not None:
+            raise self.error
+        return self.result, args
+
+
+def _run(flight, key, fn, *args):
+    """在线程中调用 flight.do，返回 (线程, 结果列表)"""
+    out = []
+
+    def target():
+        try:
+            out.append(('ok',) + flight.do(key, fn, *args))
+        except Exception as e:
+            out.append(('error', e))
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, out
+
+
+def _start_followers(flight, key, fn, count=FOLLOWERS):
+    runs = [_run(flight, key, fn, 'follower') for _ in range(count)]
+    _wait_until(lambda: flight.peak_waiters >= count)
+    return runs
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    fn = _Blocking(result=[1, 2, 3])
+    leader = _run(flight, 'user:1', fn, 'leader')
+    assert fn.entered.wait(5.0)
+    followers = _start_followers(flight, 'user:1', fn)
+    fn.release.set()
+    for thread, _ in [leader] + followers:
+        thread.join(5.0)
+
+    assert fn.count == 1
+    assert leader[1] == [('ok', ([1, 2, 3], ('leader',)), False)]
+    for _, out in followers:
+        # 跟随者拿到 leader 的结果，而不是用自己的参数再执行一次
+        assert out == [('ok', ([1, 2, 3], ('leader',)), True)]
+    stats = flight.get_stats()
+    assert stats['calls'] == FOLLOWERS + 1
+    assert stats['executions'] == 1
+    assert stats['shared'] == FOLLOWERS
+    assert stats['in_flight'] == 0
+
+
+def test_different_keys_do_not_share():
+    flight = SingleFlight()
+    assert flight.do('a', lambda: 1) == (1, False)
+    assert flight.do('b', lambda: 2) == (2, False)
+    # 计算结束后不缓存结果
+    assert flight.do('a', lambda: 3) == (3, False)
+    assert flight.get_stats()['executions'] == 3
+
+
+def test_exception_propagates_to_waiters():
+    flight = SingleFlight()
+    error = RuntimeError('boom')
+    fn = _Blocking(error=error)
+    leader = _run(flight, 'k', fn)
+    assert fn.entered.wait(5.0)
+    followers = _start_followers(flight, 'k', fn)
+    fn.release.set()
+    for thread, _ in [leader] + followers:
+        thread.join(5.0)
+
+    assert fn.count == 1
+    for _, out in [leader] + followers:
+        assert out == [('error', error)]
+    assert flight.get_stats()['errors'] == 1
+    # 失败后键已释放，下一次调用重新执行
+    assert flight.do('k', lambda: 'ok') == ('ok', False)
+
+
+def test_forget_stops_new_callers_joining():
+    flight = SingleFlight()
+    fn = _Blocking(result='old')
+    leader = _run(flight, ('user', 1), fn)
+    assert fn.entered.wait(5.0)
+    followers = _start_followers(flight, ('user', 1), fn, count=2)
+
+    flight.forget(lambda key: key[0] == 'user' and key[1] == 1)
+    assert flight.get_stats()['in_flight'] == 0
+    # forget 之后到达的调用方自行执行，拿到新结果
+    assert flight.do(('user', 1), lambda: 'new') == ('new', False)
+
+    fn.release.set()
+    for thread, _ in [leader] + followers:
+        thread.join(5.0)
+    # 已在等待的调用方仍共享旧计算的结果
+    for _, out in followers:
+        assert out == [('ok', ('old', ()), True)]
+    assert leader[1] == [('ok', ('old', ()), False)]
+
+
+def test_forget_ignores_other_keys():
+    flight = SingleFlight()
+    fn = _Blocking(result='x')
+    leader = _run(flight, ('user', 2), fn)
+    assert fn.entered.wait(5.0)
+    flight.forget(lambda key: key[1] == 1)
+    assert flight.get_stats()['in_flight'] == 1
+    fn.release.set()
+    leader[0].join(5.0)
+
+
+def test_waiter_times_out_and_runs_itself(monkeypatch):
+    monkeypatch.setattr(SingleFlightConfig, 'WAIT_TIMEOUT', 0.05)
+    flight = SingleFlight()
+    fn = _Blocking(result='slow')
+    leader = _run(flight, 'k', fn)
+    assert fn.entered.wait(5.0)
+    assert flight.do('k', lambda: 'fast') == ('fast', False)
+    assert flight.get_stats()['timeouts'] == 1
+    fn.release.set()
+    leader[0].join(5.0)
+
+
+@pytest.mark.parametrize('error', [None, ValueError('bad')])
+def test_key_released_after_call(error):
+    flight = SingleFlight()
+
+    def fn():
+        if error is not None:
+            raise error
+        return 1
+
+    try:
+        flight.do('k', fn)
+    except ValueError:
+        pass
+    assert flight.get_stats()['in_flight'] == 0
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from user_profiles import UserProfileStore, UserProfileConfig, review_weight
+
+DIM = 8
+START = datetime(2024, 1, 1)
+
+
+def _reference(matrix, reviews):
+    """原实现的直接加权平均: exp(-age / TAU) x 评分权重 x 喜欢加成"""
+    now = max(created_at for _, created_at, _, _ in reviews)
+    weights = np.array([np.exp(-(now - created_at).total_seconds() / 86400.0 / UserProfileConfig.DECAY_DAYS)
+                        * review_weight(rating, liked) for _, created_at, rating, liked in reviews])
+    vectors = matrix[[idx for idx, _, _, _ in reviews]].astype(np.float64)
+    return (weights[:, None] * vectors).sum(axis=0) / weights.sum()
+
+
+def _random_reviews(rng, n_poems, n, span_days):
+    reviews = []
+    for day in np.sort(rng.uniform(0, span_days, n)):
+        reviews.append((int(rng.integers(n_poems)), START + timedelta(days=float(day)),
+                        float(rng.integers(1, 6)), bool(rng.random() < 0.3)))
+    return reviews
+
+
+@pytest.fixture
+def matrix():
+    rng = np.random.default_rng(0)
+    m = rng.standard_normal((50, DIM)).astype(np.float32)
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize('span_days', [5, 60, 1000])
+def test_add_review_matches_weighted_average(matrix, span_days):
+    # 1000 天的跨度会多次触发 anchor 前移 (REBASE_DAYS)
+    rng = np.random.default_rng(span_days)
+    reviews = _random_reviews(rng, len(matrix), 40, span_days)
+    store = UserProfileStore(DIM)
+    for idx, created_at, rating, liked in reviews:
+        store.add_review(7, matrix[idx], created_at, rating, liked)
+    assert store.review_count(7) == len(reviews)
+    np.testing.assert_allclose(store.profile(7), _reference(matrix, reviews), rtol=1e-4, atol=1e-5)
+
+
+def test_update_review_matches_weighted_average(matrix):
+    rng = np.random.default_rng(1)
+    reviews = _random_reviews(rng, len(matrix), 20, 400)
+    store = UserProfileStore(DIM)
+    for idx, created_at, rating, liked in reviews:
+        store.add_review(1, matrix[idx], created_at, rating, liked)
+
+    for i in (0, 7, 19):
+        idx, created_at, rating, liked = reviews[i]
+        new = (5.0 if rating < 5 else 1.0, not liked)
+        store.update_review(1, matrix[idx], created_at, (rating, liked), new)
+        reviews[i] = (idx, created_at) + new
+    assert store.review_count(1) == len(reviews)
+    np.testing.assert_allclose(store.profile(1), _reference(matrix, reviews), rtol=1e-4, atol=1e-5)
+
+
+def test_remove_all_reviews_clears_profile(matrix):
+    store = UserProfileStore(DIM)
+    store.add_review(1, matrix[0], START, 4, True)
+    store.add_review(1, matrix[0], START, 4, True, sign=-1)
+    assert store.profile(1) is None
+    assert store.review_count(1) == 0
+
+
+def test_rebuild_matches_incremental(matrix):
+    rng = np.random.default_rng(2)
+    poem_ids = list(range(100, 100 + len(matrix)))
+    poem_id_map = {pid: i for i, pid in enumerate(poem_ids)}
+    rows = []
+    incremental = UserProfileStore(DIM)
+    for user_id in range(1, 6):
+        for idx, created_at, rating, liked in _random_reviews(rng, len(matrix), 15, 500):
+            rows.append((user_id, poem_ids[idx], rating, liked, created_at))
+            incremental.add_review(user_id, matrix[idx], created_at, rating, liked)
+        # 不在矩阵中的诗歌只计数
+        rows.append((user_id, 999999, 3.0, False, START))
+        incremental.add_review(user_id, None, START, 3.0, False)
+
+    rebuilt = UserProfileStore(DIM)
+    rebuilt.rebuild(rows, matrix, poem_id_map)
+    assert rebuilt.total_reviews == incremental.total_reviews == len(rows)
+    for user_id in range(1, 6):
+        assert rebuilt.review_count(user_id) == incremental.review_count(user_id) == 16
+        np.testing.assert_allclose(rebuilt.profile(user_id), incremental.profile(user_id), rtol=1e-4, atol=1e-5)
+
+    target = incremental.profile(1)
+    assert [u for u, _ in rebuilt.similar(target, 3, exclude_user_id=1)] == \
+        [u for u, _ in incremental.similar(target, 3, exclude_user_id=1)]
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评论主题异步打标队列
+
+add_review 只负责写库并把评论ID放入队列，后台线程把 topic_names 为空的
+评论攒成小批次（达到批大小或等待数百毫秒即刷新），提取整批的关键词标签后
+批量写回数据库。topic_names 只保存评论自身的关键词 (jieba)，不需要 BERTopic 推理。
+"""
+
+import queue
+import threading
+import time
+import logging
+import traceback
+
+from flask import jsonify
+
+from models import db, Review
+
+
+class TaggingConfig:
+    """打标队列配置"""
+
+    # 单批最大评论数
+    BATCH_SIZE = 32
+
+    # 第一条评论入队后最多等待多久刷新（秒）
+    FLUSH_INTERVAL = 0.3
+
+    # 空闲时扫描数据库中遗漏评论 (topic_names IS NULL) 的间隔（秒）
+    SWEEP_INTERVAL = 30
+
+    # 批大小直方图的桶上界
+    HISTOGRAM_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class TaggingMetrics:
+    """打标队列指标 (队列深度 / 批大小直方图 / 耗时)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batch_size_histogram = {str(b): 0 for b in TaggingConfig.HISTOGRAM_BUCKETS}
+        self.batch_size_histogram['+Inf'] = 0
+        self.batches = 0
+        self.tagged = 0
+        self.failures = 0
+        self.total_batch_seconds = 0.0
+        self.last_batch_size = 0
+        self.last_batch_seconds = 0.0
+        self.max_queue_depth = 0
+
+    def observe_depth(self, depth):
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def observe_batch(self, size, seconds):
+        with self._lock:
+            bucket = '+Inf'
+            for b in TaggingConfig.HISTOGRAM_BUCKETS:
+                if size <= b:
+                    bucket = str(b)
+                    break
+            self.batch_size_histogram[bucket] += 1
+            self.batches += 1
+            self.tagged += size
+            self.total_batch_seconds += seconds
+            self.last_batch_size = size
+            self.last_batch_seconds = seconds
+
+    def observe_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'tagged': self.tagged,
+                'failures': self.failures,
+                'max_queue_depth': self.max_queue_depth,
+                'last_batch_size': self.last_batch_size,
+                'last_batch_ms': round(self.last_batch_seconds * 1000, 2),
+                'avg_batch_size': round(self.tagged / self.batches, 2) if self.batches else 0,
+                'avg_batch_ms': round(self.total_batch_seconds * 1000 / self.batches, 2) if self.batches else 0,
+                'batch_size_histogram': dict(self.batch_size_histogram)
+            }
+
+
+class TopicTaggingWorker:
+    """后台评论打标线程"""
+
+    def __init__(self, app, on_tagged=None):
+        self.app = app
+        self.on_tagged = on_tagged  # 回调: on_tagged(user_ids)，在应用上下文中执行
+        self.queue = queue.Queue()
+        self.metrics = TaggingMetrics()
+        self.logger = logging.getLogger('TopicTagging')
+        self.thread = None
+        self._stop = threading.Event()
+        self._recommender = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self._stop.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def enqueue(self, review_id):
+        """评论写库后调用，立即返回"""
+        self.queue.put(review_id)
+        self.metrics.observe_depth(self.queue.qsize())
+
+    def _collect_batch(self):
+        """阻塞等待第一条评论，然后在 FLUSH_INTERVAL 内尽量凑满一批"""
+        try:
+            first = self.queue.get(timeout=TaggingConfig.SWEEP_INTERVAL)
+        except queue.Empty:
+            return None
+
+        batch = [first]
+        deadline = time.time() + TaggingConfig.FLUSH_INTERVAL
+        while len(batch) < TaggingConfig.BATCH_SIZE:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = self._collect_batch()
+                with self.app.app_context():
+                    if batch is None:
+                        self._sweep()
+                    else:
+                        self._process(batch)
+            except Exception as e:
+                self.metrics.observe_failure()
+                self.logger.error(f"评论打标失败: {e}\n{traceback.format_exc()}")
+                time.sleep(1)
+
+    def _sweep(self):
+        """空闲时补打数据库中遗漏的评论 (例如重启前尚未处理的队列)"""
+        rows = db.session.query(Review.id).filter(Review.topic_names == None) \
+            .order_by(Review.id.asc()).limit(TaggingConfig.BATCH_SIZE * 4).all()
+        ids = [rid for (rid,) in rows]
+        for i in range(0, len(ids), TaggingConfig.BATCH_SIZE):
+            self._process(ids[i:i + TaggingConfig.BATCH_SIZE])
+
+    def _process(self, review_ids):
+        from bertopic_analysis import get_individual_keywords
+
+        rows = db.session.query(Review.id, Review.comment, Review.user_id).filter(
+            Review.id.in_(set(review_ids)),
+            Review.topic_names == None
+        ).all()
+        if not rows:
+            return
+
+        start = time.time()
+        mappings = [{'id': r.id, 'topic_names': get_individual_keywords(r.comment)} for r in rows]
+        db.session.bulk_update_mappings(Review, mappings)
+        db.session.commit()
+
+        user_ids = {r.user_id for r in rows}
+        self._update_user_preferences(user_ids)
+        self.metrics.observe_batch(len(rows), time.time() - start)
+
+        if self.on_tagged:
+            self.on_tagged(user_ids)
+
+    def _update_user_preferences(self, user_ids):
+        """打标完成后刷新相关用户的偏好主题文本"""
+        from models import User
+        from recommendation_update import IncrementalRecommender
+        if self._recommender is None:
+            self._recommender = IncrementalRecommender()
+        for user in User.query.filter(User.id.in_(user_ids)).all():
+            user.preference_topics = self._recommender.update_user_preference(user.id)
+        db.session.commit()
+
+    def get_status(self):
+        status = self.metrics.snapshot()
+        status['queue_depth'] = self.queue.qsize()
+        status['running'] = bool(self.thread and self.thread.is_alive())
+        status['config'] = {
+            'batch_size': TaggingConfig.BATCH_SIZE,
+            'flush_interval': TaggingConfig.FLUSH_INTERVAL,
+            'sweep_interval': TaggingConfig.SWEEP_INTERVAL
+        }
+        return status
+
+
+# ==================== 集成到 Flask 应用 ====================
+
+tagging_worker = None
+
+
+def init_topic_tagging(app, on_tagged=None):
+    """初始化并启动后台打标线程"""
+    global tagging_worker
+    if tagging_worker is None:
+        tagging_worker = TopicTaggingWorker(app, on_tagged=on_tagged)
+    tagging_worker.start()
+    return tagging_worker
+
+
+def enqueue_review(review_id):
+    """把新评论放入打标队列；队列未启动时返回 False (由后续全量刷新补打)"""
+    if tagging_worker is None:
+        return False
+    tagging_worker.enqueue(review_id)
+    return True
+
+
+def add_tagging_routes(app):
+    """添加打标队列监控接口"""
+
+    @app.route('/api/admin/tagging/status')
+    def get_tagging_status():
+        """获取打标队列深度与批大小直方图"""
+        if tagging_worker is None:
+            return jsonify({'error': '打标队列未初始化'}), 500
+        return jsonify(tagging_worker.get_status())
@@ -1,59 +1,21 @@
-import os
-import json
-import random
-import shutil
+import time
 import argparse
 from app import app
 from models import db, Poem
 import bertopic_analysis
+from bulk_retag import bulk_retag_poems
+from poetry_corpus import DEFAULT_TARGETS, iter_poems, reservoir_sample
 
-# 配置路径
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-POETRY_DATA_DIR = os.path.join(BASE_DIR, 'data', 'chinese-poetry')
-
-def collect_poetry_data(sample_limit=20000):
-    all_content = []
-    # 增加扫描范围
-    targets = [
-        ('全唐诗', 300), 
-        ('宋词', 30),
-        ('元曲', 10),
-        ('曹操诗集', None),
-        ('诗经', None),
-        ('楚辞', None),
-        ('御定全唐詩', 300)
-    ]
-    
+def collect_poetry_data(sample_limit=20000, seed=42):
+    """流式遍历 chinese-poetry 数据集并蓄水池采样，峰值内存只与 sample_limit 有关"""
     print("[BERTopic] Collecting poetry samples...")
-    for folder, file_limit in targets:
-        dir_path = os.path.join(POETRY_DATA_DIR, folder)
-        if not os.path.exists(dir_path): continue
-            
-        files = [f for f in os.listdir(dir_path) if f.endswith('.json')]
-        if file_limit: files = files[:file_limit]
-            
-        for filename in files:
-            file_path = os.path.join(dir_path, filename)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if isinstance(data, list):
-                        for item in data:
-                            paragraphs = item.get('paragraphs', [])
-                            if paragraphs:
-                                content = "".join(paragraphs)
-                                # 过滤极短文本，但保留绝句律诗长度
-                                if len(content) > 10:
-                                    all_content.append(content)
-            except: pass
-                
-    total = len(all_content)
+    # 过滤极短文本，但保留绝句律诗长度
+    contents = (item['content'] for item in iter_poems(DEFAULT_TARGETS, min_length=10))
+    docs, total = reservoir_sample(contents, sample_limit, seed=seed)
     print(f"[BERTopic] Total poems found: {total}")
-    
     if total > sample_limit:
-        print(f"[BERTopic] Sampling {sample_limit} poems for training...")
-        return random.sample(all_content, sample_limit)
-    return all_content
+        print(f"[BERTopic] Sampled {len(docs)} poems for training (seed={seed})")
+    return docs
 
 def fill_real_topics(limit=0, batch_size=200, dry_run=False):
     with app.app_context():
@@ -79,53 +41,90 @@ def fill_real_topics(limit=0, batch_size=200, dry_run=False):
             db.session.commit()
         print(f"[Success] Updated Real_topic for {updated} poems.")
 
-def train_and_update_topics():
+def train_and_update_topics(embed_workers=None):
     # 1. 准备数据
     docs = collect_poetry_data(sample_limit=20000)
     
     # 2. 训练模型
     # train_bertopic_model 内部会加载 embedding model 并调用 fit_transform
+    # embed_workers > 1 时语料分片到多个进程编码
     print("[BERTopic] Starting training... (This may take a while)")
-    model, topics, probs = bertopic_analysis.train_bertopic_model(docs)
+    model, topics, probs = bertopic_analysis.train_bertopic_model(docs, embed_workers=embed_workers)
     
     # 3. 保存模型
-    bertopic_analysis.save_bertopic_model(model)
+    # 训练语料来自 JSON 数据集而不是数据库，不记录 max_poem_id: 数据库中的诗歌模型并未见过，
+    # 之后的增量更新需用 --since-id 指定起点
+    bertopic_analysis.save_bertopic_model(model, metadata={
+        'kind': 'full',
+        'docs': len(docs)
+    })
     
     # 4. 更新数据库
+    retag_poems()
+
+def incremental_update_topics(since_id=None, min_similarity=0.7):
+    """只在新导入的诗歌上拟合小模型，合并进当前模型并保存为新版本"""
+    base_version = bertopic_analysis.get_current_model_version()
+    if base_version is None:
+        print("[Error] No saved BERTopic model, run --mode train first.")
+        return
+    if since_id is None:
+        since_id = bertopic_analysis.get_model_metadata(base_version).get('max_poem_id')
+        if since_id is None:
+            # 全量训练的模型基于 JSON 语料，不知道数据库中哪些诗歌已被学习过
+            print("[Warning] 当前模型没有记录 max_poem_id (全量训练不读取数据库)，请用 --since-id 指定新诗起点")
+            return
+
+    with app.app_context():
+        rows = db.session.query(Poem.id, Poem.content).filter(Poem.id > since_id) \
+            .order_by(Poem.id.asc()).all()
+    docs = [c for _, c in rows if c and len(c) > 10]
+    max_poem_id = rows[-1].id if rows else since_id
+    print(f"[BERTopic] Incremental update on {len(docs)} new poems (id > {since_id}), base version {base_version}")
+
+    start = time.time()
+    model, stats = bertopic_analysis.incremental_update_model(docs, min_similarity=min_similarity)
+    if not stats['merged']:
+        return
+    version = bertopic_analysis.save_bertopic_model(model, metadata={
+        'kind': 'incremental',
+        'base_version': base_version,
+        'docs': len(docs),
+        'new_topics': stats['new_topics'],
+        'max_poem_id': max_poem_id
+    })
+    print(f"[BERTopic] Incremental update finished in {time.time() - start:.1f}s -> version {version}")
+
+    # 已有诗歌的主题ID保持不变，只需为新诗打标
+    with app.app_context():
+        bulk_retag_poems(job='incremental', start_after=since_id)
+
+def retag_poems(resume=False, workers=None, chunk_size=None):
+    """分块批量重新打标 (标签只取决于诗歌文本，resume 时从上次提交的块继续)"""
     print("[BERTopic] Updating database with new semantic topics...")
     with app.app_context():
-        poems = Poem.query.all()
-        total_poems = len(poems)
-        
-        # 批量处理以提高效率，虽然这里是简单的循环
-        for i, p in enumerate(poems):
-            # predict_topic 需要载入模型，但这里我们已经有 model 对象了
-            # 为了复用 bertopic_analysis.predict_topic 逻辑，我们可以传递 model
-            # 或者直接调用 model.transform 因为 predict_topic 内部也是 transform
-            
-            # transform 较慢，如果是大量数据最好批量 transform
-            # 但这里数据库目前只有 ~800 条，单条预测尚可
-            
-            topic_id, topic_name = bertopic_analysis.predict_topic(p.content, model)
-            p.Bertopic = topic_name
-            p.Real_topic = bertopic_analysis.generate_real_topic(p.content, author=p.author)
-            
-            if (i+1) % 50 == 0:
-                print(f"  - Progress: {i+1}/{total_poems}")
-                db.session.commit() # 阶段性提交
-        
-        db.session.commit()
-        print(f"[Success] Updated {total_poems} poems with BERTopic tags.")
+        total = bulk_retag_poems(job='train', resume=resume,
+                                 workers=workers, chunk_size=chunk_size)
+    print(f"[Success] Updated {total} poems with BERTopic tags.")
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
-    parser.add_argument("--mode", choices=["train", "fill-real-topic"], default="train")
+    parser.add_argument("--mode", choices=["train", "incremental", "retag", "fill-real-topic"], default="train")
     parser.add_argument("--limit", type=int, default=0)
     parser.add_argument("--batch-size", type=int, default=200)
     parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--resume", action="store_true", help="retag 模式下从上次提交的块继续")
+    parser.add_argument("--workers", type=int, default=None, help="关键词提取进程数")
+    parser.add_argument("--embed-workers", type=int, default=None, help="train 模式下句向量分片编码的进程数")
+    parser.add_argument("--since-id", type=int, default=None, help="incremental 模式下新诗的起始ID (默认取当前模型记录的 max_poem_id)")
+    parser.add_argument("--min-similarity", type=float, default=0.7, help="incremental 模式下新主题并入已有主题的相似度阈值")
     args = parser.parse_args()
 
     if args.mode == "fill-real-topic":
         fill_real_topics(limit=args.limit, batch_size=args.batch_size, dry_run=args.dry_run)
+    elif args.mode == "incremental":
+        incremental_update_topics(since_id=args.since_id, min_similarity=args.min_similarity)
+    elif args.mode == "retag":
+        retag_poems(resume=args.resume, workers=args.workers)
     else:
-        train_and_update_topics()
+        train_and_update_topics(embed_workers=args.embed_workers)
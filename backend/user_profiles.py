@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量维护的用户画像向量
+
+用户画像是评论过的诗歌向量的加权平均，权重 = exp(-age / 30天) x 评分权重 x 喜欢加成。
+原实现每次都查询该用户的全部评论再逐条计算，缓存 5 分钟后重算。
+
+这里为每个用户保存衰减归一化的累加和:
+    S = sum(exp((t_r - anchor) / TAU) * base_r * v_r)
+    W = sum(exp((t_r - anchor) / TAU) * base_r)
+画像 S / W 与原来的加权平均完全相等 (共同的 exp(-(now - anchor) / TAU) 因子在分子分母中约去)，
+因此时间流逝不需要重算；新增 / 修改一条评论只需 O(dim) 更新。anchor 随新评论前移 (rebase)，
+避免指数项溢出。
+
+累加和保存为 saved_models/vector_cache/user_profiles.npz (float32)，写入合并为延迟保存，
+重启后直接加载；向量模型变化或评论总数对不上时从数据库全量重建 (一次查询 + 稀疏矩阵乘)。
+"""
+
+import os
+import time
+import atexit
+import threading
+from datetime import datetime
+
+import numpy as np
+
+
+class UserProfileConfig:
+    """用户画像存储配置"""
+
+    # 时间衰减常数（天）
+    DECAY_DAYS = 30.0
+
+    # 新评论距 anchor 超过该天数时把 anchor 前移到新评论时间
+    REBASE_DAYS = 180.0
+
+    # 修改后延迟保存（秒），期间的多次更新合并为一次写盘
+    SAVE_DELAY = 30
+
+    # 初始容量 (用户数)，不足时翻倍
+    INITIAL_CAPACITY = 1024
+
+    FILE_NAME = 'user_profiles.npz'
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _days(created_at):
+    """评论时间 -> 距 1970-01-01 的天数 (与 created_at 一样按 UTC 计)"""
+    if created_at is None:
+        created_at = datetime.utcnow()
+    return (created_at - _EPOCH).total_seconds() / 86400.0
+
+
+def review_weight(rating, liked):
+    """与时间无关的评论权重: 评分权重 x 喜欢加成"""
+    rating = rating if rating is not None else 3.0
+    return max(0.2, min(1.0, rating / 5.0)) * (1.2 if liked else 1.0)
+
+
+class UserProfileStore:
+    """按用户保存衰减归一化的累加和 (S, W)"""
+
+    def __init__(self, dim, embedding_name=None, path=None):
+        self.dim = int(dim)
+        self.embedding_name = embedding_name
+        self.path = path
+        self._lock = threading.RLock()
+        self._save_timer = None
+        self._allocate(UserProfileConfig.INITIAL_CAPACITY)
+        self.row_map = {}
+        self.size = 0
+        self.total_reviews = 0
+        self.built_at = time.time()
+
+    def _allocate(self, capacity):
+        self.user_ids = np.zeros(capacity, dtype=np.int64)
+        self.sums = np.zeros((capacity, self.dim), dtype=np.float32)
+        self.weights = np.zeros(capacity, dtype=np.float64)
+        self.anchors = np.zeros(capacity, dtype=np.float64)
+        self.counts = np.zeros(capacity, dtype=np.int32)   # 该用户的评论数 (含不在矩阵中的诗歌)
+        self.norms = np.zeros(capacity, dtype=np.float32)  # ||S||，相似用户搜索时归一化用
+
+    def _grow(self, needed):
+        capacity = len(self.user_ids)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        for name in ('user_ids', 'sums', 'weights', 'anchors', 'counts', 'norms'):
+            old = getattr(self, name)
+            new = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:capacity] = old
+            setattr(self, name, new)
+
+    def _row(self, user_id, create=True):
+        row = self.row_map.get(user_id)
+        if row is None and create:
+            self._grow(self.size + 1)
+            row = self.size
+            self.user_ids[row] = user_id
+            self.row_map[user_id] = row
+            self.size += 1
+        return row
+
+    def _rebase(self, row, anchor):
+        shift = np.exp((self.anchors[row] - anchor) / UserProfileConfig.DECAY_DAYS)
+        self.sums[row] *= shift
+        self.weights[row] *= shift
+        self.anchors[row] = anchor
+
+    # ==================== 增量更新 ====================
+
+    def add_review(self, user_id, vector, created_at=None, rating=None, liked=False, sign=1):
+        """计入 (sign=1) 或撤销 (sign=-1) 一条评论；vector 为 None 表示诗歌不在矩阵中，只计数"""
+        with self._lock:
+            row = self._row(user_id)
+            self.counts[row] += sign
+            self.total_reviews += sign
+            if vector is not None:
+                t = _days(created_at)
+                if self.weights[row] == 0:
+                    self.sums[row] = 0
+                    self.anchors[row] = t
+                elif t - self.anchors[row] > UserProfileConfig.REBASE_DAYS:
+                    self._rebase(row, t)
+                w = sign * np.exp((t - self.anchors[row]) / UserProfileConfig.DECAY_DAYS) \
+                    * review_weight(rating, liked)
+                self.sums[row] += np.asarray(vector, dtype=np.float32) * np.float32(w)
+                self.weights[row] += w
+                if self.weights[row] <= 1e-12:
+                    # 撤销后没有剩余权重: 清零，避免残留浮点误差
+                    self.sums[row] = 0
+                    self.weights[row] = 0
+                self.norms[row] = np.linalg.norm(self.sums[row])
+        self.schedule_save()
+
+    def update_review(self, user_id, vector, created_at, old, new):
+        """评论修改: old / new 为 (rating, liked)"""
+        self.add_review(user_id, vector, created_at, *old, sign=-1)
+        self.add_review(user_id, vector, created_at, *new, sign=1)
+
+    def reset_user(self, user_id, entries):
+        """用该用户的完整评论列表重算 (entries: [(vector 或 None, created_at, rating, liked)])"""
+        with self._lock:
+            row = self._row(user_id)
+            self.total_reviews -= int(self.counts[row])
+            self.sums[row] = 0
+            self.weights[row] = 0
+            self.counts[row] = 0
+        for vector, created_at, rating, liked in entries:
+            self.add_review(user_id, vector, created_at, rating, liked)
+        if not entries:
+            self.schedule_save()
+
+    # ==================== 查询 ====================
+
+    def review_count(self, user_id):
+        row = self.row_map.get(user_id)
+        return int(self.counts[row]) if row is not None else 0
+
+    def profile(self, user_id):
+        """用户画像向量 (加权平均)；没有有效评论时返回 None"""
+        row = self.row_map.get(user_id)
+        if row is None or self.weights[row] <= 0:
+            return None
+        return (self.sums[row] / self.weights[row]).astype(np.float32)
+
+    def similar(self, target_vector, top_k, exclude_user_id=None, candidate_limit=None):
+        """与目标画像余弦相似度最高的用户 [(user_id, score)]"""
+        with self._lock:
+            n = self.size
+            sums, norms, counts, user_ids = self.sums[:n], self.norms[:n], self.counts[:n], self.user_ids[:n]
+            exclude_row = self.row_map.get(exclude_user_id)
+        if n == 0:
+            return []
+        target = np.asarray(target_vector, dtype=np.float32)
+        target_norm = np.linalg.norm(target)
+        if target_norm == 0:
+            return []
+
+        valid = norms > 0
+        scores = np.full(n, -np.inf, dtype=np.float32)
+        scores[valid] = (sums[valid] @ target) / (norms[valid] * target_norm)
+        if exclude_row is not None:
+            scores[exclude_row] = -np.inf
+        if candidate_limit and n > candidate_limit:
+            # 只在评论数最多的前 candidate_limit 个用户中搜索
+            keep = np.argpartition(-counts, candidate_limit - 1)[:candidate_limit]
+            mask = np.ones(n, dtype=bool)
+            mask[keep] = False
+            scores[mask] = -np.inf
+
+        k = min(top_k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(user_ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    # ==================== 全量重建 ====================
+
+    def rebuild(self, rows, topic_matrix, poem_id_map):
+        """从评论行 (user_id, poem_id, rating, liked, created_at) 全量重建 (稀疏矩阵乘)"""
+        from scipy.sparse import csr_matrix
+
+        row_map = {}
+        user_rows, poem_rows, days, bases = [], [], [], []
+        counts = []
+        for user_id, poem_id, rating, liked, created_at in rows:
+            row = row_map.get(user_id)
+            if row is None:
+                row = row_map[user_id] = len(row_map)
+                counts.append(0)
+            counts[row] += 1
+            poem_idx = poem_id_map.get(poem_id)
+            if poem_idx is None:
+                continue
+            user_rows.append(row)
+            poem_rows.append(poem_idx)
+            days.append(_days(created_at))
+            bases.append(review_weight(rating, liked))
+
+        n_users = len(row_map)
+        user_rows = np.asarray(user_rows, dtype=np.int64)
+        days = np.asarray(days, dtype=np.float64)
+        # 每个用户以最新一条评论为 anchor，指数项都不大于 1
+        anchors = np.full(n_users, -np.inf)
+        np.maximum.at(anchors, user_rows, days)
+        anchors[~np.isfinite(anchors)] = 0.0
+        scaled = np.exp((days - anchors[user_rows]) / UserProfileConfig.DECAY_DAYS) * np.asarray(bases)
+        weight_matrix = csr_matrix((scaled.astype(np.float32), (user_rows, np.asarray(poem_rows, dtype=np.int64))),
+                                   shape=(n_users, len(topic_matrix)))
+        sums = np.asarray(weight_matrix @ topic_matrix, dtype=np.float32)
+
+        with self._lock:
+            self._allocate(max(UserProfileConfig.INITIAL_CAPACITY, n_users))
+            self.sums[:n_users] = sums
+            self.weights[:n_users] = np.bincount(user_rows, weights=scaled, minlength=n_users)
+            self.anchors[:n_users] = anchors
+            self.counts[:n_users] = counts
+            self.norms[:n_users] = np.linalg.norm(sums, axis=1)
+            for user_id, row in row_map.items():
+                self.user_ids[row] = user_id
+            self.row_map = row_map
+            self.size = n_users
+            self.total_reviews = int(sum(counts))
+            self.built_at = time.time()
+        self.schedule_save()
+
+    # ==================== 持久化 ====================
+
+    def schedule_save(self):
+        """延迟保存: SAVE_DELAY 秒内的多次修改只写一次盘"""
+        if not self.path:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(UserProfileConfig.SAVE_DELAY, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            self._save_timer = None
+            n = self.size
+            data = {
+                'user_ids': self.user_ids[:n].copy(),
+                'sums': self.sums[:n].copy(),
+                'weights': self.weights[:n].copy(),
+                'anchors': self.anchors[:n].copy(),
+                'counts': self.counts[:n].copy(),
+            }
+            total_reviews = self.total_reviews
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, dim=self.dim, embedding_name=str(self.embedding_name or ''),
+                         total_reviews=total_reviews, **data)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"[UserProfiles] Failed to save: {e}")
+
+    def flush(self):
+        """取消等待中的延迟保存并立即写盘"""
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is not None:
+            timer.cancel()
+            self.save()
+
+    @classmethod
+    def load(cls, path, dim, embedding_name=None):
+        """加载持久化的累加和；文件不存在或向量模型 / 维度不一致时返回 None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                if int(data['dim']) != int(dim) or str(data['embedding_name']) != str(embedding_name or ''):
+                    return None
+                store = cls(dim, embedding_name=embedding_name, path=path)
+                n = len(data['user_ids'])
+                store._allocate(max(UserProfileConfig.INITIAL_CAPACITY, n))
+                store.user_ids[:n] = data['user_ids']
+                store.sums[:n] = data['sums']
+                store.weights[:n] = data['weights']
+                store.anchors[:n] = data['anchors']
+                store.counts[:n] = data['counts']
+                store.norms[:n] = np.linalg.norm(data['sums'], axis=1)
+                store.row_map = {int(uid): i for i, uid in enumerate(data['user_ids'])}
+                store.size = n
+                store.total_reviews = int(data['total_reviews'])
+                return store
+        except Exception as e:
+            print(f"[UserProfiles] Failed to load {path}: {e}")
+            return None
+
+
+_open_stores = []
+
+
+@atexit.register
+def _flush_on_exit():
+    for store in list(_open_stores):
+        store.flush()
+
+
+def open_user_profile_store(cache_dir, dim, embedding_name=None):
+    """加载 (或新建空的) 持久化用户画像存储"""
+    path = os.path.join(cache_dir, UserProfileConfig.FILE_NAME)
+    # 旧的存储实例 (模型切换前) 不再写同一个文件
+    for old in [s for s in _open_stores if s.path == path]:
+        with old._lock:
+            timer, old._save_timer, old.path = old._save_timer, None, None
+        if timer is not None:
+            timer.cancel()
+        _open_stores.remove(old)
+    store = UserProfileStore.load(path, dim, embedding_name)
+    if store is None:
+        store = UserProfileStore(dim, embedding_name=embedding_name, path=path)
+        store.built_at = 0
+    _open_stores.append(store)
+    return store